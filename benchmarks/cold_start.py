@@ -0,0 +1,106 @@
+"""
+Measure the cold start of the Lambda handler: module import time (through
+python -X importtime) and the time to the first prediction, each in a fresh
+interpreter.
+
+Run from the project root after training:
+
+    python3 benchmarks/cold_start.py --max-first-prediction-ms 3000
+"""
+
+import os
+import sys
+import csv
+import json
+import argparse
+import subprocess
+
+SRC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+DATA_FOLDER = os.path.relpath("data", os.getcwd())
+
+FIRST_PREDICTION = """
+import sys, json, time
+payload = {"body": sys.argv[1]}
+start = time.perf_counter()
+import lambda_function
+imported = time.perf_counter()
+response = lambda_function.predict(payload, None)
+done = time.perf_counter()
+print(json.dumps({"init_ms": (imported - start) * 1e3, "first_call_ms": (done - imported) * 1e3,
+                  "total_ms": (done - start) * 1e3, "error": response["error"]}))
+"""
+
+def _env(fast: bool) -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [SRC_FOLDER, env.get("PYTHONPATH")]))
+    env["FAST_INFERENCE"] = "1" if fast else "0"
+    return env
+
+def import_times(fast: bool, top: int = 10) -> tuple[float, list]:
+    """
+    Return the cumulative import time in ms of lambda_function and its slowest imports
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import lambda_function"],
+        env=_env(fast), capture_output=True, text=True, check=True,
+    )
+    total, modules = None, []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0 and name.strip() == "lambda_function":
+            total = int(cumulative) / 1e3
+        elif depth == 1:
+            # Imports made while lambda_function runs, including the model preload
+            modules.append((name.strip(), int(cumulative) / 1e3))
+    return total, sorted(modules, key=lambda item: -item[1])[:top]
+
+def first_record() -> str:
+    """
+    Return the first row of the predict split as a JSON record, which the
+    feature schema accepts, unlike made-up values
+    """
+    with open(os.path.join(DATA_FOLDER, "winequality-predict.csv"), newline="", encoding="utf-8") as file:
+        row = next(csv.DictReader(file))
+    row.pop("quality", None)
+    return json.dumps({name: float(value) for name, value in row.items()})
+
+def first_prediction(fast: bool) -> dict:
+    """
+    Return init, first call and total time in ms for one handler call in a fresh interpreter
+    """
+    result = subprocess.run(
+        [sys.executable, "-c", FIRST_PREDICTION, first_record()],
+        env=_env(fast), capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main(max_first_prediction_ms: float = None) -> bool:
+    ok = True
+    for fast in (False, True):
+        label = "fast" if fast else "pandas"
+        total, slowest = import_times(fast)
+        timings = first_prediction(fast)
+        print(f"[{label}] import lambda_function: {total:.1f} ms (includes model preload)")
+        for name, ms in slowest:
+            print(f"    {ms:9.1f} ms  {name}")
+        print(
+            f"[{label}] init {timings['init_ms']:.1f} ms, first call {timings['first_call_ms']:.1f} ms, "
+            f"time to first prediction {timings['total_ms']:.1f} ms (error: {timings['error']})"
+        )
+        if timings["error"] != "None":
+            print(f"[{label}] FAILED: the first prediction returned an error")
+            ok = False
+        if max_first_prediction_ms is not None and timings["total_ms"] > max_first_prediction_ms:
+            print(f"[{label}] REGRESSION: time to first prediction above {max_first_prediction_ms} ms")
+            ok = False
+    return ok
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--max-first-prediction-ms", type=float, default=None,
+                        help="Fail when the time to first prediction goes above this value")
+    args = parser.parse_args()
+    sys.exit(0 if main(args.max_first_prediction_ms) else 1)
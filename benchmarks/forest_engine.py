@@ -0,0 +1,75 @@
+"""
+Compare RandomForestClassifier.predict with the flattened forest evaluator
+(numpy_model.FlatForest) at batch sizes 1, 100 and 10k.
+
+Uses models/model.pkl when it is a random forest, otherwise fits a default
+RandomForestClassifier on the train split. Run from the project root:
+
+    python3 benchmarks/forest_engine.py
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from numpy_model import FlatForest  # noqa: E402
+
+DATA_FOLDER = os.path.relpath("data", os.getcwd())
+MODEL_FOLDER = os.path.relpath("models", os.getcwd())
+
+def load_forest():
+    """
+    Return a fitted random forest, its scaler and the scaled predict split
+    """
+    import joblib
+    import pandas as pd
+    from sklearn.ensemble import RandomForestClassifier
+
+    scaler = joblib.load(os.path.join(MODEL_FOLDER, "scaler.pkl"))
+    model = joblib.load(os.path.join(MODEL_FOLDER, "model.pkl"))
+    if not isinstance(model, RandomForestClassifier):
+        train = pd.read_csv(os.path.join(DATA_FOLDER, "winequality-train.csv"))
+        model = RandomForestClassifier(random_state=42).fit(
+            scaler.transform(train.drop(columns=["quality"])), train["quality"]
+        )
+    data = pd.read_csv(os.path.join(DATA_FOLDER, "winequality-predict.csv"))
+    return model, scaler.transform(data.drop(columns=["quality"]))
+
+def best_of(func, repeat: int) -> float:
+    """
+    Return the best wall time in ms of func over repeat runs
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1e3
+
+def main(batch_sizes=(1, 100, 10_000), repeat: int = 5) -> int:
+    model, X = load_forest()
+    forest = FlatForest.from_estimator(model)
+    rng = np.random.default_rng(42)
+    mismatches = 0
+    print(f"{len(model.estimators_)} trees, {forest.feature.size} nodes")
+    print(f"{'batch':>7} {'sklearn ms':>11} {'flat ms':>9} {'speedup':>8}")
+    for batch_size in batch_sizes:
+        batch = X[rng.integers(0, len(X), batch_size)]
+        expected = model.predict(batch)
+        actual = model.classes_.take(forest.predict_proba(batch).argmax(axis=1))
+        mismatches += int((expected != actual).sum())
+        sklearn_ms = best_of(lambda: model.predict(batch), repeat)
+        flat_ms = best_of(lambda: forest.predict_proba(batch), repeat)
+        print(f"{batch_size:>7} {sklearn_ms:>11.2f} {flat_ms:>9.2f} {sklearn_ms / flat_ms:>7.1f}x")
+    print(f"Vote mismatches: {mismatches}")
+    return mismatches
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per batch size, the best one is reported")
+    args = parser.parse_args()
+    sys.exit(1 if main(repeat=args.repeat) else 0)
@@ -0,0 +1,76 @@
+"""
+Benchmark single-record latency of the prediction handler with and
+without the pandas-free fast inference path.
+
+Run from the project root after training:
+
+    python3 benchmarks/inference_latency.py
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import lambda_function  # noqa: E402
+
+DATA_FOLDER = os.path.relpath("data", os.getcwd())
+
+def sample_records(scaler, n_records: int) -> list:
+    """
+    Return records from the predict split, or random records around the scaler mean
+    """
+    features = lambda_function.feature_names(scaler)
+    data_path = os.path.join(DATA_FOLDER, "winequality-predict.csv")
+    if os.path.exists(data_path):
+        import pandas as pd
+        rows = pd.read_csv(data_path)[features].head(n_records).to_numpy()
+    else:
+        rng = np.random.default_rng(42)
+        rows = scaler.mean_ + rng.standard_normal((n_records, len(features))) * scaler.scale_
+    return [dict(zip(features, map(float, row))) for row in rows]
+
+def time_handler(events: list, repeat: int) -> np.ndarray:
+    """
+    Return the per-call latency in microseconds of the handler over the events
+    """
+    latencies = []
+    for _ in range(repeat):
+        for event in events:
+            start = time.perf_counter_ns()
+            lambda_function.predict(event, None)
+            latencies.append((time.perf_counter_ns() - start) / 1e3)
+    return np.array(latencies)
+
+def main(n_records: int = 200, repeat: int = 5):
+    scaler = lambda_function.registry.get("scaler")
+    records = sample_records(scaler, n_records)
+    events = [{"body": json.dumps(record)} for record in records]
+
+    results = {}
+    for fast in (False, True):
+        lambda_function.FAST_INFERENCE = fast
+        lambda_function.predict(events[0], None)  # warm the registry
+        predictions = [lambda_function.predict(event, None)["prediction"] for event in events]
+        latencies = time_handler(events, repeat)
+        results[fast] = predictions
+        label = "fast" if fast else "pandas"
+        print(
+            f"{label:>7}: p50 {np.percentile(latencies, 50):8.1f} us  "
+            f"p99 {np.percentile(latencies, 99):8.1f} us  mean {latencies.mean():8.1f} us"
+        )
+
+    mismatches = sum(a != b for a, b in zip(results[False], results[True]))
+    print(f"Prediction mismatches between paths: {mismatches}/{len(events)}")
+    return mismatches
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=200, help="Number of distinct records")
+    parser.add_argument("--repeat", type=int, default=5, help="Passes over the records")
+    args = parser.parse_args()
+    sys.exit(1 if main(args.records, args.repeat) else 0)
@@ -0,0 +1,312 @@
+"""
+Load test the prediction API with an open-loop request rate and report
+throughput, tail latency, errors and cold-start spikes.
+
+Requests are sent by asyncio workers, each keeping one HTTP/1.1 keep-alive
+connection open, so the client itself adds little overhead. Latency is
+measured from the time each request was scheduled, so a slow server also
+shows the queueing it causes instead of hiding it. Run from the project
+root, against the deployed API (API_GATEWAY_URL in .env) or, offline,
+against a local server wrapping lambda_function.predict:
+
+    python3 benchmarks/load_test.py --rate 50 --requests 1000 --concurrency 16
+    python3 benchmarks/load_test.py --local --rate 200 --requests 2000
+"""
+
+import os
+import sys
+import ssl
+import json
+import time
+import asyncio
+import argparse
+import multiprocessing
+from urllib.parse import urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+SRC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+DATA_FOLDER = os.path.relpath("data", os.getcwd())
+
+# Same record as load_valid_payload in the tests
+VALID_RECORD = {
+    "fixed acidity": 7.7,
+    "volatile acidity": 0.56,
+    "citric acid": 0.08,
+    "residual sugar": 2.5,
+    "chlorides": 0.114,
+    "free sulfur dioxide": 14.0,
+    "total sulfur dioxide": 46.0,
+    "density": 0.9971,
+    "pH": 3.24,
+    "sulphates": 0.66,
+    "alcohol": 9.6,
+}
+
+def sample_payloads(n_records: int) -> list:
+    """
+    Return JSON bodies from the predict split, or the valid test record
+    """
+    data_path = os.path.join(DATA_FOLDER, "winequality-predict.csv")
+    if not os.path.exists(data_path):
+        return [json.dumps(VALID_RECORD).encode()]
+    import pandas as pd
+    rows = pd.read_csv(data_path, nrows=n_records)[list(VALID_RECORD)]
+    return [json.dumps(dict(zip(VALID_RECORD, map(float, row)))).encode() for row in rows.to_numpy()]
+
+class Connection:
+    """
+    Minimal HTTP/1.1 client over one keep-alive connection
+    """
+
+    def __init__(self, url: str, timeout: float):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.tls = parts.scheme == "https"
+        self.port = parts.port or (443 if self.tls else 80)
+        self.path = parts.path or "/"
+        self.timeout = timeout
+        self.reader = self.writer = None
+
+    async def _connect(self):
+        context = ssl.create_default_context() if self.tls else None
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port, ssl=context)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def post(self, body: bytes) -> tuple:
+        """
+        Send the body and return the status code and response body,
+        reconnecting once if the server closed the idle connection
+        """
+        for attempt in (0, 1):
+            try:
+                if self.writer is None:
+                    await self._connect()
+                return await asyncio.wait_for(self._exchange(body), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                self.close()
+                if attempt:
+                    raise
+
+    async def _exchange(self, body: bytes) -> tuple:
+        self.writer.write(
+            f"POST {self.path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: keep-alive\r\n\r\n".encode() + body
+        )
+        await self.writer.drain()
+        status_line = await self.reader.readuntil(b"\r\n")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if "content-length" in headers:
+            content = await self.reader.readexactly(int(headers["content-length"]))
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            content = b""
+            while True:
+                size = int((await self.reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                if size == 0:
+                    # Final CRLF, without trailers
+                    await self.reader.readuntil(b"\r\n")
+                    break
+                content += await self.reader.readexactly(size)
+                await self.reader.readexactly(2)
+        else:
+            content = await self.reader.read()
+            self.close()
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, content
+
+def _app_error(content: bytes) -> bool:
+    """
+    The handler answers invalid requests with status 200 and a "None" prediction
+    """
+    try:
+        response = json.loads(content)
+    except ValueError:
+        return True
+    return response.get("prediction") == "None" and "predictions" not in response
+
+async def run_load(url: str, payloads: list, n_requests: int, rate: float = None, concurrency: int = 16, timeout: float = 30.0) -> list:
+    """
+    Send n_requests POST requests and return one result dictionary per request.
+
+    With a rate, requests are scheduled at that many per second whether or
+    not earlier ones have completed (open loop). Without it, every worker
+    sends its next request as soon as the previous one returns.
+    """
+    queue = asyncio.Queue()
+    results = []
+    start = time.perf_counter()
+
+    async def worker():
+        connection = Connection(url, timeout)
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                index, scheduled = item
+                sent = time.perf_counter()
+                result = {"index": index, "scheduled": scheduled - start, "status": None, "error": None}
+                try:
+                    status, content = await connection.post(payloads[index % len(payloads)])
+                    result["status"] = status
+                    if status >= 400:
+                        result["error"] = f"HTTP {status}"
+                    elif _app_error(content):
+                        result["error"] = "invalid response"
+                except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+                    result["error"] = type(e).__name__
+                    connection.close()
+                done = time.perf_counter()
+                result["latency_ms"] = (done - (scheduled if rate else sent)) * 1e3
+                result["service_ms"] = (done - sent) * 1e3
+                result["done"] = done - start
+                results.append(result)
+        finally:
+            connection.close()
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    for index in range(n_requests):
+        scheduled = time.perf_counter()
+        if rate:
+            scheduled = start + index / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await queue.put((index, scheduled))
+    for _ in workers:
+        await queue.put(None)
+    await asyncio.gather(*workers)
+    results.sort(key=lambda result: result["index"])
+    return results
+
+def summarize(results: list, spike_factor: float = 5.0) -> dict:
+    """
+    Return throughput, error counts, latency percentiles and the latency spikes,
+    i.e. requests slower than spike_factor times the median, as cold starts show up
+    """
+    latencies = np.array([result["latency_ms"] for result in results])
+    service = np.array([result["service_ms"] for result in results])
+    elapsed = max(result["done"] for result in results)
+    errors = {}
+    for result in results:
+        if result["error"] is not None:
+            errors[result["error"]] = errors.get(result["error"], 0) + 1
+    p50 = float(np.percentile(latencies, 50))
+    spikes = [
+        {"index": result["index"], "at_s": round(result["scheduled"], 3), "latency_ms": round(result["latency_ms"], 1)}
+        for result in results if result["latency_ms"] > spike_factor * p50
+    ]
+    return {
+        "requests": len(results),
+        "throughput_rps": len(results) / elapsed,
+        "error_rate": sum(errors.values()) / len(results),
+        "errors": errors,
+        "latency_ms": {
+            "p50": p50,
+            "p95": float(np.percentile(latencies, 95)),
+            "p99": float(np.percentile(latencies, 99)),
+            "max": float(latencies.max()),
+        },
+        "service_ms": {"p50": float(np.percentile(service, 50)), "p99": float(np.percentile(service, 99))},
+        "first_request_ms": results[0]["latency_ms"],
+        "spikes": spikes,
+    }
+
+class _LambdaHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in for API Gateway: forwards the request body to the Lambda handler
+    """
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, which Nagle's algorithm would delay by ~40 ms
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        import lambda_function
+        length = int(self.headers.get("Content-Length") or 0)
+        event = {"body": self.rfile.read(length).decode()} if length else {}
+        content = json.dumps(lambda_function.predict(event, None)).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+def _serve(host: str, port: int, ready):
+    if SRC_FOLDER not in sys.path:
+        sys.path.insert(0, SRC_FOLDER)
+    server = ThreadingHTTPServer((host, port), _LambdaHandler)
+    server.daemon_threads = True
+    ready.put(server.server_address[1])
+    server.serve_forever()
+
+def start_local_server(host: str = "127.0.0.1", port: int = 0) -> tuple:
+    """
+    Serve lambda_function.predict from a child process, so it does not share
+    the interpreter with the client, and return the process and its URL.
+    The handler is imported by the first request, which so pays the cold start.
+    """
+    ready = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve, args=(host, port, ready), daemon=True)
+    process.start()
+    return process, f"http://{host}:{ready.get(timeout=30)}/predict"
+
+def main(url: str, n_requests: int, rate: float, concurrency: int, records: int, timeout: float) -> dict:
+    payloads = sample_payloads(records)
+    results = asyncio.run(run_load(url, payloads, n_requests, rate=rate, concurrency=concurrency, timeout=timeout))
+    summary = summarize(results)
+    latency = summary["latency_ms"]
+    print(f"{summary['requests']} requests to {url}")
+    print(f"throughput {summary['throughput_rps']:8.1f} req/s  errors {summary['error_rate']:.2%} {summary['errors'] or ''}")
+    print(f"latency p50 {latency['p50']:8.1f} ms  p95 {latency['p95']:8.1f} ms  p99 {latency['p99']:8.1f} ms  max {latency['max']:8.1f} ms")
+    print(f"first request {summary['first_request_ms']:8.1f} ms  spikes (> 5x p50): {len(summary['spikes'])}")
+    for spike in summary["spikes"][:10]:
+        print(f"  request {spike['index']:6d} at {spike['at_s']:8.3f} s: {spike['latency_ms']:8.1f} ms")
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default=None, help="Endpoint to load, API_GATEWAY_URL from .env by default")
+    parser.add_argument("--local", action="store_true", help="Load a local server wrapping lambda_function.predict")
+    parser.add_argument("--requests", type=int, default=1000, help="Number of requests")
+    parser.add_argument("--rate", type=float, default=None, help="Requests per second (default: as fast as the workers go)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Number of connections")
+    parser.add_argument("--records", type=int, default=200, help="Number of distinct records")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--output", default=None, help="Write the summary as JSON to this file")
+    args = parser.parse_args()
+
+    url = args.url
+    server = None
+    if args.local:
+        server, url = start_local_server()
+    elif url is None:
+        from dotenv import load_dotenv
+        load_dotenv()
+        url = os.getenv("API_GATEWAY_URL")
+    if not url:
+        parser.error("No endpoint: pass --url, --local or set API_GATEWAY_URL in .env")
+
+    try:
+        summary = main(url, args.requests, args.rate, args.concurrency, args.records, args.timeout)
+    finally:
+        if server is not None:
+            server.terminate()
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(summary, file, indent=2)
@@ -0,0 +1,124 @@
+"""
+Compare loading the model from the pickles and from the memory-mapped
+bundle: load time, time to the first prediction and memory, each in a
+fresh interpreter with the libraries already imported.
+
+Memory is reported as the growth of the resident set and of its anonymous
+part. Anonymous pages are private copies that every worker process pays
+for again, while the mapped bundle pages are file-backed and shared by all
+the processes that map the file. Run from the project root after training:
+
+    python3 benchmarks/model_load.py
+    python3 benchmarks/model_load.py --trees 10 100 500
+"""
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+SRC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+DATA_FOLDER = os.path.relpath("data", os.getcwd())
+MODEL_FOLDER = os.path.relpath("models", os.getcwd())
+
+LOAD = """
+import sys, json, time, warnings
+import numpy as np
+import pandas as pd
+import predict
+
+def memory():
+    values = {}
+    with open("/proc/self/smaps_rollup") as file:
+        for line in file:
+            name, _, rest = line.partition(":")
+            if name in ("Rss", "Anonymous"):
+                values[name] = int(rest.split()[0]) / 1024
+    return values
+
+source, model_folder = sys.argv[1], sys.argv[2]
+before = memory()
+start = time.perf_counter()
+model, scaler = predict.load_model(model_folder, source=source)
+loaded = time.perf_counter()
+X = pd.DataFrame(np.zeros((1, len(scaler.feature_names_in_))), columns=list(scaler.feature_names_in_))
+model.predict(scaler.transform(X))
+done = time.perf_counter()
+after = memory()
+print(json.dumps({
+    "load_ms": (loaded - start) * 1e3,
+    "first_prediction_ms": (done - loaded) * 1e3,
+    "rss_mb": after["Rss"] - before["Rss"],
+    "anonymous_mb": after["Anonymous"] - before["Anonymous"],
+}))
+"""
+
+def measure(source: str, model_folder: str) -> dict:
+    """
+    Return load time, first prediction time and memory growth of one load in a fresh interpreter
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [SRC_FOLDER, env.get("PYTHONPATH")]))
+    result = subprocess.run(
+        [sys.executable, "-c", LOAD, source, model_folder],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def export_forests(trees: list, folder: str) -> list:
+    """
+    Train one RandomForestClassifier per number of trees on the training
+    split and save its pickles and bundle, returning the model folders
+    """
+    if SRC_FOLDER not in sys.path:
+        sys.path.insert(0, SRC_FOLDER)
+    import joblib
+    import pandas as pd
+    import numpy_model
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import StandardScaler
+
+    data = pd.read_csv(os.path.join(DATA_FOLDER, "winequality-train.csv"))
+    X, y = data.drop(columns=["quality"]), data["quality"]
+    scaler = StandardScaler().fit(X)
+    folders = []
+    for n_trees in trees:
+        model = RandomForestClassifier(n_estimators=n_trees, random_state=0, n_jobs=-1).fit(scaler.transform(X), y)
+        model_folder = os.path.join(folder, f"forest-{n_trees}")
+        os.makedirs(model_folder)
+        joblib.dump(model, os.path.join(model_folder, "model.pkl"))
+        joblib.dump(scaler, os.path.join(model_folder, "scaler.pkl"))
+        numpy_model.save_bundle(numpy_model.export_arrays(model, scaler), os.path.join(model_folder, "model.bundle"))
+        folders.append(model_folder)
+    return folders
+
+def main(model_folders: list, repeat: int = 3) -> dict:
+    results = {}
+    for model_folder in model_folders:
+        size_mb = os.path.getsize(os.path.join(model_folder, "model.pkl")) / 2**20
+        print(f"{model_folder} (model.pkl {size_mb:.1f} MB)")
+        for source in ("pickle", "bundle"):
+            runs = [measure(source, model_folder) for _ in range(repeat)]
+            # Best of the runs for the times, the memory does not vary
+            best = {name: min(run[name] for run in runs) for name in runs[0]}
+            results[f"{model_folder}:{source}"] = best
+            print(
+                f"  {source:7s} load {best['load_ms']:8.1f} ms  first prediction {best['first_prediction_ms']:8.1f} ms"
+                f"  RSS +{best['rss_mb']:6.1f} MB  anonymous +{best['anonymous_mb']:6.1f} MB"
+            )
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--trees", type=int, nargs="+", default=None,
+                        help="Benchmark random forests of these sizes instead of the trained model")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per measurement")
+    args = parser.parse_args()
+
+    if args.trees:
+        with tempfile.TemporaryDirectory() as folder:
+            main(export_forests(args.trees, folder), args.repeat)
+    else:
+        main([MODEL_FOLDER], args.repeat)
@@ -0,0 +1,205 @@
+"""
+Module to score large prediction files on every core.
+
+The input csv is split into byte ranges aligned to line boundaries, and
+each range is scored by a worker process that loads the model and scaler
+once. Workers stream their range in chunks and write a shard file, and the
+shards are concatenated in order into one predictions.csv. The confusion
+matrices from each shard are merged, so the metrics are exact.
+"""
+
+import os
+import io
+import time
+import shutil
+import joblib
+import logging
+import argparse
+import tempfile
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.ensemble import RandomForestClassifier
+from numpy_model import FlatForestClassifier, load_bundle
+from metrics import ConfusionMatrix
+from predict import report
+
+DATA_FOLDER = os.path.relpath("data", os.getcwd())
+MODEL_FOLDER = os.path.relpath("models", os.getcwd())
+LOGS_FOLDER = os.path.relpath("logs", os.getcwd())
+
+# Model and scaler of the worker process, set once by _init_worker
+_model = None
+_scaler = None
+
+class _RangeReader(io.RawIOBase):
+    """
+    Read-only file object limited to the byte range [start, end) of a file
+    """
+
+    def __init__(self, file_path: str, start: int, end: int):
+        self.file = open(file_path, "rb")
+        self.file.seek(start)
+        self.remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self.remaining)
+        if size <= 0:
+            return 0
+        n_bytes = self.file.readinto(memoryview(buffer)[:size])
+        self.remaining -= n_bytes
+        return n_bytes
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+def shard_ranges(file_path: str, n_shards: int) -> tuple:
+    """
+    Split the rows of a csv file into byte ranges that start at a line.
+
+    Returns the column names and a list of (start, end) offsets.
+    """
+    size = os.path.getsize(file_path)
+    with open(file_path, "rb") as file:
+        file.readline()
+        data_start = file.tell()
+        offsets = [data_start]
+        for i in range(1, n_shards):
+            target = data_start + (size - data_start) * i // n_shards
+            # Move to the first line starting at or after the target offset
+            file.seek(max(target - 1, data_start))
+            file.readline()
+            offsets.append(max(file.tell(), offsets[-1]))
+    offsets.append(size)
+    # Parsed like the shards are, so quoted names match
+    columns = list(pd.read_csv(file_path, nrows=0).columns)
+    ranges = [(start, end) for start, end in zip(offsets[:-1], offsets[1:]) if end > start]
+    return columns, ranges
+
+def _init_worker(model_folder: str):
+    global _model, _scaler
+    bundle_path = os.path.join(model_folder, "model.bundle")
+    if os.path.exists(bundle_path):
+        # The bundle arrays are used in place, so workers share its pages
+        _model = load_bundle(bundle_path)
+        _scaler = _model.scaler
+        return
+    _model = joblib.load(os.path.join(model_folder, "model.pkl"), mmap_mode="r")
+    _scaler = joblib.load(os.path.join(model_folder, "scaler.pkl"), mmap_mode="r")
+    if isinstance(_model, RandomForestClassifier):
+        _model = FlatForestClassifier(_model)
+
+def _score_shard(file_path: str, start: int, end: int, columns: list, shard_path: str, chunksize: int) -> tuple:
+    """
+    Score one byte range of the input into a headerless shard file.
+    Runs inside a worker process.
+    """
+    confusion = ConfusionMatrix()
+    n_rows = 0
+    with _RangeReader(file_path, start, end) as reader, open(shard_path, "w", encoding="utf-8", newline="") as file:
+        for chunk in pd.read_csv(io.BufferedReader(reader), names=columns, header=None, chunksize=chunksize):
+            X = chunk.drop(columns=["quality"])
+            ground_truth = chunk["quality"].to_numpy()
+            predictions = _model.predict(_scaler.transform(X))
+            pd.DataFrame({
+                "Actual Quality": ground_truth,
+                "Predicted Quality": predictions
+            }).to_csv(file, index=False, header=False)
+            confusion = confusion.merge(ConfusionMatrix.from_predictions(ground_truth, predictions))
+            n_rows += len(chunk)
+    return n_rows, confusion, list(_model.classes_)
+
+def batch_predict(input_path: str, output_path: str, workers: int = None, shards: int = None, chunksize: int = 50000, model_folder: str = None, plots: bool = True) -> dict:
+    """
+    Score a csv file in a process pool and write the ordered predictions.
+
+    Parameters
+    ----------
+    input_path : str
+        Csv file with the feature columns and the quality column.
+    output_path : str
+        Csv file to write the actual and predicted quality to.
+    workers : int, optional
+        Number of worker processes, all cores by default.
+    shards : int, optional
+        Number of row ranges to split the input into, one per worker by default.
+    chunksize : int
+        Number of rows each worker scores at once.
+    model_folder : str, optional
+        Folder with model.pkl and scaler.pkl, models/ by default.
+    plots : bool
+        Whether to plot the confusion matrix, which is always saved as JSON.
+
+    Returns
+    -------
+    dict
+        Accuracy and weighted precision, recall and F1 score, empty when
+        the input has no rows.
+    """
+    workers = workers or os.cpu_count()
+    model_folder = model_folder or MODEL_FOLDER
+    columns, ranges = shard_ranges(input_path, shards or workers)
+    if not ranges:
+        # No rows: nothing to score or report on
+        with open(output_path, "w", encoding="utf-8", newline="") as file:
+            file.write("Actual Quality,Predicted Quality\n")
+        logging.warning("No rows in '%s', wrote an empty '%s'.", input_path, output_path)
+        return {}
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(output_path)))
+    shard_paths = [os.path.join(tmp_dir, f"shard-{i:05d}.csv") for i in range(len(ranges))]
+
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_folder,)) as executor:
+            futures = [
+                executor.submit(_score_shard, input_path, range_start, range_end, columns, shard_path, chunksize)
+                for (range_start, range_end), shard_path in zip(ranges, shard_paths)
+            ]
+            results = [future.result() for future in futures]
+
+        # Concatenate the shards in input order
+        merged_path = os.path.join(tmp_dir, "predictions.csv")
+        with open(merged_path, "wb") as merged:
+            merged.write(b"Actual Quality,Predicted Quality\n")
+            for shard_path in shard_paths:
+                with open(shard_path, "rb") as shard:
+                    shutil.copyfileobj(shard, merged)
+        os.replace(merged_path, output_path)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    confusion = ConfusionMatrix()
+    for _, shard_confusion, _ in results:
+        confusion = confusion.merge(shard_confusion)
+    n_rows = sum(result[0] for result in results)
+    model_classes = results[0][2] if results else []
+    logging.info(
+        "Scored %d rows in %d shards with %d workers in %.2fs.",
+        n_rows, len(ranges), workers, time.perf_counter() - start,
+    )
+    logging.info("Comparison saved to '%s'.", output_path)
+
+    return report(confusion, model_classes, plots=plots)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score a prediction file in parallel shards.")
+    parser.add_argument("--input", default=os.path.join(DATA_FOLDER, "winequality-predict.csv"), help="Csv file to score")
+    parser.add_argument("--output", default=os.path.join(DATA_FOLDER, "predictions.csv"), help="Csv file to write the predictions to")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes, all cores by default")
+    parser.add_argument("--shards", type=int, default=None, help="Number of shards, one per worker by default")
+    parser.add_argument("--chunksize", type=int, default=50000, help="Rows scored at once by each worker")
+    parser.add_argument("--no-plots", action="store_true", help="Only save the confusion matrix as JSON, see reporting.py")
+    args = parser.parse_args()
+
+    script_name = os.path.splitext(os.path.basename(__file__))[0]
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)-18s %(name)-8s %(levelname)-8s %(message)s",
+        datefmt="%y-%m-%d %H:%M",
+        filename=os.path.join(LOGS_FOLDER, f"{script_name}.log"),
+        filemode="w",
+    )
+    batch_predict(args.input, args.output, workers=args.workers, shards=args.shards, chunksize=args.chunksize, plots=not args.no_plots)
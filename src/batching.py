@@ -0,0 +1,166 @@
+"""
+Module to group concurrent inference requests into vectorized calls.
+
+A MicroBatcher queues the items submitted by any number of callers and a
+single background thread flushes them to a batch function, once max_batch
+items are waiting or the oldest one has waited max_wait_ms. Each caller
+gets its own result back through a future, so the batcher works with
+threaded front-ends (predict) as well as asyncio ones (predict_async).
+"""
+
+import time
+import queue
+import asyncio
+import threading
+from concurrent.futures import Future
+
+MAX_BATCH = 64
+MAX_WAIT_MS = 2.0
+
+_STOP = object()
+
+class MicroBatcher:
+    """
+    Flushes queued items to batch_function(items) -> results, in submission order.
+
+    Parameters
+    ----------
+    batch_function : callable
+        Takes a list of items and returns a list with one result per item.
+    max_batch : int
+        Most items passed to one batch_function call.
+    max_wait_ms : float
+        Longest the oldest queued item waits for others to join its batch.
+    """
+
+    def __init__(self, batch_function, max_batch: int = MAX_BATCH, max_wait_ms: float = MAX_WAIT_MS, name: str = "micro-batcher"):
+        if max_batch < 1:
+            raise ValueError("max_batch must be at least 1")
+        self.batch_function = batch_function
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stats = {
+            "batches": 0,
+            "items": 0,
+            "errors": 0,
+            "full_flushes": 0,
+            "timeout_flushes": 0,
+            "max_queue_depth": 0,
+            "wait_ms_total": 0.0,
+            "batch_ms_total": 0.0,
+        }
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item) -> Future:
+        """
+        Queue an item and return the future of its result
+        """
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            self._queue.put((item, future, time.perf_counter()))
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._queue.qsize())
+        return future
+
+    def predict(self, item, timeout: float = None):
+        """
+        Return the result of one item, blocking the calling thread
+        """
+        return self.submit(item).result(timeout)
+
+    async def predict_async(self, item):
+        """
+        Return the result of one item without blocking the event loop
+        """
+        return await asyncio.wrap_future(self.submit(item))
+
+    def stats(self) -> dict:
+        """
+        Return the knobs, the current queue depth and the batching counters
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        batches = stats.pop("batches")
+        items = stats.pop("items")
+        wait_ms_total = stats.pop("wait_ms_total")
+        batch_ms_total = stats.pop("batch_ms_total")
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait_ms,
+            "queue_depth": self._queue.qsize(),
+            "batches": batches,
+            "items": items,
+            "mean_batch_size": items / batches if batches else 0.0,
+            "mean_wait_ms": wait_ms_total / items if items else 0.0,
+            "mean_batch_ms": batch_ms_total / batches if batches else 0.0,
+            **stats,
+        }
+
+    def close(self):
+        """
+        Flush the queued items and stop the background thread
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            entry = self._queue.get()
+            if entry is _STOP:
+                return
+            batch = [entry]
+            deadline = entry[2] + self.max_wait_ms / 1e3
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                try:
+                    entry = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    stopping = True
+                    break
+                batch.append(entry)
+            self._flush(batch)
+
+    def _flush(self, batch: list):
+        start = time.perf_counter()
+        # Callers may have cancelled their futures while waiting
+        batch = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            results = self.batch_function([item for item, _, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f"Batch function returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            with self._lock:
+                self._stats["errors"] += 1
+            return
+        # Count the batch before answering, so a caller that got its result sees it in stats
+        done = time.perf_counter()
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["items"] += len(batch)
+            self._stats["full_flushes" if len(batch) >= self.max_batch else "timeout_flushes"] += 1
+            self._stats["wait_ms_total"] += sum(start - queued for _, _, queued in batch) * 1e3
+            self._stats["batch_ms_total"] += (done - start) * 1e3
+        for (_, future, _), result in zip(batch, results):
+            future.set_result(result)
@@ -42,8 +42,9 @@ def main():
         PackageType="Image",
         Code={"ImageUri": image_uri},
         Role=lambda_role_arn,
-        Timeout=30,  # Optional: function timeout in seconds
-        MemorySize=128,  # Optional: function memory size in megabytes
+        # Recommended by profile_function.py, function timeout in seconds and memory size in megabytes
+        Timeout=int(os.getenv("FUNCTION_TIMEOUT", "30")),
+        MemorySize=int(os.getenv("FUNCTION_MEMORY_SIZE", "128")),
     )
 
     id_num = "".join(random.choices(string.digits, k=7))
@@ -0,0 +1,346 @@
+"""
+Module to deploy the ECR repository, Lambda function and API Gateway in
+place, without deleting anything.
+
+Every step reads the current state of its resource, compares it with the
+desired state and only creates or updates what differs, so a redeploy of
+an unchanged image is a no-op and a new image is rolled out with
+update_function_code while the function keeps serving. The function is
+pinned to the digest of the pushed image (REPOSITORY_URI@sha256:...), not
+to the mutable tag. Steps that do not depend on each other run at the
+same time, and the time of every step is logged and printed.
+"""
+
+import os
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import boto3
+from dotenv import load_dotenv, set_key
+
+LOGS_FOLDER = os.path.relpath("logs", os.getcwd())
+
+API_ROUTE = "/predict"
+MEMORY_SIZE = 128
+TIMEOUT = 30
+PERMISSION_STATEMENT_ID = "api-gateway-invoke"
+PAYLOAD_FORMAT_VERSION = "2.0"
+
+def _client(service: str):
+    return boto3.client(
+        service,
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+        region_name=os.getenv("AWS_REGION"),
+    )
+
+def _get_function(lambda_client, function_name: str) -> dict:
+    try:
+        return lambda_client.get_function(FunctionName=function_name)
+    except lambda_client.exceptions.ResourceNotFoundException:
+        return None
+
+def _wait(lambda_client, waiter_name: str, function_name: str, delay: float):
+    lambda_client.get_waiter(waiter_name).wait(
+        FunctionName=function_name, WaiterConfig={"Delay": delay, "MaxAttempts": max(1, int(300 / delay))}
+    )
+
+def ensure_repository(context: dict, dry_run: bool = False) -> dict:
+    """
+    Create the ECR repository if needed and resolve the digest of the image tag
+    """
+    ecr = context["clients"]["ecr"]
+    name = context["repository_name"]
+    try:
+        repository = ecr.describe_repositories(repositoryNames=[name])["repositories"][0]
+        action = "unchanged"
+    except ecr.exceptions.RepositoryNotFoundException:
+        action = "create"
+        if dry_run:
+            return {"action": action, "outputs": {"image_uri": None}}
+        repository = ecr.create_repository(
+            repositoryName=name,
+            imageScanningConfiguration={"scanOnPush": True},
+            imageTagMutability="MUTABLE",
+        )["repository"]
+
+    try:
+        images = ecr.describe_images(repositoryName=name, imageIds=[{"imageTag": context["image_tag"]}])["imageDetails"]
+        digest = images[0]["imageDigest"]
+    except ecr.exceptions.ImageNotFoundException:
+        digest = None
+    if digest is None and not dry_run:
+        raise ValueError(f"No image tagged '{context['image_tag']}' in {repository['repositoryUri']}. Push it first.")
+
+    return {
+        "action": action,
+        "outputs": {
+            "repository_uri": repository["repositoryUri"],
+            "image_uri": f"{repository['repositoryUri']}@{digest}" if digest else None,
+        },
+    }
+
+def update_configuration(context: dict, dry_run: bool = False) -> dict:
+    """
+    Update the memory size, timeout and role of an existing function if they differ
+    """
+    lambda_client = context["clients"]["lambda"]
+    name = context["function_name"]
+    current = _get_function(lambda_client, name)
+    if current is None:
+        # Created with the right configuration by deploy_code
+        return {"action": "skip", "outputs": {}}
+
+    configuration = current["Configuration"]
+    desired = {"MemorySize": context["memory_size"], "Timeout": context["timeout"], "Role": context["role_arn"]}
+    changes = {key: value for key, value in desired.items() if configuration.get(key) != value}
+    if not changes:
+        return {"action": "unchanged", "outputs": {}}
+    if not dry_run:
+        _wait(lambda_client, "function_updated_v2", name, context["waiter_delay"])
+        lambda_client.update_function_configuration(FunctionName=name, **changes)
+        _wait(lambda_client, "function_updated_v2", name, context["waiter_delay"])
+    return {"action": "update", "changes": changes, "outputs": {}}
+
+def deploy_code(context: dict, dry_run: bool = False) -> dict:
+    """
+    Create the function from the pinned image, or point it to the new digest
+    """
+    lambda_client = context["clients"]["lambda"]
+    name = context["function_name"]
+    image_uri = context["image_uri"]
+    current = _get_function(lambda_client, name)
+
+    if current is None:
+        if not dry_run:
+            current = {"Configuration": lambda_client.create_function(
+                FunctionName=name,
+                PackageType="Image",
+                Code={"ImageUri": image_uri},
+                Role=context["role_arn"],
+                Timeout=context["timeout"],
+                MemorySize=context["memory_size"],
+            )}
+            _wait(lambda_client, "function_active_v2", name, context["waiter_delay"])
+        return {"action": "create", "outputs": {"function_arn": current["Configuration"]["FunctionArn"] if not dry_run else None}}
+
+    function_arn = current["Configuration"]["FunctionArn"]
+    if current["Code"].get("ImageUri") == image_uri:
+        return {"action": "unchanged", "outputs": {"function_arn": function_arn}}
+    if not dry_run:
+        lambda_client.update_function_code(FunctionName=name, ImageUri=image_uri)
+        _wait(lambda_client, "function_updated_v2", name, context["waiter_delay"])
+    return {"action": "update", "changes": {"ImageUri": image_uri}, "outputs": {"function_arn": function_arn}}
+
+def ensure_api(context: dict, dry_run: bool = False) -> dict:
+    """
+    Create the HTTP API with its Lambda integration, route and auto-deployed
+    $default stage, or bring those of an existing API to that state
+    """
+    api_client = context["clients"]["apigatewayv2"]
+    account = context["clients"]["sts"].get_caller_identity()["Account"]
+    function_arn = f"arn:aws:lambda:{api_client.meta.region_name}:{account}:function:{context['function_name']}"
+    route_key = f"POST {API_ROUTE}"
+    desired = {"IntegrationUri": function_arn, "PayloadFormatVersion": PAYLOAD_FORMAT_VERSION}
+
+    api = next((item for item in api_client.get_apis()["Items"] if item["Name"] == context["api_name"]), None)
+    if api is None:
+        if dry_run:
+            return {"action": "create", "outputs": {}}
+        api = api_client.create_api(Name=context["api_name"], ProtocolType="HTTP")
+        integration = api_client.create_integration(ApiId=api["ApiId"], IntegrationType="AWS_PROXY", **desired)
+        api_client.create_route(ApiId=api["ApiId"], RouteKey=route_key, Target=f"integrations/{integration['IntegrationId']}")
+        api_client.create_stage(ApiId=api["ApiId"], StageName="$default", AutoDeploy=True)
+        action, changes = "create", {}
+    else:
+        changes = {}
+        routes = {route["RouteKey"]: route for route in api_client.get_routes(ApiId=api["ApiId"])["Items"]}
+        integrations = {item["IntegrationId"]: item for item in api_client.get_integrations(ApiId=api["ApiId"])["Items"]}
+        route = routes.get(route_key)
+        integration = integrations.get(route["Target"].split("/")[-1]) if route is not None and route.get("Target") else None
+        if integration is None:
+            changes["route"] = route_key
+            if not dry_run:
+                integration = api_client.create_integration(ApiId=api["ApiId"], IntegrationType="AWS_PROXY", **desired)
+                target = f"integrations/{integration['IntegrationId']}"
+                if route is None:
+                    api_client.create_route(ApiId=api["ApiId"], RouteKey=route_key, Target=target)
+                else:
+                    api_client.update_route(ApiId=api["ApiId"], RouteId=route["RouteId"], Target=target)
+        else:
+            integration_changes = {key: value for key, value in desired.items() if integration.get(key) != value}
+            changes.update(integration_changes)
+            if integration_changes and not dry_run:
+                api_client.update_integration(ApiId=api["ApiId"], IntegrationId=integration["IntegrationId"], **integration_changes)
+
+        stages = {stage["StageName"]: stage for stage in api_client.get_stages(ApiId=api["ApiId"])["Items"]}
+        if "$default" not in stages:
+            changes["stage"] = "$default"
+            if not dry_run:
+                api_client.create_stage(ApiId=api["ApiId"], StageName="$default", AutoDeploy=True)
+        elif not stages["$default"].get("AutoDeploy"):
+            changes["AutoDeploy"] = True
+            if not dry_run:
+                api_client.update_stage(ApiId=api["ApiId"], StageName="$default", AutoDeploy=True)
+        action = "update" if changes else "unchanged"
+
+    return {
+        "action": action,
+        "changes": changes,
+        "outputs": {
+            "api_id": api["ApiId"],
+            "api_arn": f"arn:aws:execute-api:{api_client.meta.region_name}:{account}:{api['ApiId']}",
+            "api_url": api["ApiEndpoint"] + API_ROUTE,
+        },
+    }
+
+def ensure_permission(context: dict, dry_run: bool = False) -> dict:
+    """
+    Allow the API to invoke the function, replacing a statement left for another API
+    """
+    lambda_client = context["clients"]["lambda"]
+    if dry_run and (context.get("function_arn") is None or context.get("api_arn") is None):
+        return {"action": "create", "outputs": {}}
+    source_arn = f"{context['api_arn']}/*"
+    try:
+        policy = json.loads(lambda_client.get_policy(FunctionName=context["function_name"])["Policy"])
+    except lambda_client.exceptions.ResourceNotFoundException:
+        policy = {"Statement": []}
+    statement = next((item for item in policy["Statement"] if item.get("Sid") == PERMISSION_STATEMENT_ID), None)
+    if statement is None:
+        action = "create"
+    elif statement.get("Condition", {}).get("ArnLike", {}).get("AWS:SourceArn") == source_arn:
+        return {"action": "unchanged", "outputs": {}}
+    else:
+        action = "update"
+    if not dry_run:
+        if statement is not None:
+            lambda_client.remove_permission(FunctionName=context["function_name"], StatementId=PERMISSION_STATEMENT_ID)
+        lambda_client.add_permission(
+            FunctionName=context["function_name"],
+            StatementId=PERMISSION_STATEMENT_ID,
+            Action="lambda:InvokeFunction",
+            Principal="apigateway.amazonaws.com",
+            SourceArn=source_arn,
+        )
+    return {"action": action, "changes": {"SourceArn": source_arn} if action == "update" else {}, "outputs": {}}
+
+# Each step runs once the steps it comes after are done
+STEPS = {
+    "repository": {"run": ensure_repository, "after": []},
+    "configuration": {"run": update_configuration, "after": []},
+    "api": {"run": ensure_api, "after": []},
+    "code": {"run": deploy_code, "after": ["repository", "configuration"]},
+    "permission": {"run": ensure_permission, "after": ["code", "api"]},
+}
+
+def _timed(run, context: dict, dry_run: bool, start: float) -> tuple:
+    started = time.perf_counter()
+    result = run(context, dry_run=dry_run)
+    finished = time.perf_counter()
+    return result, {"start_s": started - start, "seconds": finished - started}
+
+def run_steps(steps: dict, context: dict, dry_run: bool = False, max_workers: int = 4) -> dict:
+    """
+    Run the steps as soon as the steps they come after are done.
+
+    Returns the action, changes and timing of every step. The outputs of a
+    step are added to the context before the steps that depend on it start.
+    """
+    start = time.perf_counter()
+    report, done, running = {}, set(), {}
+    pending = dict(steps)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            for name in [name for name, step in pending.items() if set(step["after"]) <= done]:
+                running[executor.submit(_timed, pending.pop(name)["run"], context, dry_run, start)] = name
+            if not running:
+                raise ValueError(f"Steps {sorted(pending)} wait for each other")
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                # A failed step stops the deployment, the running steps are left to finish
+                result, timing = future.result()
+                context.update(result.pop("outputs"))
+                report[name] = {**result, **timing}
+                done.add(name)
+                logging.info("Step '%s': %s in %.2fs %s", name, result["action"], timing["seconds"], result.get("changes", ""))
+    report["total"] = {"seconds": time.perf_counter() - start}
+    return report
+
+def deploy(image_tag: str = "latest", dry_run: bool = False, env_file: str = ".env", waiter_delay: float = 2.0, max_workers: int = 4) -> dict:
+    """
+    Bring the repository, function and API to the desired state.
+
+    Parameters
+    ----------
+    image_tag : str
+        Tag of the pushed image, resolved to its digest.
+    dry_run : bool
+        Only report what would change.
+    env_file : str
+        File the resource URIs, ARN, IDs and URL are written to, for the
+        tests and the other scripts. None to leave it alone.
+    waiter_delay : float
+        Seconds between the polls of the function state.
+    max_workers : int
+        Steps run at the same time.
+
+    Returns
+    -------
+    dict
+        Action, changes, start and duration in seconds of every step, and the total.
+    """
+    load_dotenv(env_file)
+    context = {
+        "clients": {service: _client(service) for service in ("ecr", "lambda", "apigatewayv2", "sts")},
+        "repository_name": os.getenv("REPOSITORY_NAME"),
+        "function_name": os.getenv("FUNCTION_NAME"),
+        "api_name": os.getenv("API_GATEWAY_NAME"),
+        "role_arn": os.getenv("AWS_LAMBDA_ROLE_ARN"),
+        "image_tag": image_tag,
+        # Recommended by profile_function.py
+        "memory_size": int(os.getenv("FUNCTION_MEMORY_SIZE", MEMORY_SIZE)),
+        "timeout": int(os.getenv("FUNCTION_TIMEOUT", TIMEOUT)),
+        "waiter_delay": waiter_delay,
+    }
+    report = run_steps(STEPS, context, dry_run=dry_run, max_workers=max_workers)
+
+    if not dry_run and env_file is not None:
+        for key, name in (
+            ("REPOSITORY_URI", "repository_uri"),
+            ("IMAGE_URI", "image_uri"),
+            ("FUNCTION_ARN", "function_arn"),
+            ("API_GATEWAY_ID", "api_id"),
+            ("API_GATEWAY_URL", "api_url"),
+        ):
+            set_key(env_file, key, context[name])
+    return report
+
+def main(image_tag: str = "latest", dry_run: bool = False, max_workers: int = 4) -> dict:
+    report = deploy(image_tag, dry_run=dry_run, max_workers=max_workers)
+    steps = sum(step["seconds"] for name, step in report.items() if name != "total")
+    for name, step in report.items():
+        if name != "total":
+            print(f"{name:14s} {step['action']:10s} start {step['start_s']:7.2f}s  took {step['seconds']:7.2f}s  {step.get('changes') or ''}")
+    print(f"{'total':14s} {'':10s} {report['total']['seconds']:7.2f}s wall clock, {steps:.2f}s of steps")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Deploy the repository, Lambda function and API Gateway in place.")
+    parser.add_argument("--tag", default="latest", help="Tag of the pushed image to deploy")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    parser.add_argument("--workers", type=int, default=4, help="Steps run at the same time")
+    args = parser.parse_args()
+
+    script_name = os.path.splitext(os.path.basename(__file__))[0]
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)-18s %(name)-8s %(levelname)-8s %(message)s",
+        datefmt="%y-%m-%d %H:%M",
+        filename=os.path.join(LOGS_FOLDER, f"{script_name}.log"),
+        filemode="w",
+    )
+    main(args.tag, dry_run=args.dry_run, max_workers=args.workers)
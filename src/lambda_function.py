@@ -1,26 +1,485 @@
 import os
 import json
-import joblib
-import pandas as pd
+import hashlib
+import time
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+from timing import StageTimer, NO_TIMER
+from schema import FeatureSchema, format_errors
 
-def loader(object_name: str):
+logger = logging.getLogger("lambda_function")
+logger.setLevel(logging.INFO)
+
+def _object_path(object_name: str) -> str:
     """
-    Function to load a model or scaler from the models folder
+    Return the path of a model or scaler inside the models folder
     """
     if not isinstance(object_name, str):
         raise ValueError("Object path is not a string")
     models_folder = os.path.relpath("models", os.getcwd())
-    object_path = f"{models_folder}/{object_name}.pkl"
+    if not os.path.splitext(object_name)[1]:
+        object_name = f"{object_name}.pkl"
+    return f"{models_folder}/{object_name}"
+
+def loader(object_name: str):
+    """
+    Function to load a model or scaler from the models folder.
+
+    Names without an extension are pickles; "<name>.npz" and "<name>.bundle"
+    are NumPy models exported with numpy_model, the bundle being memory-mapped,
+    and "schema.json" the feature schema.
+    """
+    object_path = _object_path(object_name)
     try:
+        if object_path.endswith(".npz"):
+            import numpy_model
+            return numpy_model.load(object_path)
+        if object_path.endswith(".bundle"):
+            import numpy_model
+            return numpy_model.load_bundle(object_path)
+        if object_path.endswith(".json"):
+            import schema
+            return schema.load(object_path)
+
+        import joblib
         with open(object_path, "rb") as file:
             return joblib.load(file)
     except FileNotFoundError as e:
         raise FileNotFoundError(f"Invalid object name. The object at {object_path} does not exist.") from e
 
+def _file_digest(object_path: str) -> str:
+    """
+    Return the sha256 hex digest of a file
+    """
+    digest = hashlib.sha256()
+    with open(object_path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class ModelRegistry:
+    """
+    Process-level cache for the objects in the models folder.
+
+    Each object is loaded once per container and reused on warm invocations.
+    Every lookup stats the file; when its mtime or size changed, the content
+    hash is recomputed and the object is only reloaded if the hash differs.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def get(self, object_name: str):
+        """
+        Return the cached object, loading or reloading it when needed
+        """
+        object_path = os.path.abspath(_object_path(object_name))
+        try:
+            stat = os.stat(object_path)
+        except FileNotFoundError as e:
+            raise FileNotFoundError(f"Invalid object name. The object at {object_path} does not exist.") from e
+        file_id = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            entry = self._entries.get(object_path)
+            if entry is not None and entry["file_id"] == file_id:
+                self.hits += 1
+                return entry["object"]
+
+            digest = _file_digest(object_path)
+            if entry is not None and entry["digest"] == digest:
+                # File was touched but its content is the same
+                entry["file_id"] = file_id
+                self.hits += 1
+                return entry["object"]
+
+            obj = loader(object_name)
+            if entry is None:
+                self.misses += 1
+                logger.info("Loaded '%s' into the model registry.", object_path)
+            else:
+                self.reloads += 1
+                logger.info("Reloaded '%s' after it changed on disk.", object_path)
+            self._entries[object_path] = {"object": obj, "file_id": file_id, "digest": digest}
+            return obj
+
+    def version(self, object_name: str) -> str:
+        """
+        Return the content hash of a cached object, or "None" if not loaded
+        """
+        entry = self._entries.get(os.path.abspath(_object_path(object_name)))
+        return entry["digest"] if entry is not None else "None"
+
+    def stats(self) -> dict:
+        """
+        Return the hit, miss and reload counters
+        """
+        return {"hits": self.hits, "misses": self.misses, "reloads": self.reloads}
+
+    def clear(self):
+        """
+        Drop every cached object and reset the counters
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.reloads = 0
+
+registry = ModelRegistry()
+
+class PredictionCache:
+    """
+    Bounded LRU cache of predictions for repeated feature vectors.
+
+    Keys are the bytes of the validated float64 vector in feature order, so
+    equal readings hit whatever their key order or int/float spelling in
+    the request. Entries expire ttl seconds after they were stored, and the
+    whole cache is dropped when the model or scaler version changes.
+    """
+
+    def __init__(self, max_size: int, ttl: float, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+    @staticmethod
+    def keys(X: np.ndarray) -> list:
+        """
+        Return the canonical key of every row
+        """
+        # Adding 0.0 turns -0.0 into 0.0, so equal vectors have equal bytes
+        X = np.ascontiguousarray(X, dtype=np.float64) + 0.0
+        return [row.tobytes() for row in X]
+
+    def _check_version(self, version: str):
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+                logger.info("Prediction cache dropped %d entries after a model change.", len(self._entries))
+            self._entries.clear()
+            self._version = version
+
+    def get_many(self, version: str, keys: list) -> list:
+        """
+        Return the cached prediction of every key, or None for the misses
+        """
+        now = self.clock()
+        results = []
+        with self._lock:
+            self._check_version(version)
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] <= now:
+                    del self._entries[key]
+                    self.expirations += 1
+                    entry = None
+                if entry is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    results.append(entry[0])
+        return results
+
+    def put_many(self, version: str, keys: list, predictions: list):
+        """
+        Store the predictions, evicting the least recently used entries beyond max_size
+        """
+        expires = self.clock() + self.ttl
+        with self._lock:
+            self._check_version(version)
+            for key, prediction in zip(keys, predictions):
+                self._entries[key] = (prediction, expires)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        """
+        Return the size, hit rate and counters
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+    def clear(self):
+        """
+        Drop every entry and reset the counters
+        """
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+            self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "10000"))
+FAST_INFERENCE = os.getenv("FAST_INFERENCE", "0") == "1"
+NUMPY_MODEL = os.getenv("NUMPY_MODEL", "0") == "1"
+FLAT_FOREST = os.getenv("FLAT_FOREST", "1") == "1"
+FLAT_FOREST_MAX_BATCH = int(os.getenv("FLAT_FOREST_MAX_BATCH", "400"))
+STAGE_TIMINGS = os.getenv("STAGE_TIMINGS", "0") == "1"
+
+# PREDICTION_CACHE_SIZE=0 turns the prediction cache off
+prediction_cache = PredictionCache(
+    max_size=int(os.getenv("PREDICTION_CACHE_SIZE", "0")),
+    ttl=float(os.getenv("PREDICTION_CACHE_TTL", "300")),
+)
+
+_flat_forest_cache = {"model": None, "flat": None}
+
+def _flat_forest(model):
+    """
+    Wrap a RandomForestClassifier into the vectorized FlatForestClassifier,
+    packing the trees only when the model changes
+    """
+    if _flat_forest_cache["model"] is not model:
+        from numpy_model import FlatForestClassifier
+        _flat_forest_cache["flat"] = FlatForestClassifier(model, max_batch=FLAT_FOREST_MAX_BATCH)
+        _flat_forest_cache["model"] = model
+    return _flat_forest_cache["flat"]
+
+def _numpy_model_name() -> str:
+    """
+    Return the NumPy model to serve, the bundle when there is one
+    """
+    return "model.bundle" if os.path.exists(_object_path("model.bundle")) else "model.npz"
+
+def load_artifacts() -> tuple:
+    """
+    Return the (model, scaler) pair from the registry.
+
+    With NUMPY_MODEL=1 both come from models/model.bundle, or models/model.npz
+    for models trained before the bundle, and scikit-learn is never imported.
+    Otherwise a RandomForestClassifier is served through
+    the flattened forest evaluator unless FLAT_FOREST=0.
+    """
+    if NUMPY_MODEL:
+        numpy_model = registry.get(_numpy_model_name())
+        return numpy_model, numpy_model.scaler
+    model = registry.get("model")
+    if FLAT_FOREST and type(model).__name__ == "RandomForestClassifier":
+        model = _flat_forest(model)
+    return model, registry.get("scaler")
+
+def load_schema(scaler) -> FeatureSchema:
+    """
+    Return the feature schema shipped with the model, or one without
+    ranges built from the scaler for models trained before schema.json
+    """
+    try:
+        return registry.get("schema.json")
+    except FileNotFoundError:
+        return FeatureSchema.of_features(feature_names(scaler))
+
+def model_version() -> str:
+    """
+    Return the content hashes of the served model and scaler
+    """
+    if NUMPY_MODEL:
+        return registry.version(_numpy_model_name())
+    return f"{registry.version('model')}:{registry.version('scaler')}"
+
+def feature_names(scaler) -> list:
+    """
+    Return the feature order the scaler was fitted with
+    """
+    names = getattr(scaler, "feature_names_in_", None)
+    if names is None:
+        raise ValueError("Scaler was fitted without feature names")
+    return list(names)
+
+class FastScaler:
+    """
+    NumPy-only replacement for StandardScaler.transform.
+
+    The fitted mean_/scale_ arrays are pulled out of the scaler once, and
+    the float64 rows built by the feature schema, already in the scaler's
+    feature order, are scaled in place, skipping pandas and sklearn input
+    validation.
+    The arithmetic matches StandardScaler.transform exactly.
+    """
+
+    _cache = {"scaler": None, "fast": None}
+
+    def __init__(self, scaler):
+        self.features = feature_names(scaler)
+        n_features = len(self.features)
+        self.mean = scaler.mean_ if scaler.with_mean else np.zeros(n_features)
+        self.scale = scaler.scale_ if scaler.with_std and scaler.scale_ is not None else np.ones(n_features)
+
+    @classmethod
+    def of(cls, scaler) -> "FastScaler":
+        """
+        Return the FastScaler for a scaler, building it only when the scaler changes
+        """
+        if cls._cache["scaler"] is not scaler:
+            cls._cache["fast"] = cls(scaler)
+            cls._cache["scaler"] = scaler
+        return cls._cache["fast"]
+
+    def transform_rows(self, rows) -> np.ndarray:
+        """
+        Scale rows that are already in feature order
+        """
+        X = np.array(rows, dtype=np.float64, order="C", ndmin=2)
+        X -= self.mean
+        X /= self.scale
+        return X
+
+class PayloadError(ValueError):
+    """
+    Raised for request bodies the handler cannot turn into records
+    """
+
+def batch_records(body) -> list:
+    """
+    Turn a batch body into a list of records.
+
+    Accepts a JSON list of records or a columnar payload of the form
+    {"columns": [...], "data": [[...], ...]}. Columnar rows of the wrong
+    length become PayloadError instances, reported as invalid records.
+    """
+    if isinstance(body, list):
+        records = body
+    else:
+        columns, data = body["columns"], body["data"]
+        if not isinstance(columns, list) or not isinstance(data, list):
+            raise PayloadError("Columnar payload needs 'columns' and 'data' lists")
+        records = [
+            dict(zip(columns, row)) if isinstance(row, list) and len(row) == len(columns)
+            else PayloadError(f"Row has {len(row) if isinstance(row, list) else 'no'} values, expected {len(columns)}")
+            for row in data
+        ]
+    if len(records) > MAX_BATCH_SIZE:
+        raise PayloadError(f"Batch has {len(records)} records, the limit is {MAX_BATCH_SIZE}")
+    return records
+
+def predict_records(records: list, model, scaler, timer: StageTimer = NO_TIMER) -> list:
+    """
+    Score a list of records with one vectorized transform and predict call.
+
+    Returns one (prediction, error) tuple per record, in input order.
+    """
+    feature_schema = load_schema(scaler)
+    with timer.stage("validate"):
+        X, valid_index, errors = feature_schema.validate(records)
+    results = [("None", None if error is None else format_errors(error)) for error in errors]
+
+    if valid_index:
+        for i, pred in zip(valid_index, predict_rows(X, model, scaler, feature_schema.features, timer)):
+            results[i] = (pred, "None")
+    return results
+
+def predict_rows(X: np.ndarray, model, scaler, features: list, timer: StageTimer = NO_TIMER) -> list:
+    """
+    Return the prediction of every validated row, as strings.
+
+    With the prediction cache on, the whole batch is looked up at once and
+    only the distinct vectors that missed are scaled and scored.
+    """
+    if not prediction_cache.max_size:
+        return [str(pred) for pred in _score(X, model, scaler, features, timer)]
+
+    version = model_version()
+    with timer.stage("cache"):
+        keys = PredictionCache.keys(X)
+        cached = prediction_cache.get_many(version, keys)
+        # Position of the first row of every distinct vector that missed
+        misses = {}
+        for position, (key, pred) in enumerate(zip(keys, cached)):
+            if pred is None and key not in misses:
+                misses[key] = position
+    if misses:
+        preds = [str(pred) for pred in _score(X[list(misses.values())], model, scaler, features, timer)]
+        prediction_cache.put_many(version, list(misses), preds)
+        scored = dict(zip(misses, preds))
+        cached = [scored[key] if pred is None else pred for key, pred in zip(keys, cached)]
+    return cached
+
+def _score(X: np.ndarray, model, scaler, features: list, timer: StageTimer) -> np.ndarray:
+    """
+    Scale the rows and predict them with one vectorized call each
+    """
+    if FAST_INFERENCE:
+        with timer.stage("transform"):
+            X = FastScaler.of(scaler).transform_rows(X)
+    else:
+        with timer.stage("frame"):
+            import pandas as pd
+            frame = pd.DataFrame(X, columns=features)
+        with timer.stage("transform"):
+            X = scaler.transform(frame)
+    with timer.stage("predict"):
+        return model.predict(X)
+
+def _predict_batch(body, timer: StageTimer = NO_TIMER) -> dict:
+    """
+    Build the handler response for a batch body
+    """
+    records = batch_records(body)
+    with timer.stage("load"):
+        model, scaler = load_artifacts()
+    logger.info("Model registry stats: %s", registry.stats())
+    if prediction_cache.max_size:
+        logger.info("Prediction cache stats: %s", prediction_cache.stats())
+
+    results = predict_records(records, model, scaler, timer)
+    failed = sum(error != "None" for _, error in results)
+    return {
+        "message": "Batch prediction made successfully" if not failed else f"Batch prediction made with {failed} invalid records",
+        "error": "None",
+        "predictions": [{"prediction": pred, "error": error} for pred, error in results],
+    }
+
+def _debug_requested(event) -> bool:
+    """
+    Return whether the request asked for the stage timings with ?debug=1
+    """
+    params = event.get("queryStringParameters") or {}
+    return params.get("debug") in ("1", "true")
+
 def predict(event, context):
     """
     Handler function to make predictions
+
+    The body is either a single record, a list of records or a columnar
+    {"columns": [...], "data": [[...]]} payload. Batches are answered with
+    a "predictions" list holding one prediction and error per record.
+
+    With STAGE_TIMINGS=1 the time of every stage is written to stdout as one
+    EMF metrics record per invocation. Requests with ?debug=1 get the same
+    timings back in a "debug" field.
     """
+    debug = _debug_requested(event)
+    timer = StageTimer(enabled=STAGE_TIMINGS or debug)
+    response = _predict(event, timer)
+    if timer.enabled:
+        if STAGE_TIMINGS:
+            # EMF records must be whole log events, which the runtime's logging format would prefix
+            timer.emit(print, {"Handler": "predict", "Payload": "batch" if "predictions" in response else "single"})
+        if debug:
+            response["debug"] = {"timings_ms": timer.timings_ms()}
+    return response
+
+def _predict(event, timer: StageTimer) -> dict:
     if "body" not in event:
         return {
             "message": "No body in the request",
@@ -29,14 +488,31 @@ def predict(event, context):
         }
 
     try:
-        body = json.loads(event["body"])
-        model = loader("model")
-        scaler = loader("scaler")
-
-        df_wine = pd.DataFrame([body])
-        df_wine_transform = scaler.transform(df_wine)
-        pred = model.predict(df_wine_transform)[0]
-    except json.JSONDecodeError as e:
+        with timer.stage("parse"):
+            body = json.loads(event["body"])
+        if isinstance(body, list) or (isinstance(body, dict) and "columns" in body and "data" in body):
+            return _predict_batch(body, timer)
+
+        with timer.stage("load"):
+            model, scaler = load_artifacts()
+            feature_schema = load_schema(scaler)
+        logger.info("Model registry stats: %s", registry.stats())
+        if prediction_cache.max_size:
+            logger.info("Prediction cache stats: %s", prediction_cache.stats())
+
+        # Reject bad records before any pandas or scikit-learn work
+        with timer.stage("validate"):
+            X, errors = feature_schema.validate_record(body)
+        if errors:
+            return {
+                "message": "Invalid record",
+                "error": f"ValidationError: {format_errors(errors)}",
+                "prediction": "None",
+                "fields": errors
+            }
+
+        pred = predict_rows(X, model, scaler, feature_schema.features, timer)[0]
+    except (json.JSONDecodeError, PayloadError) as e:
         return {
             "message": "Invalid body in the request",
             "error": f"{type(e).__name__}: {str(e)}",
@@ -60,3 +536,21 @@ def predict(event, context):
             "error": "None",
             "prediction": str(pred)
         }
+
+def _preload():
+    """
+    Load the model and scaler during the init phase, outside the handler,
+    so the first request does not pay for unpickling them
+    """
+    try:
+        _, scaler = load_artifacts()
+    except (ValueError, FileNotFoundError) as e:
+        logger.warning("Skipping model preload: %s", e)
+        return
+    if FAST_INFERENCE:
+        FastScaler.of(scaler)
+    elif not NUMPY_MODEL:
+        import pandas  # noqa: F401
+
+if os.getenv("PRELOAD_MODELS", "1") == "1":
+    _preload()
@@ -0,0 +1,109 @@
+"""
+Module to evaluate predictions from a single confusion matrix.
+
+The confusion matrix is built in one vectorized np.bincount pass over the
+encoded labels, and accuracy and the weighted precision, recall and F1 score
+are all derived from it, with the same results as the sklearn metrics with
+average="weighted" and zero_division=0. Matrices of chunks or shards can be
+merged, so streaming and distributed scoring report exact metrics.
+"""
+
+import numpy as np
+
+# Integer labels spanning at most this many values are counted directly, without sorting
+MAX_DIRECT_RANGE = 1024
+
+class ConfusionMatrix:
+    """
+    Counts of (actual, predicted) label pairs over the sorted union of labels
+    """
+
+    def __init__(self, labels=None, counts=None):
+        self.labels = np.asarray([] if labels is None else labels)
+        self.counts = np.zeros((len(self.labels), len(self.labels)), dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+
+    @classmethod
+    def from_predictions(cls, y_true, y_pred) -> "ConfusionMatrix":
+        y_true = np.asarray(y_true)
+        y_pred = np.asarray(y_pred)
+        if len(y_true) != len(y_pred):
+            raise ValueError(f"Found {len(y_true)} actual and {len(y_pred)} predicted labels.")
+        if len(y_true) == 0:
+            return cls()
+
+        if np.issubdtype(y_true.dtype, np.integer) and np.issubdtype(y_pred.dtype, np.integer):
+            low = min(y_true.min(), y_pred.min())
+            n_values = int(max(y_true.max(), y_pred.max()) - low) + 1
+            if n_values <= MAX_DIRECT_RANGE:
+                counts = np.bincount((y_true - low) * n_values + (y_pred - low), minlength=n_values * n_values)
+                counts = counts.reshape(n_values, n_values)
+                present = (counts.sum(axis=0) + counts.sum(axis=1)) > 0
+                labels = np.arange(low, low + n_values)[present]
+                return cls(labels, counts[np.ix_(present, present)])
+
+        labels, encoded = np.unique(np.concatenate([y_true, y_pred]), return_inverse=True)
+        n_labels = len(labels)
+        true_index, pred_index = encoded[:len(y_true)], encoded[len(y_true):]
+        counts = np.bincount(true_index * n_labels + pred_index, minlength=n_labels * n_labels)
+        return cls(labels, counts.reshape(n_labels, n_labels))
+
+    def merge(self, other: "ConfusionMatrix") -> "ConfusionMatrix":
+        """
+        Return the sum of both matrices, over the union of their labels
+        """
+        if len(other.labels) == 0:
+            return self
+        if len(self.labels) == 0:
+            return other
+        labels = np.union1d(self.labels, other.labels)
+        counts = np.zeros((len(labels), len(labels)), dtype=np.int64)
+        for matrix in (self, other):
+            index = np.searchsorted(labels, matrix.labels)
+            counts[np.ix_(index, index)] += matrix.counts
+        return ConfusionMatrix(labels, counts)
+
+    def __add__(self, other: "ConfusionMatrix") -> "ConfusionMatrix":
+        return self.merge(other)
+
+    def matrix(self, labels=None) -> np.ndarray:
+        """
+        Return the counts for the given labels, like sklearn's confusion_matrix(labels=...).
+        Labels that were never seen get zero counts.
+        """
+        if labels is None:
+            return self.counts.copy()
+        labels = np.asarray(labels)
+        index = {label: i for i, label in enumerate(self.labels.tolist())}
+        positions = np.array([index.get(label, -1) for label in labels.tolist()], dtype=np.intp)
+        known = positions >= 0
+        counts = np.zeros((len(labels), len(labels)), dtype=np.int64)
+        counts[np.ix_(known, known)] = self.counts[np.ix_(positions[known], positions[known])]
+        return counts
+
+    def metrics(self) -> dict:
+        """
+        Return the accuracy and the support-weighted precision, recall and F1 score
+        """
+        true_positives = np.diag(self.counts).astype(float)
+        support = self.counts.sum(axis=1)
+        predicted = self.counts.sum(axis=0)
+        total = support.sum()
+        if total == 0:
+            return {"accuracy": 0.0, "precision": 0.0, "recall": 0.0, "f1": 0.0}
+        with np.errstate(divide="ignore", invalid="ignore"):
+            precision = np.where(predicted > 0, true_positives / predicted, 0.0)
+            recall = np.where(support > 0, true_positives / support, 0.0)
+            f1 = np.where(support + predicted > 0, 2 * true_positives / (support + predicted), 0.0)
+        return {
+            "accuracy": float(true_positives.sum() / total),
+            "precision": float((precision * support).sum() / total),
+            "recall": float((recall * support).sum() / total),
+            "f1": float((f1 * support).sum() / total),
+        }
+
+def evaluate(y_true, y_pred) -> tuple:
+    """
+    Return the metrics dictionary and the confusion matrix of the predictions
+    """
+    confusion = ConfusionMatrix.from_predictions(y_true, y_pred)
+    return confusion.metrics(), confusion
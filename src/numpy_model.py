@@ -0,0 +1,429 @@
+"""
+Module to export a trained model and scaler into plain NumPy arrays and to
+score them without scikit-learn.
+
+Supported models are the ones train.py chooses from: SVC, SGDClassifier and
+RandomForestClassifier. The exported arrays are saved as an uncompressed .npz
+file that only needs NumPy to be loaded, or as a single-file bundle whose
+arrays are memory-mapped in place (see save_bundle).
+"""
+
+import os
+import json
+import struct
+import logging
+import numpy as np
+
+MODEL_FOLDER = os.path.relpath("models", os.getcwd())
+DATA_FOLDER = os.path.relpath("data", os.getcwd())
+LOGS_FOLDER = os.path.relpath("logs", os.getcwd())
+
+BUNDLE_MAGIC = b"WQBUNDLE"
+BUNDLE_VERSION = 1
+# Magic, format version, reserved, manifest length
+BUNDLE_HEADER = struct.Struct("<8sIIQ")
+BUNDLE_ALIGNMENT = 64
+
+def _export_svc(model) -> dict:
+    if model.kernel not in ("linear", "poly", "rbf", "sigmoid"):
+        raise ValueError(f"Unsupported SVC kernel: {model.kernel}")
+    if model.break_ties and model.decision_function_shape == "ovr" and len(model.classes_) > 2:
+        raise ValueError("SVC with break_ties=True is not supported")
+    # The private attributes keep libsvm's sign convention, which the
+    # public ones flip for binary problems
+    return {
+        "support_vectors": model.support_vectors_,
+        "dual_coef": model._dual_coef_,
+        "intercept": model._intercept_,
+        "n_support": model._n_support.astype(np.int64),
+        "kernel": np.array(model.kernel),
+        "gamma": np.array(model._gamma, dtype=np.float64),
+        "coef0": np.array(model.coef0, dtype=np.float64),
+        "degree": np.array(model.degree, dtype=np.float64),
+    }
+
+def _export_sgd(model) -> dict:
+    return {
+        "coef": model.coef_,
+        "intercept": model.intercept_,
+    }
+
+def _export_forest(model) -> dict:
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        is_leaf = tree.children_left == -1
+        # Same normalization as DecisionTreeClassifier.predict_proba
+        proba = tree.value[:, 0, :model.n_classes_].astype(np.float64)
+        normalizer = proba.sum(axis=1)
+        normalizer[normalizer == 0.0] = 1.0
+        proba /= normalizer[:, None]
+
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(tree.threshold)
+        lefts.append(np.where(is_leaf, -1, tree.children_left + offset))
+        rights.append(np.where(is_leaf, -1, tree.children_right + offset))
+        values.append(proba)
+        roots.append(offset)
+        offset += tree.node_count
+    return {
+        "tree_feature": np.concatenate(features).astype(np.int64),
+        "tree_threshold": np.concatenate(thresholds).astype(np.float64),
+        "tree_left": np.concatenate(lefts).astype(np.int64),
+        "tree_right": np.concatenate(rights).astype(np.int64),
+        # Children interleaved as [left, right] so one gather picks the branch
+        "tree_children": np.stack([np.concatenate(lefts), np.concatenate(rights)], axis=1).ravel().astype(np.int64),
+        "tree_value": np.concatenate(values),
+        "tree_roots": np.array(roots, dtype=np.int64),
+    }
+
+EXPORTERS = {
+    "SVC": _export_svc,
+    "SGDClassifier": _export_sgd,
+    "RandomForestClassifier": _export_forest,
+}
+
+def export_arrays(model, scaler) -> dict:
+    """
+    Export a fitted model and StandardScaler into a dictionary of NumPy arrays.
+
+    Parameters
+    ----------
+    model : SVC, SGDClassifier or RandomForestClassifier
+        Fitted model, trained on the output of the scaler.
+    scaler : StandardScaler
+        Fitted scaler, with feature names.
+
+    Returns
+    -------
+    dict
+        Arrays describing the scaler and the model.
+    """
+    model_type = type(model).__name__
+    if model_type not in EXPORTERS:
+        raise ValueError(f"Unsupported model type: {model_type}")
+    n_features = scaler.n_features_in_
+    arrays = {
+        "model_type": np.array(model_type),
+        "classes": np.asarray(model.classes_),
+        "feature_names": np.asarray(scaler.feature_names_in_, dtype=str),
+        "mean": scaler.mean_ if scaler.with_mean else np.zeros(n_features),
+        "scale": scaler.scale_ if scaler.with_std and scaler.scale_ is not None else np.ones(n_features),
+    }
+    arrays.update(EXPORTERS[model_type](model))
+    return arrays
+
+def save(arrays: dict, file_path: str):
+    """
+    Save exported arrays as an uncompressed .npz file
+    """
+    with open(file_path, "wb") as file:
+        np.savez(file, **arrays)
+
+def load(file_path: str) -> "NumpyModel":
+    """
+    Load a model exported with save
+    """
+    with np.load(file_path, allow_pickle=False) as npz:
+        return NumpyModel({name: npz[name] for name in npz.files})
+
+def _aligned(offset: int) -> int:
+    return -(-offset // BUNDLE_ALIGNMENT) * BUNDLE_ALIGNMENT
+
+def save_bundle(arrays: dict, file_path: str, training_md5: str = None):
+    """
+    Save exported arrays as a single memory-mappable file.
+
+    The file starts with a fixed header, then a JSON manifest holding the
+    model type, feature order, class labels, training data hash and the
+    dtype, shape and offset of every array, then the raw arrays, each
+    aligned to 64 bytes. The file is written next to the target and moved
+    over it, so processes that mapped the previous bundle keep reading it.
+    """
+    layout, blocks, offset = {}, [], 0
+    for name, array in arrays.items():
+        array = np.asarray(array, order="C")
+        if array.dtype.hasobject:
+            raise ValueError(f"Array '{name}' holds Python objects and cannot be mapped")
+        offset = _aligned(offset)
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        blocks.append((offset, array))
+        offset += array.nbytes
+    manifest = {
+        "format_version": BUNDLE_VERSION,
+        "model_type": str(arrays["model_type"]),
+        "feature_names": np.asarray(arrays["feature_names"]).tolist(),
+        "classes": np.asarray(arrays["classes"]).tolist(),
+        "training_md5": training_md5,
+        "arrays": layout,
+    }
+    manifest_bytes = json.dumps(manifest).encode()
+    data_start = _aligned(BUNDLE_HEADER.size + len(manifest_bytes))
+
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(BUNDLE_HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, 0, len(manifest_bytes)))
+        file.write(manifest_bytes)
+        for block_offset, array in blocks:
+            file.seek(data_start + block_offset)
+            file.write(array.tobytes())
+        file.truncate(data_start + offset)
+    os.replace(tmp_path, file_path)
+
+def read_bundle(file_path: str, mmap: bool = True) -> tuple:
+    """
+    Return the manifest and the arrays of a bundle. With mmap the arrays
+    are read-only views of one shared mapping of the file, else copies.
+    """
+    with open(file_path, "rb") as file:
+        magic, version, _, manifest_length = BUNDLE_HEADER.unpack(file.read(BUNDLE_HEADER.size))
+        if magic != BUNDLE_MAGIC:
+            raise ValueError(f"{file_path} is not a model bundle")
+        if version != BUNDLE_VERSION:
+            raise ValueError(f"Unsupported bundle version {version} in {file_path}")
+        manifest = json.loads(file.read(manifest_length))
+    data_start = _aligned(BUNDLE_HEADER.size + manifest_length)
+    if mmap:
+        buffer = np.memmap(file_path, dtype=np.uint8, mode="r")
+    else:
+        with open(file_path, "rb") as file:
+            buffer = np.frombuffer(file.read(), dtype=np.uint8)
+
+    arrays = {}
+    for name, block in manifest["arrays"].items():
+        dtype = np.dtype(block["dtype"])
+        start = data_start + block["offset"]
+        count = int(np.prod(block["shape"], dtype=np.int64))
+        arrays[name] = np.asarray(buffer[start:start + count * dtype.itemsize]).view(dtype).reshape(block["shape"])
+    return manifest, arrays
+
+def load_bundle(file_path: str, mmap: bool = True) -> "NumpyModel":
+    """
+    Load a model saved with save_bundle, its manifest as the manifest attribute
+    """
+    manifest, arrays = read_bundle(file_path, mmap=mmap)
+    model = NumpyModel(arrays)
+    model.manifest = manifest
+    return model
+
+class NumpyScaler:
+    """
+    StandardScaler stand-in built from exported arrays
+    """
+
+    with_mean = True
+    with_std = True
+
+    def __init__(self, arrays: dict):
+        self.mean_ = arrays["mean"]
+        self.scale_ = arrays["scale"]
+        self.feature_names_in_ = arrays["feature_names"]
+        self.n_features_in_ = len(self.feature_names_in_)
+
+    def transform(self, X) -> np.ndarray:
+        if hasattr(X, "columns"):
+            X = X[list(self.feature_names_in_)]
+        X = np.array(X, dtype=np.float64, ndmin=2)
+        X -= self.mean_
+        X /= self.scale_
+        return X
+
+class NumpyModel:
+    """
+    Scores exported arrays the same way the original scikit-learn model would
+    """
+
+    def __init__(self, arrays: dict):
+        self.arrays = arrays
+        self.model_type = str(arrays["model_type"])
+        self.classes_ = arrays["classes"]
+        self.scaler = NumpyScaler(arrays)
+        # Set by load_bundle
+        self.manifest = None
+        self._forest = None
+        self._predict = {
+            "SVC": self._predict_svc,
+            "SGDClassifier": self._predict_sgd,
+            "RandomForestClassifier": self._predict_forest,
+        }[self.model_type]
+
+    def predict(self, X) -> np.ndarray:
+        """
+        Predict classes for already scaled samples
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        return self.classes_.take(self._predict(X))
+
+    def _kernel(self, X: np.ndarray) -> np.ndarray:
+        sv = self.arrays["support_vectors"]
+        kernel = str(self.arrays["kernel"])
+        gamma, coef0, degree = float(self.arrays["gamma"]), float(self.arrays["coef0"]), float(self.arrays["degree"])
+        dot = X @ sv.T
+        if kernel == "linear":
+            return dot
+        if kernel == "poly":
+            return (gamma * dot + coef0) ** degree
+        if kernel == "sigmoid":
+            return np.tanh(gamma * dot + coef0)
+        sq_dist = (X * X).sum(axis=1)[:, None] + (sv * sv).sum(axis=1)[None, :] - 2 * dot
+        return np.exp(-gamma * sq_dist)
+
+    def _predict_svc(self, X: np.ndarray) -> np.ndarray:
+        # One-vs-one voting, as done by libsvm
+        K = self._kernel(X)
+        dual_coef = self.arrays["dual_coef"]
+        intercept = self.arrays["intercept"]
+        starts = np.concatenate([[0], np.cumsum(self.arrays["n_support"])])
+        n_classes = len(self.classes_)
+        votes = np.zeros((X.shape[0], n_classes), dtype=np.int64)
+        pair = 0
+        for i in range(n_classes):
+            sv_i = slice(starts[i], starts[i + 1])
+            for j in range(i + 1, n_classes):
+                sv_j = slice(starts[j], starts[j + 1])
+                decision = K[:, sv_i] @ dual_coef[j - 1, sv_i] + K[:, sv_j] @ dual_coef[i, sv_j] + intercept[pair]
+                winner = decision > 0
+                votes[winner, i] += 1
+                votes[~winner, j] += 1
+                pair += 1
+        return votes.argmax(axis=1)
+
+    def _predict_sgd(self, X: np.ndarray) -> np.ndarray:
+        scores = X @ self.arrays["coef"].T + self.arrays["intercept"]
+        if scores.shape[1] == 1:
+            return (scores[:, 0] > 0).astype(np.intp)
+        return scores.argmax(axis=1)
+
+    def _predict_forest(self, X: np.ndarray) -> np.ndarray:
+        if self._forest is None:
+            self._forest = FlatForest(self.arrays)
+        return self._forest.predict_proba(X).argmax(axis=1)
+
+class FlatForest:
+    """
+    Random forest evaluator over all trees packed into contiguous node arrays.
+
+    Every (sample, tree) pair of a batch walks down its tree at the same
+    time, one tree level per NumPy step, and pairs that reached a leaf are
+    dropped from the next step. Leaf probabilities are summed in tree order
+    and averaged, like RandomForestClassifier.predict_proba, so the votes
+    match scikit-learn exactly.
+    """
+
+    def __init__(self, arrays: dict, block_size: int = 512):
+        # No copies when the arrays are already intp, so mapped bundles stay shared
+        self.feature = arrays["tree_feature"].astype(np.intp, copy=False)
+        self.threshold = arrays["tree_threshold"]
+        if "tree_children" in arrays:
+            self.children = arrays["tree_children"].astype(np.intp, copy=False)
+        else:
+            # Children interleaved as [left, right] so one gather picks the branch
+            self.children = np.stack([arrays["tree_left"], arrays["tree_right"]], axis=1).ravel().astype(np.intp)
+        self.is_leaf = arrays["tree_left"] == -1
+        self.value = arrays["tree_value"]
+        self.roots = arrays["tree_roots"].astype(np.intp, copy=False)
+        self.block_size = block_size
+
+    @classmethod
+    def from_estimator(cls, model) -> "FlatForest":
+        """
+        Pack a fitted RandomForestClassifier
+        """
+        return cls(_export_forest(model))
+
+    def apply(self, X) -> np.ndarray:
+        """
+        Return the leaf reached by every sample in every tree, shape (n_samples, n_trees)
+        """
+        # Trees compare float32 inputs against float64 thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_samples, n_features = X.shape
+        n_trees = len(self.roots)
+        X_flat = X.ravel()
+        leaves = np.empty((n_samples, n_trees), dtype=np.intp)
+        # Blocks of samples keep the working set small
+        for start in range(0, n_samples, self.block_size):
+            stop = min(start + self.block_size, n_samples)
+            node = np.tile(self.roots, stop - start)
+            row_offset = np.repeat(np.arange(start, stop) * n_features, n_trees)
+            active = np.flatnonzero(~self.is_leaf[node])
+            while active.size:
+                current = node[active]
+                go_right = ~(X_flat[row_offset[active] + self.feature[current]] <= self.threshold[current])
+                node[active] = following = self.children[2 * current + go_right]
+                active = active[~self.is_leaf[following]]
+            leaves[start:stop] = node.reshape(stop - start, n_trees)
+        return leaves
+
+    def predict_proba(self, X) -> np.ndarray:
+        """
+        Return the class probabilities averaged over all trees
+        """
+        leaves = self.apply(X)
+        # Reducing over the leading axis adds the trees one after the other
+        proba = np.add.reduce(self.value[leaves.T], axis=0)
+        proba /= len(self.roots)
+        return proba
+
+class FlatForestClassifier:
+    """
+    Drop-in predictor for a fitted RandomForestClassifier.
+
+    Batches up to max_batch samples are scored with FlatForest, larger
+    ones with the original estimator, whose compiled tree walk is faster
+    once the per-tree overhead is amortized.
+    """
+
+    def __init__(self, model, max_batch: int = 400):
+        self.model = model
+        self.classes_ = model.classes_
+        self.forest = FlatForest.from_estimator(model)
+        self.max_batch = max_batch
+
+    def predict(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[0] > self.max_batch:
+            return self.model.predict(X)
+        return self.classes_.take(self.forest.predict_proba(X).argmax(axis=1))
+
+def check_parity(model, numpy_model: NumpyModel, scaler, X) -> int:
+    """
+    Return the number of samples where the exported model disagrees with the original one
+    """
+    X_scaled = scaler.transform(X)
+    expected = model.predict(X_scaled)
+    actual = numpy_model.predict(numpy_model.scaler.transform(X))
+    return int((expected != actual).sum())
+
+def main():
+    import joblib
+    import pandas as pd
+
+    model = joblib.load(os.path.join(MODEL_FOLDER, "model.pkl"))
+    scaler = joblib.load(os.path.join(MODEL_FOLDER, "scaler.pkl"))
+    numpy_model_path = os.path.join(MODEL_FOLDER, "model.npz")
+    save(export_arrays(model, scaler), numpy_model_path)
+    logging.info("NumPy model (%s) saved as '%s'.", type(model).__name__, numpy_model_path)
+
+    data = pd.read_csv(os.path.join(DATA_FOLDER, "winequality-predict.csv"))
+    X = data[list(scaler.feature_names_in_)]
+    mismatches = check_parity(model, load(numpy_model_path), scaler, X)
+    logging.info("NumPy model parity check: %d/%d mismatches.", mismatches, len(X))
+    if mismatches:
+        raise ValueError(f"Exported model disagrees with the original on {mismatches} samples")
+
+if __name__ == "__main__":
+    script_name = os.path.splitext(os.path.basename(__file__))[0]
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)-18s %(name)-8s %(levelname)-8s %(message)s",
+        datefmt="%y-%m-%d %H:%M",
+        filename=os.path.join(LOGS_FOLDER, f"{script_name}.log"),
+        filemode="w",
+    )
+    main()
@@ -0,0 +1,138 @@
+"""
+Module to run separate_data → train → predict, skipping unchanged steps.
+
+Each step is fingerprinted from the md5 of its input files (the same hash
+DVC records in the .dvc files), the md5 of its source files, its parameters
+and the versions of the libraries it depends on. After a step runs, the
+fingerprint and the md5 of every output are stored in a stamp file under
+data/.cache/steps. The step is skipped while the fingerprint matches and
+its outputs still have the recorded hashes, so outputs restored with
+`dvc pull` or `dvc checkout` count as cached.
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+from importlib import metadata
+from process import CACHE_FOLDER, cached_file_hash
+import separate_data
+import train
+import predict
+
+DATA_FOLDER = os.path.relpath("data", os.getcwd())
+MODEL_FOLDER = os.path.relpath("models", os.getcwd())
+LOGS_FOLDER = os.path.relpath("logs", os.getcwd())
+SOURCE_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+LIBRARIES = ("numpy", "pandas", "scikit-learn")
+
+# Inputs, outputs, code and parameters of each step, in running order. The
+# parameters are the values hard coded in the scripts that shape the outputs
+STEPS = {
+    "separate": {
+        "run": separate_data.main,
+        "inputs": [os.path.join(DATA_FOLDER, "winequality-red.csv")],
+        "outputs": [os.path.join(DATA_FOLDER, "winequality-train.csv"), os.path.join(DATA_FOLDER, "winequality-predict.csv")],
+        "code": ["separate_data.py", "process.py"],
+        "params": {"test_size": 0.25, "random_state": 42},
+    },
+    "train": {
+        "run": train.main,
+        "inputs": [os.path.join(DATA_FOLDER, "winequality-train.csv")],
+        "outputs": [os.path.join(MODEL_FOLDER, "model.pkl"), os.path.join(MODEL_FOLDER, "scaler.pkl"), os.path.join(MODEL_FOLDER, "model.npz"), os.path.join(MODEL_FOLDER, "model.bundle"), os.path.join(MODEL_FOLDER, "schema.json")],
+        "code": ["train.py", "process.py", "metrics.py", "numpy_model.py", "reporting.py", "schema.py", "tracking.py", "tune.py"],
+        "params": {"test_size": 0.2, "random_state": 42},
+    },
+    "predict": {
+        "run": predict.predict,
+        "inputs": [os.path.join(DATA_FOLDER, "winequality-predict.csv"), os.path.join(MODEL_FOLDER, "model.pkl"), os.path.join(MODEL_FOLDER, "scaler.pkl"), os.path.join(MODEL_FOLDER, "model.bundle")],
+        "outputs": [os.path.join(DATA_FOLDER, "predictions.csv")],
+        "code": ["predict.py", "process.py", "metrics.py", "numpy_model.py", "reporting.py", "timing.py"],
+        "params": {},
+    },
+}
+
+def fingerprint(inputs: list, code: list, params: dict, cache_dir: str) -> str:
+    """
+    Return the md5 of everything that determines the outputs of a step
+    """
+    content = {
+        "inputs": {path: cached_file_hash(path, cache_dir) for path in inputs},
+        "code": {name: cached_file_hash(os.path.join(SOURCE_FOLDER, name), cache_dir) for name in code},
+        "params": params,
+        "python": sys.version.split()[0],
+        "libraries": {name: metadata.version(name) for name in LIBRARIES},
+    }
+    return hashlib.md5(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+def _read_stamp(stamp_path: str) -> dict:
+    if not os.path.exists(stamp_path):
+        return None
+    with open(stamp_path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+def _outputs_match(outputs: dict, cache_dir: str) -> bool:
+    return all(os.path.exists(path) and cached_file_hash(path, cache_dir) == md5 for path, md5 in outputs.items())
+
+def run_step(name: str, run, inputs: list, outputs: list, code: list, params: dict = None, force: bool = False, cache_dir: str = None) -> bool:
+    """
+    Run a step unless its stamp shows it already ran on the same fingerprint.
+
+    Returns True if the step ran, False if it was skipped.
+    """
+    params = params or {}
+    cache_dir = cache_dir or CACHE_FOLDER
+    stamp_folder = os.path.join(cache_dir, "steps")
+    os.makedirs(stamp_folder, exist_ok=True)
+    stamp_path = os.path.join(stamp_folder, f"{name}.json")
+
+    step_fingerprint = fingerprint(inputs, code, params, cache_dir)
+    stamp = _read_stamp(stamp_path)
+    if not force and stamp is not None and stamp["fingerprint"] == step_fingerprint and _outputs_match(stamp["outputs"], cache_dir):
+        logging.info("Step '%s' is up to date, skipped.", name)
+        return False
+
+    start = time.perf_counter()
+    run()
+    stamp = {
+        "fingerprint": step_fingerprint,
+        "outputs": {path: cached_file_hash(path, cache_dir) for path in outputs},
+    }
+    tmp_path = f"{stamp_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(stamp, file, indent=2)
+    os.replace(tmp_path, stamp_path)
+    logging.info("Step '%s' ran in %.2fs.", name, time.perf_counter() - start)
+    return True
+
+def main(steps: list = None, force: bool = False) -> list:
+    """
+    Run the pipeline steps in order and return the names of the steps that ran
+    """
+    ran = []
+    for name, step in STEPS.items():
+        if steps is not None and name not in steps:
+            continue
+        if run_step(name, step["run"], step["inputs"], step["outputs"], step["code"], step["params"], force=force):
+            ran.append(name)
+    return ran
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the data, training and prediction steps, skipping the unchanged ones.")
+    parser.add_argument("--steps", nargs="+", choices=list(STEPS), default=None, help="Steps to consider, all by default")
+    parser.add_argument("--force", action="store_true", help="Run the steps even if their outputs are up to date")
+    args = parser.parse_args()
+
+    script_name = os.path.splitext(os.path.basename(__file__))[0]
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)-18s %(name)-8s %(levelname)-8s %(message)s",
+        datefmt="%y-%m-%d %H:%M",
+        filename=os.path.join(LOGS_FOLDER, f"{script_name}.log"),
+        filemode="w",
+    )
+    main(steps=args.steps, force=args.force)
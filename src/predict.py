@@ -1,72 +1,151 @@
 import os
 import joblib
+import itertools
 import logging
+import argparse
 import pandas as pd
 from process import load_data
-import matplotlib.pyplot as plt
-from sklearn.metrics import (
-    accuracy_score,
-    precision_score,
-    recall_score,
-    f1_score,
-    confusion_matrix,
-    ConfusionMatrixDisplay,
-)
+from numpy_model import FlatForestClassifier, load_bundle
+from sklearn.ensemble import RandomForestClassifier
+from metrics import ConfusionMatrix
+from reporting import Reporter
+from timing import StageTimer, NO_TIMER
 
 DATA_FOLDER = os.path.relpath("data", os.getcwd())
 MODEL_FOLDER = os.path.relpath("models", os.getcwd())
 IMAGES_FOLDER = os.path.relpath("img", os.getcwd())
 LOGS_FOLDER = os.path.relpath("logs", os.getcwd())
 
-def predict():
-    model_file_path = os.path.join(MODEL_FOLDER, "model.pkl")
-    model = joblib.load(model_file_path)
+def load_model(model_folder: str = None, source: str = "bundle") -> tuple:
+    """
+    Return the model and scaler to score with.
 
-    scaler_file_path = os.path.join(MODEL_FOLDER, "scaler.pkl")
-    scaler = joblib.load(scaler_file_path)
+    With source="bundle", models/model.bundle is memory-mapped, so loading
+    takes about the same time whatever the model size and processes that
+    load it share its pages. Without a bundle, or with source="pickle",
+    the pickles are loaded and a RandomForestClassifier is wrapped into
+    the flattened forest evaluator.
+    """
+    model_folder = model_folder or MODEL_FOLDER
+    bundle_path = os.path.join(model_folder, "model.bundle")
+    if source == "bundle" and os.path.exists(bundle_path):
+        model = load_bundle(bundle_path)
+        return model, model.scaler
+    if source not in ("bundle", "pickle"):
+        raise ValueError(f"Unknown model source: {source}")
+
+    model = joblib.load(os.path.join(model_folder, "model.pkl"))
+    scaler = joblib.load(os.path.join(model_folder, "scaler.pkl"))
+    if isinstance(model, RandomForestClassifier):
+        model = FlatForestClassifier(model)
+    return model, scaler
+
+def predict(chunksize: int = None, plots: bool = True, source: str = "bundle") -> dict:
+    """
+    Score winequality-predict.csv and evaluate the predictions.
+
+    With a chunksize, the file is read, scored and written chunk by chunk,
+    so memory is bounded by the chunk size instead of the file size. The
+    model is read from the bundle unless source is "pickle", see load_model.
+    The time of every stage is logged as one EMF metrics record and
+    returned, in milliseconds.
+    """
+    timer = StageTimer()
+    with timer.stage("load_model"):
+        model, scaler = load_model(source=source)
 
     data_path = os.path.join(DATA_FOLDER, "winequality-predict.csv")
-    data = load_data(data_path)
-    
-    X = data.drop(columns=["quality"])
-    ground_truth = data["quality"]
-    X_scaled = scaler.fit_transform(X)
+    if chunksize:
+        predict_streaming(model, scaler, data_path, chunksize, plots=plots, timer=timer)
+    else:
+        with timer.stage("load_data"):
+            data = load_data(data_path, source="cache")
+            X = data.drop(columns=["quality"])
+            ground_truth = data["quality"]
+        with timer.stage("transform"):
+            # The scaler is fitted on the training data, refitting it here would shift the features
+            X_scaled = scaler.transform(X)
+        with timer.stage("predict"):
+            predictions = model.predict(X_scaled)
 
-    predictions = model.predict(X_scaled)
+        with timer.stage("write"):
+            comparison = pd.DataFrame({
+                "Actual Quality": ground_truth,
+                "Predicted Quality": predictions
+            })
 
-    comparison = pd.DataFrame({
-        "Actual Quality": ground_truth,
-        "Predicted Quality": predictions
-    })
+            file_path = os.path.join(DATA_FOLDER, "predictions.csv")
+            comparison.to_csv(file_path, index=False)
+        logging.info("Comparison saved to '%s'.", file_path)
+        with timer.stage("evaluate"):
+            evaluate(comparison, model.classes_, plots=plots)
 
+    timer.emit(logging.info, {"Script": "predict", "Mode": "streaming" if chunksize else "in_memory"})
+    return timer.timings_ms()
+
+def predict_streaming(model, scaler, data_path: str, chunksize: int, plots: bool = True, timer: StageTimer = NO_TIMER):
+    """
+    Score the csv file chunk by chunk, appending to predictions.csv and
+    merging the confusion matrix of every chunk for the evaluation.
+    The stage times add up over the chunks.
+    """
     file_path = os.path.join(DATA_FOLDER, "predictions.csv")
-    comparison.to_csv(file_path, index=False)
-    logging.info("Comparison saved to '%s'.", file_path)
-    evaluate(comparison, model.classes_)
-
-def evaluate(comparison: pd.DataFrame, model_classes: list):
-    # Calculate metrics
-    accuracy = accuracy_score(comparison["Actual Quality"], comparison["Predicted Quality"])
-    precision = precision_score(comparison["Actual Quality"], comparison["Predicted Quality"], average="weighted", zero_division=0)
-    recall = recall_score(comparison["Actual Quality"], comparison["Predicted Quality"], average="weighted", zero_division=0)
-    f1 = f1_score(comparison["Actual Quality"], comparison["Predicted Quality"], average="weighted", zero_division=0)
-
-    logging.info("Ground Truth Evaluation - Accuracy: %f:.2f", accuracy)
-    logging.info("Ground Truth Evaluation - Precision: %f:.2f", precision)
-    logging.info("Ground Truth Evaluation - Recall: %f:.2f", recall)
-    logging.info("Ground Truth Evaluation - F1 Score: %f:.2f", f1)
-    conf_mat = confusion_matrix(comparison["Actual Quality"], comparison["Predicted Quality"], labels=model_classes)
-    conf_mat_disp = ConfusionMatrixDisplay(
-        confusion_matrix=conf_mat, display_labels=model_classes
-    )
-    fig, ax = plt.subplots()
-    conf_mat_disp.plot(ax=ax)
-    fig_name = "confusion_matrix_ground_truth.png"
-    fig_path = os.path.join(IMAGES_FOLDER, fig_name)
-    fig.savefig(fig_path)
-    logging.info("Confusion matrix saved to '%s'.", fig_path)
+    tmp_path = f"{file_path}.tmp"
+    confusion = ConfusionMatrix()
+    n_rows = 0
+    chunks = pd.read_csv(data_path, chunksize=chunksize)
+    with open(tmp_path, "w", encoding="utf-8", newline="") as file:
+        for i in itertools.count():
+            with timer.stage("load_data"):
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                X = chunk.drop(columns=["quality"])
+                ground_truth = chunk["quality"].to_numpy()
+            with timer.stage("transform"):
+                X_scaled = scaler.transform(X)
+            with timer.stage("predict"):
+                predictions = model.predict(X_scaled)
+            with timer.stage("write"):
+                pd.DataFrame({
+                    "Actual Quality": ground_truth,
+                    "Predicted Quality": predictions
+                }).to_csv(file, index=False, header=i == 0)
+            with timer.stage("evaluate"):
+                confusion = confusion.merge(ConfusionMatrix.from_predictions(ground_truth, predictions))
+            n_rows += len(chunk)
+    # Only replace the previous predictions once the whole file is scored
+    os.replace(tmp_path, file_path)
+    logging.info("Comparison of %d rows saved to '%s'.", n_rows, file_path)
+
+    with timer.stage("evaluate"):
+        report(confusion, model.classes_, plots=plots)
+
+def evaluate(comparison: pd.DataFrame, model_classes: list, plots: bool = True) -> dict:
+    confusion = ConfusionMatrix.from_predictions(comparison["Actual Quality"], comparison["Predicted Quality"])
+    return report(confusion, model_classes, plots=plots)
+
+def report(confusion: ConfusionMatrix, model_classes: list, plots: bool = True) -> dict:
+    """
+    Log the metrics of the confusion matrix and save it over the model
+    classes, as JSON and, unless plots is False, as a plot
+    """
+    metrics = confusion.metrics()
+    logging.info("Ground Truth Evaluation - Accuracy: %f:.2f", metrics["accuracy"])
+    logging.info("Ground Truth Evaluation - Precision: %f:.2f", metrics["precision"])
+    logging.info("Ground Truth Evaluation - Recall: %f:.2f", metrics["recall"])
+    logging.info("Ground Truth Evaluation - F1 Score: %f:.2f", metrics["f1"])
+    with Reporter(IMAGES_FOLDER, plots=plots) as reporter:
+        reporter.confusion_matrix(confusion.matrix(model_classes), model_classes, "confusion_matrix_ground_truth")
+    return metrics
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score the prediction dataset with the trained model.")
+    parser.add_argument("--chunksize", type=int, default=None, help="Stream the input in chunks of this many rows")
+    parser.add_argument("--no-plots", action="store_true", help="Only save the confusion matrix as JSON, see reporting.py")
+    parser.add_argument("--source", choices=["bundle", "pickle"], default="bundle", help="Read the model from model.bundle (if present) or from the pickles")
+    args = parser.parse_args()
+
     script_name = os.path.splitext(os.path.basename(__file__))[0]
     logging.basicConfig(
         level=logging.INFO,
@@ -75,4 +154,4 @@ if __name__ == "__main__":
         filename=os.path.join(LOGS_FOLDER, f"{script_name}.log"),
         filemode="w",
     )
-    predict()
+    predict(chunksize=args.chunksize, plots=not args.no_plots, source=args.source)
@@ -2,12 +2,103 @@
 Module to define helper functions to load and process data.
 """
 
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
 import pandas as pd
 
-def load_data(file_path, source="csv"):
+CACHE_FOLDER = os.path.relpath(os.path.join("data", ".cache"), os.getcwd())
+
+def file_hash(file_path: str) -> str:
+    """
+    Return the md5 hex digest of a file, the same hash DVC records in .dvc files.
+    """
+    digest = hashlib.md5()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def cached_file_hash(file_path: str, cache_dir: str) -> str:
+    """
+    Return the hash of a file, only re-reading it when its size or mtime changed.
+    """
+    index_path = os.path.join(cache_dir, "index.json")
+    index = {}
+    if os.path.exists(index_path):
+        with open(index_path, "r", encoding="utf-8") as file:
+            index = json.load(file)
+    stat = os.stat(file_path)
+    key = os.path.abspath(file_path)
+    entry = index.get(key)
+    if entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+        return entry["md5"]
+
+    md5 = file_hash(file_path)
+    index[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "md5": md5}
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(index, file)
+    os.replace(tmp_path, index_path)
+    return md5
+
+def _build_cache(file_path: str, entry_dir: str):
+    """
+    Parse the csv file once and store every column as a .npy file.
+
+    Text columns are object arrays, stored pickled and loaded without memory-mapping.
+    """
+    data = pd.read_csv(file_path)
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(entry_dir))
+    try:
+        for i, column in enumerate(data.columns):
+            array = data[column].to_numpy()
+            np.save(os.path.join(tmp_dir, f"{i}.npy"), np.ascontiguousarray(array), allow_pickle=array.dtype == object)
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as file:
+            json.dump({"columns": list(data.columns), "n_rows": len(data)}, file)
+        os.rename(tmp_dir, entry_dir)
+    except OSError:
+        # Another process built the same entry first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.exists(os.path.join(entry_dir, "meta.json")):
+            raise
+
+def _load_cached(file_path: str, columns: list = None, dtype=None, cache_dir: str = None) -> pd.DataFrame:
+    cache_dir = cache_dir or CACHE_FOLDER
+    os.makedirs(cache_dir, exist_ok=True)
+    entry_dir = os.path.join(cache_dir, cached_file_hash(file_path, cache_dir))
+    if not os.path.exists(os.path.join(entry_dir, "meta.json")):
+        _build_cache(file_path, entry_dir)
+
+    with open(os.path.join(entry_dir, "meta.json"), "r", encoding="utf-8") as file:
+        meta = json.load(file)
+    selected = meta["columns"] if columns is None else list(columns)
+    missing = [column for column in selected if column not in meta["columns"]]
+    if missing:
+        raise ValueError(f"Columns not found in {file_path}: {missing}")
+
+    arrays = {}
+    for column in selected:
+        array_path = os.path.join(entry_dir, f"{meta['columns'].index(column)}.npy")
+        try:
+            array = np.load(array_path, mmap_mode="r")
+        except ValueError:
+            # Object arrays of text columns cannot be memory-mapped
+            array = np.load(array_path, allow_pickle=True)
+        column_dtype = dtype.get(column) if isinstance(dtype, dict) else dtype
+        if column_dtype is not None and (isinstance(dtype, dict) or np.issubdtype(array.dtype, np.floating)):
+            array = array.astype(column_dtype)
+        # Plain ndarray view over the mapped file, so pandas does not hold a memmap subclass
+        arrays[column] = np.asarray(array)
+    return pd.DataFrame(arrays, copy=False)
+
+def load_data(file_path, source="csv", columns=None, dtype=None, cache_dir=None):
     """
     Load data from source.
-    
+
     Parameters
     ----------
     file_path : str
@@ -16,17 +107,37 @@ def load_data(file_path, source="csv"):
         Source of the data. Options:
             - csv (default): Load data from a local csv file.
                 File path should be to a local csv file.
+            - cache: Load data from a local csv file through a columnar cache.
+                The csv is parsed once into one memory-mapped .npy file per
+                column, keyed by the md5 of the csv, and later calls only map
+                the requested columns. Text columns are read into memory.
             - db: Load data from a database.
                 File path should be to a query script.
-    
+    columns : list, optional
+        Columns to load, all of them by default.
+    dtype : str or dict, optional
+        A single dtype (e.g. "float32") is applied to the floating point
+        columns; a dictionary maps column names to dtypes.
+    cache_dir : str, optional
+        Folder of the columnar cache, data/.cache by default.
+
     Returns
     -------
     pd.DataFrame
         Dataframe containing the data from the csv file.
     """
     if source == "csv":
-        return pd.read_csv(file_path)
+        data = pd.read_csv(file_path, usecols=columns)
+        if columns is not None:
+            data = data[list(columns)]
+        if dtype is not None:
+            if not isinstance(dtype, dict):
+                dtype = {column: dtype for column in data.select_dtypes("floating").columns}
+            data = data.astype(dtype)
+        return data
+    elif source == "cache":
+        return _load_cached(file_path, columns=columns, dtype=dtype, cache_dir=cache_dir)
     # elif source == "db":
     #     return pd.read_sql(file_path)
     else:
-        raise ValueError("Invalid source. Please select a valid source.")
\ No newline at end of file
+        raise ValueError("Invalid source. Please select a valid source.")
@@ -0,0 +1,200 @@
+"""
+Module to profile the Lambda handler locally and recommend the MemorySize
+and Timeout of the function.
+
+For every candidate memory size, lambda_function.predict runs in a fresh
+interpreter whose data segment is limited to that size (RLIMIT_DATA), so a
+handler that does not fit fails with MemoryError like it would run out of
+memory on Lambda. The interpreter records its init time, the wall and CPU
+time of every invocation for several payload sizes, and its peak resident
+set. Lambda allocates CPU in proportion to memory, one vCPU at 1769 MB,
+so the CPU time is scaled by 1769 / MemorySize below that size to estimate
+the duration on Lambda. The recommendation is written to .env as
+FUNCTION_MEMORY_SIZE and FUNCTION_TIMEOUT, which create_function.py and
+deploy.py use.
+"""
+
+import os
+import sys
+import json
+import math
+import logging
+import argparse
+import resource
+import subprocess
+import pandas as pd
+from dotenv import load_dotenv, set_key
+
+LOGS_FOLDER = os.path.relpath("logs", os.getcwd())
+DATA_FOLDER = os.path.relpath("data", os.getcwd())
+SRC_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+MEMORY_SIZES = [128, 256, 512, 1024, 1769, 3008]
+PAYLOAD_SIZES = [1, 10, 100, 1000]
+FULL_VCPU_MEMORY_SIZE = 1769
+HEADROOM = 0.2
+TIMEOUT_SAFETY = 3
+MIN_TIMEOUT = 3
+MAX_TIMEOUT = 900
+
+PROFILE = """
+import sys, json, time, resource, statistics
+payloads, repeat = json.load(sys.stdin), int(sys.argv[1])
+start, start_cpu = time.perf_counter(), time.process_time()
+import lambda_function
+init = {"wall_ms": (time.perf_counter() - start) * 1e3, "cpu_ms": (time.process_time() - start_cpu) * 1e3}
+invocations = {}
+for size, body in payloads.items():
+    event = {"body": json.dumps(body)}
+    walls, cpus = [], []
+    for _ in range(repeat):
+        start, start_cpu = time.perf_counter(), time.process_time()
+        response = lambda_function.predict(event, None)
+        walls.append((time.perf_counter() - start) * 1e3)
+        cpus.append((time.process_time() - start_cpu) * 1e3)
+    if response["error"] != "None":
+        raise RuntimeError(f"Payload of {size} records failed: {response['error']}")
+    invocations[size] = {"wall_ms": statistics.median(walls), "cpu_ms": statistics.median(cpus), "max_wall_ms": max(walls)}
+print(json.dumps({
+    "init": init,
+    "invocations": invocations,
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+"""
+
+def build_payloads(data_path: str, sizes: list) -> dict:
+    """
+    Return one request body per payload size from the rows of the predict split,
+    a single record for size 1 and a list of records otherwise
+    """
+    X = pd.read_csv(data_path).drop(columns=["quality"], errors="ignore")
+    records = X.to_dict(orient="records")
+    payloads = {}
+    for size in sizes:
+        rows = [records[i % len(records)] for i in range(size)]
+        payloads[str(size)] = rows[0] if size == 1 else rows
+    return payloads
+
+def _limit_memory(memory_size: int):
+    limit = memory_size * 2**20
+    return lambda: resource.setrlimit(resource.RLIMIT_DATA, (limit, limit))
+
+def measure(memory_size: int, payloads: dict, repeat: int = 20, env: dict = None) -> dict:
+    """
+    Run the handler on the payloads in a fresh interpreter limited to memory_size MB.
+
+    Returns the measurements, or the error of a run that did not complete.
+    """
+    env = dict(os.environ if env is None else env)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [SRC_FOLDER, env.get("PYTHONPATH")]))
+    # The handler logs its own timings only when asked
+    env.pop("STAGE_TIMINGS", None)
+    result = subprocess.run(
+        [sys.executable, "-c", PROFILE, str(repeat)],
+        input=json.dumps(payloads), env=env, capture_output=True, text=True,
+        preexec_fn=_limit_memory(memory_size),
+    )
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        return {"memory_size": memory_size, "error": lines[-1] if lines else f"exit code {result.returncode}"}
+    return {"memory_size": memory_size, **json.loads(result.stdout.strip().splitlines()[-1])}
+
+def estimate_ms(timing: dict, memory_size: int) -> float:
+    """
+    Estimate the duration on Lambda of a timing measured on one full core.
+
+    CPU time is stretched by the fraction of a vCPU the memory size buys,
+    the time spent waiting is kept as is.
+    """
+    cpu_share = min(1.0, memory_size / FULL_VCPU_MEMORY_SIZE)
+    return timing["cpu_ms"] / cpu_share + max(0.0, timing["wall_ms"] - timing["cpu_ms"])
+
+def recommend(profiles: list, headroom: float = HEADROOM, max_duration_ms: float = None) -> dict:
+    """
+    Choose the MemorySize and Timeout of the function from the profiles.
+
+    Parameters
+    ----------
+    profiles : list
+        Result of measure for every candidate memory size.
+    headroom : float
+        Fraction of the memory size kept free above the peak resident set.
+    max_duration_ms : float
+        Largest accepted estimated duration of the largest payload. None to
+        take the smallest memory size that fits.
+
+    Returns
+    -------
+    dict
+        memory_size and timeout (seconds), and the profile they come from.
+    """
+    fitting = [
+        profile for profile in sorted(profiles, key=lambda profile: profile["memory_size"])
+        if "error" not in profile and profile["peak_rss_mb"] <= profile["memory_size"] * (1 - headroom)
+    ]
+    if not fitting:
+        raise ValueError("The handler does not fit in any of the memory sizes")
+
+    def largest_payload_ms(profile):
+        largest = max(profile["invocations"], key=int)
+        return estimate_ms(profile["invocations"][largest], profile["memory_size"])
+
+    chosen = next(
+        (profile for profile in fitting if max_duration_ms is None or largest_payload_ms(profile) <= max_duration_ms),
+        fitting[-1],
+    )
+    # A cold invocation pays the init and the largest payload
+    worst_ms = estimate_ms(chosen["init"], chosen["memory_size"]) + largest_payload_ms(chosen)
+    timeout = min(MAX_TIMEOUT, max(MIN_TIMEOUT, math.ceil(worst_ms * TIMEOUT_SAFETY / 1e3)))
+    return {"memory_size": chosen["memory_size"], "timeout": timeout, "profile": chosen}
+
+def main(memory_sizes: list = None, payload_sizes: list = None, repeat: int = 20,
+         max_duration_ms: float = None, dry_run: bool = False) -> dict:
+    load_dotenv()
+    payloads = build_payloads(os.path.join(DATA_FOLDER, "winequality-predict.csv"), payload_sizes or PAYLOAD_SIZES)
+
+    profiles = []
+    for memory_size in memory_sizes or MEMORY_SIZES:
+        profile = measure(memory_size, payloads, repeat)
+        profiles.append(profile)
+        if "error" in profile:
+            logging.info("%d MB: failed with %s", memory_size, profile["error"])
+            print(f"{memory_size:5d} MB  failed: {profile['error']}")
+            continue
+        logging.info("%d MB: %s", memory_size, json.dumps(profile))
+        estimates = "  ".join(
+            f"{size} rec {estimate_ms(timing, memory_size):7.1f} ms"
+            for size, timing in profile["invocations"].items()
+        )
+        print(
+            f"{memory_size:5d} MB  peak RSS {profile['peak_rss_mb']:6.1f} MB  "
+            f"init {estimate_ms(profile['init'], memory_size):7.1f} ms  {estimates}"
+        )
+
+    recommendation = recommend(profiles, max_duration_ms=max_duration_ms)
+    logging.info("Recommended MemorySize %d MB and Timeout %d s", recommendation["memory_size"], recommendation["timeout"])
+    print(f"Recommended MemorySize: {recommendation['memory_size']} MB, Timeout: {recommendation['timeout']} s")
+    if not dry_run:
+        set_key(".env", "FUNCTION_MEMORY_SIZE", str(recommendation["memory_size"]))
+        set_key(".env", "FUNCTION_TIMEOUT", str(recommendation["timeout"]))
+    return recommendation
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile the Lambda handler and recommend its MemorySize and Timeout.")
+    parser.add_argument("--memory-sizes", type=int, nargs="+", default=None, help="Candidate memory sizes in MB")
+    parser.add_argument("--payload-sizes", type=int, nargs="+", default=None, help="Records per request to profile")
+    parser.add_argument("--repeat", type=int, default=20, help="Invocations per payload size")
+    parser.add_argument("--max-duration-ms", type=float, default=None,
+                        help="Take the smallest memory size whose estimated duration of the largest payload is below this value")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the recommendation, do not write it to .env")
+    args = parser.parse_args()
+
+    script_name = os.path.splitext(os.path.basename(__file__))[0]
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)-18s %(name)-8s %(levelname)-8s %(message)s",
+        datefmt="%y-%m-%d %H:%M",
+        filename=os.path.join(LOGS_FOLDER, f"{script_name}.log"),
+        filemode="w",
+    )
+    main(args.memory_sizes, args.payload_sizes, args.repeat, args.max_duration_ms, args.dry_run)
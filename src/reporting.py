@@ -0,0 +1,126 @@
+"""
+Module to save confusion matrices without blocking training or scoring.
+
+Every matrix is written right away as a small JSON artifact with its labels
+and counts. The PNG plot is rendered by a background thread with the
+non-interactive Agg backend, on figures that are never registered with
+pyplot, so they are released as soon as they are saved. Plots can be
+skipped altogether and regenerated later from the JSON artifacts with
+`python3 src/reporting.py regenerate img/*.json`.
+"""
+
+import os
+import json
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import matplotlib
+matplotlib.use("Agg")
+import numpy as np
+from matplotlib.figure import Figure
+from sklearn.metrics import ConfusionMatrixDisplay
+
+IMAGES_FOLDER = os.path.relpath("img", os.getcwd())
+LOGS_FOLDER = os.path.relpath("logs", os.getcwd())
+
+def save_matrix(conf_mat: np.ndarray, labels: list, file_path: str):
+    """
+    Save a confusion matrix and its labels as JSON
+    """
+    with open(file_path, "w", encoding="utf-8") as file:
+        json.dump({"labels": np.asarray(labels).tolist(), "matrix": np.asarray(conf_mat).tolist()}, file)
+
+def load_matrix(file_path: str) -> tuple:
+    """
+    Return the confusion matrix and labels saved by save_matrix
+    """
+    with open(file_path, "r", encoding="utf-8") as file:
+        content = json.load(file)
+    return np.array(content["matrix"], dtype=np.int64), content["labels"]
+
+def render(conf_mat: np.ndarray, labels: list, file_path: str) -> str:
+    """
+    Plot a confusion matrix to a PNG file
+    """
+    fig = Figure()
+    ax = fig.subplots()
+    ConfusionMatrixDisplay(confusion_matrix=conf_mat, display_labels=labels).plot(ax=ax)
+    fig.savefig(file_path)
+    # Drop the references between figure, axes and artists right away
+    fig.clear()
+    return file_path
+
+class Reporter:
+    """
+    Saves confusion matrices as JSON and renders their plots in a background thread
+    """
+
+    def __init__(self, images_folder: str = None, plots: bool = True):
+        self.images_folder = images_folder or IMAGES_FOLDER
+        self.plots = plots
+        self._executor = None
+        self._pending = []
+
+    def confusion_matrix(self, conf_mat: np.ndarray, labels: list, name: str) -> list:
+        """
+        Save the matrix, queue its plot, and return the paths of the files
+        that will exist once wait() returns
+        """
+        json_path = os.path.join(self.images_folder, f"{name}.json")
+        save_matrix(conf_mat, labels, json_path)
+        if not self.plots:
+            return [json_path]
+        png_path = os.path.join(self.images_folder, f"{name}.png")
+        if self._executor is None:
+            # A single thread, since matplotlib is not meant to draw from several threads at once
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending.append(self._executor.submit(render, conf_mat, labels, png_path))
+        return [json_path, png_path]
+
+    def wait(self):
+        """
+        Wait for the queued plots, raising the first rendering error
+        """
+        pending, self._pending = self._pending, []
+        for future in pending:
+            logging.info("Confusion matrix saved to '%s'.", future.result())
+
+    def close(self):
+        self.wait()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def regenerate(json_paths: list) -> list:
+    """
+    Render the plots of saved confusion matrices again, next to their JSON files
+    """
+    png_paths = []
+    for json_path in json_paths:
+        conf_mat, labels = load_matrix(json_path)
+        png_paths.append(render(conf_mat, labels, f"{os.path.splitext(json_path)[0]}.png"))
+        logging.info("Confusion matrix saved to '%s'.", png_paths[-1])
+    return png_paths
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage confusion matrix reports.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    regenerate_parser = subparsers.add_parser("regenerate", help="Render the plots of saved confusion matrices")
+    regenerate_parser.add_argument("files", nargs="+", help="Confusion matrix JSON files, inside img")
+    args = parser.parse_args()
+
+    script_name = os.path.splitext(os.path.basename(__file__))[0]
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)-18s %(name)-8s %(levelname)-8s %(message)s",
+        datefmt="%y-%m-%d %H:%M",
+        filename=os.path.join(LOGS_FOLDER, f"{script_name}.log"),
+        filemode="w",
+    )
+    regenerate(args.files)
@@ -0,0 +1,195 @@
+"""
+Module to build the feature schema of a trained model and to validate
+prediction payloads against it with NumPy.
+
+train.py writes models/schema.json next to the model with the feature
+order and the range of every feature in the training data. The accepted
+range is the training range widened by a margin of its width on each side,
+so unusual but plausible wines are still scored while typos and unit
+mistakes are rejected. Records are checked for their key set, value types
+and ranges before any pandas or scikit-learn work, and every invalid
+record gets one error message per offending field.
+"""
+
+import json
+import itertools
+import numpy as np
+
+SCHEMA_VERSION = 1
+RANGE_MARGIN = 0.5
+
+NUMERIC_TYPES = (int, float)
+
+def build_schema(X, margin: float = RANGE_MARGIN, base: dict = None) -> dict:
+    """
+    Return the schema of a feature DataFrame, widening the ranges of base if given
+    """
+    minimum = X.min().to_numpy(dtype=np.float64)
+    maximum = X.max().to_numpy(dtype=np.float64)
+    if base is not None:
+        if [feature["name"] for feature in base["features"]] != list(X.columns):
+            raise ValueError("Features do not match the base schema")
+        minimum = np.minimum(minimum, [feature["min"] for feature in base["features"]])
+        maximum = np.maximum(maximum, [feature["max"] for feature in base["features"]])
+    width = maximum - minimum
+    return {
+        "version": SCHEMA_VERSION,
+        "margin": margin,
+        "features": [
+            {
+                "name": name,
+                "type": "number",
+                "min": float(low),
+                "max": float(high),
+                "lower": float(low - margin * span),
+                "upper": float(high + margin * span),
+            }
+            for name, low, high, span in zip(X.columns, minimum, maximum, width)
+        ],
+    }
+
+def save(schema: dict, file_path: str):
+    """
+    Save a schema as JSON
+    """
+    with open(file_path, "w", encoding="utf-8") as file:
+        json.dump(schema, file, indent=2)
+
+def load(file_path: str) -> "FeatureSchema":
+    """
+    Load a schema saved by save
+    """
+    with open(file_path, "r", encoding="utf-8") as file:
+        return FeatureSchema(json.load(file))
+
+def format_errors(errors: dict) -> str:
+    """
+    Join the per-field errors of a record into one message
+    """
+    return "; ".join(f"{field}: {message}" for field, message in errors.items())
+
+class FeatureSchema:
+    """
+    Precompiled schema: the feature order, the key set and the accepted
+    lower and upper bounds as arrays, so a batch of records is checked
+    with a few vectorized comparisons.
+    """
+
+    _cache = {"features": None, "schema": None}
+
+    def __init__(self, schema: dict):
+        if schema.get("version") != SCHEMA_VERSION:
+            raise ValueError(f"Unsupported schema version: {schema.get('version')}")
+        self.schema = schema
+        self.features = [feature["name"] for feature in schema["features"]]
+        self.keys = frozenset(self.features)
+        self.lower = np.array([feature.get("lower", -np.inf) for feature in schema["features"]], dtype=np.float64)
+        self.upper = np.array([feature.get("upper", np.inf) for feature in schema["features"]], dtype=np.float64)
+
+    @classmethod
+    def of_features(cls, features: list) -> "FeatureSchema":
+        """
+        Return a schema without ranges for models trained before schema.json,
+        building it only when the features change
+        """
+        features = list(features)
+        if cls._cache["features"] != features:
+            cls._cache["schema"] = cls({
+                "version": SCHEMA_VERSION,
+                "features": [{"name": name, "type": "number"} for name in features],
+            })
+            cls._cache["features"] = features
+        return cls._cache["schema"]
+
+    def _key_errors(self, record) -> dict:
+        if isinstance(record, Exception):
+            # Rows that batch_records could not turn into records
+            return {"record": str(record)}
+        if not isinstance(record, dict):
+            return {"record": f"must be an object, got {type(record).__name__}"}
+        errors = {name: "missing" for name in self.features if name not in record}
+        errors.update({name: "unknown feature" for name in record if name not in self.keys})
+        return errors
+
+    def _range_error(self, value: float, column: int) -> str:
+        if not np.isfinite(value):
+            return f"must be finite, got {value}"
+        return f"{value:g} is outside the accepted range [{self.lower[column]:g}, {self.upper[column]:g}]"
+
+    def _drop_overflowing(self, rows: list, valid_index: list, errors: list) -> tuple:
+        kept_rows, kept_index = [], []
+        for row, i in zip(rows, valid_index):
+            invalid = {}
+            for name, value in zip(self.features, row):
+                try:
+                    float(value)
+                except OverflowError:
+                    invalid[name] = "must be finite, got a number too large for a float"
+            if invalid:
+                errors[i] = invalid
+            else:
+                kept_rows.append(row)
+                kept_index.append(i)
+        return kept_rows, kept_index
+
+    def validate(self, records: list) -> tuple:
+        """
+        Check the key set, types and ranges of the records.
+
+        Returns
+        -------
+        X : np.ndarray
+            Float64 rows of the valid records, in feature order.
+        valid_index : list
+            Position of every row of X in records.
+        errors : list
+            None for valid records, else a field -> message dictionary.
+        """
+        errors = [None] * len(records)
+        rows, valid_index = [], []
+        for i, record in enumerate(records):
+            if isinstance(record, dict) and record.keys() == self.keys:
+                rows.append([record[name] for name in self.features])
+                valid_index.append(i)
+            else:
+                errors[i] = self._key_errors(record)
+
+        # Booleans are ints to Python but not to the schema, and NumPy would parse numeric strings
+        if not set(map(type, itertools.chain.from_iterable(rows))).issubset(NUMERIC_TYPES):
+            typed_rows, typed_index = [], []
+            for row, i in zip(rows, valid_index):
+                invalid = {
+                    name: f"must be a number, got {type(value).__name__}"
+                    for name, value in zip(self.features, row) if type(value) not in NUMERIC_TYPES
+                }
+                if invalid:
+                    errors[i] = invalid
+                else:
+                    typed_rows.append(row)
+                    typed_index.append(i)
+            rows, valid_index = typed_rows, typed_index
+
+        try:
+            X = np.array(rows, dtype=np.float64).reshape(len(rows), len(self.features))
+        except OverflowError:
+            # JSON integers too large for a float64
+            rows, valid_index = self._drop_overflowing(rows, valid_index, errors)
+            X = np.array(rows, dtype=np.float64).reshape(len(rows), len(self.features))
+        out_of_range = ~(np.isfinite(X) & (X >= self.lower) & (X <= self.upper))
+        if out_of_range.any():
+            invalid_rows = out_of_range.any(axis=1)
+            for row in np.flatnonzero(invalid_rows):
+                errors[valid_index[row]] = {
+                    self.features[column]: self._range_error(X[row, column], column)
+                    for column in np.flatnonzero(out_of_range[row])
+                }
+            X = X[~invalid_rows]
+            valid_index = [i for i, invalid in zip(valid_index, invalid_rows) if not invalid]
+        return X, valid_index, errors
+
+    def validate_record(self, record) -> tuple:
+        """
+        Return the float64 row of one record and None, or None and its field errors
+        """
+        X, _, errors = self.validate([record])
+        return (X, None) if errors[0] is None else (None, errors[0])
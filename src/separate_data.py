@@ -8,7 +8,7 @@ LOGS_FOLDER = os.path.relpath("logs", os.getcwd())
 
 def main():
     data_path = os.path.join(DATA_FOLDER, "winequality-red.csv")
-    data = load_data(data_path)
+    data = load_data(data_path, source="cache")
 
     train_data, predict_data = train_test_split(data, test_size=0.25, random_state=42, shuffle=True)
 
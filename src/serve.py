@@ -0,0 +1,193 @@
+"""
+Module to serve the prediction handler over HTTP on our own hosts.
+
+The same request bodies as the API Gateway endpoint are accepted on
+POST /predict and answered by the logic of lambda_function.predict. The
+model is loaded once in the parent process and shared by the worker
+processes, which all accept connections on the same listening socket. In
+each worker, single-record requests that arrive within a few milliseconds
+of each other are scored together with one vectorized predict call, see
+batching.py.
+"""
+
+import os
+import json
+import signal
+import socket
+import asyncio
+import logging
+import argparse
+import multiprocessing
+from urllib.parse import parse_qsl
+from concurrent.futures import ThreadPoolExecutor
+import lambda_function
+from batching import MicroBatcher, MAX_BATCH, MAX_WAIT_MS
+
+LOGS_FOLDER = os.path.relpath("logs", os.getcwd())
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+
+def _predict_records(records: list) -> list:
+    model, scaler = lambda_function.load_artifacts()
+    return lambda_function.predict_records(records, model, scaler)
+
+async def handle_predict(body: bytes, batcher: MicroBatcher, executor: ThreadPoolExecutor, query: str = "") -> dict:
+    """
+    Answer a request body like lambda_function.predict does, batching single records.
+
+    Single records are validated and scored in the batcher thread, so the
+    event loop only parses the JSON. Batches, records the batch rejects and
+    ?debug=1 requests, which get the stage timings, go through the handler
+    in the executor for its exact responses.
+    """
+    if not body:
+        return lambda_function.predict({}, None)
+    event = {"body": body.decode("utf-8", errors="replace"), "queryStringParameters": dict(parse_qsl(query)) or None}
+    loop = asyncio.get_running_loop()
+    try:
+        record = json.loads(event["body"])
+    except ValueError:
+        record = None
+    if not isinstance(record, dict) or ("columns" in record and "data" in record) or lambda_function._debug_requested(event):
+        return await loop.run_in_executor(executor, lambda_function.predict, event, None)
+
+    try:
+        prediction, error = await batcher.predict_async(record)
+    except Exception:
+        error = "failed"
+    if error != "None":
+        return await loop.run_in_executor(executor, lambda_function.predict, event, None)
+    return {
+        "message": "Prediction made successfully",
+        "error": "None",
+        "prediction": prediction
+    }
+
+async def _route(method: str, target: str, body: bytes, batcher: MicroBatcher, executor: ThreadPoolExecutor) -> tuple:
+    path, _, query = target.partition("?")
+    if path in ("/", "/predict"):
+        if method != "POST":
+            return 405, {"message": "Use POST"}
+        return 200, await handle_predict(body, batcher, executor, query)
+    if path == "/health":
+        return 200, {
+            "status": "ok",
+            "pid": os.getpid(),
+            "batching": batcher.stats(),
+            "registry": lambda_function.registry.stats(),
+            "prediction_cache": lambda_function.prediction_cache.stats(),
+        }
+    return 404, {"message": f"No route for {path}"}
+
+async def _handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, batcher: MicroBatcher, executor: ThreadPoolExecutor):
+    """
+    Serve the HTTP/1.1 requests of one keep-alive connection
+    """
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            try:
+                method, target, version = request_line.decode("latin-1").split()
+            except ValueError:
+                break
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            try:
+                length = int(headers.get("content-length") or 0)
+                if length < 0:
+                    raise ValueError(length)
+            except ValueError:
+                # The body cannot be delimited, so the connection cannot be reused
+                status, response, keep_alive = 400, {"message": "Invalid Content-Length header"}, False
+            else:
+                body = await reader.readexactly(length)
+                status, response = await _route(method, target, body, batcher, executor)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+            content = json.dumps(response).encode()
+            writer.write(
+                f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(content)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode()
+                + content
+            )
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+async def serve(sock: socket.socket, max_batch: int = MAX_BATCH, max_wait_ms: float = MAX_WAIT_MS):
+    """
+    Accept connections on the listening socket until cancelled
+    """
+    batcher = MicroBatcher(_predict_records, max_batch=max_batch, max_wait_ms=max_wait_ms)
+    # Batches and rejected records are answered by the handler off the event loop
+    executor = ThreadPoolExecutor(max_workers=1)
+    server = await asyncio.start_server(
+        lambda reader, writer: _handle_connection(reader, writer, batcher, executor), sock=sock
+    )
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batcher.close()
+        executor.shutdown(wait=False)
+
+def _run_worker(sock: socket.socket, max_batch: int, max_wait_ms: float):
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    try:
+        asyncio.run(serve(sock, max_batch, max_wait_ms))
+    except KeyboardInterrupt:
+        pass
+
+def main(host: str = "127.0.0.1", port: int = 8080, workers: int = 1, max_batch: int = MAX_BATCH, max_wait_ms: float = MAX_WAIT_MS):
+    # Load the model before forking, so the workers share its pages
+    lambda_function.load_artifacts()
+    sock = socket.create_server((host, port), backlog=1024)
+    logging.info("Serving on http://%s:%d/predict with %d workers.", host, sock.getsockname()[1], workers)
+
+    if workers == 1:
+        _run_worker(sock, max_batch, max_wait_ms)
+        return
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=_run_worker, args=(sock, max_batch, max_wait_ms)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+        sock.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the prediction handler over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="Most records scored in one predict call")
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS, help="Longest a record waits for others to batch with")
+    args = parser.parse_args()
+
+    script_name = os.path.splitext(os.path.basename(__file__))[0]
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)-18s %(name)-8s %(levelname)-8s %(message)s",
+        datefmt="%y-%m-%d %H:%M",
+        filename=os.path.join(LOGS_FOLDER, f"{script_name}.log"),
+        filemode="w",
+    )
+    main(args.host, args.port, args.workers, args.max_batch, args.max_wait_ms)
@@ -0,0 +1,93 @@
+"""
+Module to time the stages of a prediction request or scoring run.
+
+Stages are timed with time.perf_counter_ns, which is monotonic and has
+nanosecond resolution, and reported in milliseconds as one CloudWatch
+Embedded Metric Format (EMF) record per invocation, so the same log line
+is readable as is and turned into metrics by CloudWatch Logs. A disabled
+timer hands out a shared no-op context manager and records nothing.
+"""
+
+import json
+import time
+from contextlib import nullcontext
+
+NAMESPACE = "WineQuality"
+
+_NO_STAGE = nullcontext()
+
+class _Stage:
+    """
+    Context manager adding the time spent in its block to one stage
+    """
+    __slots__ = ("timings_ns", "name", "start")
+
+    def __init__(self, timings_ns: dict, name: str):
+        self.timings_ns = timings_ns
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timings_ns[self.name] = self.timings_ns.get(self.name, 0) + time.perf_counter_ns() - self.start
+
+class StageTimer:
+    """
+    Collects the time spent in named stages, in the order they first ran.
+
+    A stage entered several times, e.g. once per chunk, adds up its times.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.timings_ns = {}
+        self.start = time.perf_counter_ns() if enabled else 0
+
+    def stage(self, name: str):
+        """
+        Return a context manager timing its block as the named stage
+        """
+        if not self.enabled:
+            return _NO_STAGE
+        return _Stage(self.timings_ns, name)
+
+    def timings_ms(self) -> dict:
+        """
+        Return the time of every stage and the total since the timer was created, in milliseconds
+        """
+        if not self.enabled:
+            return {}
+        timings = {name: elapsed / 1e6 for name, elapsed in self.timings_ns.items()}
+        timings["total"] = (time.perf_counter_ns() - self.start) / 1e6
+        return timings
+
+    def emf(self, dimensions: dict, namespace: str = NAMESPACE) -> dict:
+        """
+        Return the timings as an Embedded Metric Format record with the given dimensions
+        """
+        metrics = {f"{name}_ms": round(value, 3) for name, value in self.timings_ms().items()}
+        return {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": namespace,
+                    "Dimensions": [list(dimensions)],
+                    "Metrics": [{"Name": name, "Unit": "Milliseconds"} for name in metrics],
+                }],
+            },
+            **dimensions,
+            **metrics,
+        }
+
+    def emit(self, write, dimensions: dict, namespace: str = NAMESPACE) -> str:
+        """
+        Write the EMF record as one JSON line with write (print, logging.info, ...) and return it
+        """
+        line = json.dumps(self.emf(dimensions, namespace))
+        write(line)
+        return line
+
+# Shared timer for callers that are not timed
+NO_TIMER = StageTimer(enabled=False)
@@ -0,0 +1,247 @@
+"""
+Module to buffer MLflow tracking calls so training does not block on the
+tracking server.
+
+A Tracker runs in one of three modes:
+    - sync: every call goes straight to MLflow, as before.
+    - async (default): metrics and params are buffered and sent with
+      log_batch when the run is flushed, while artifacts and models are
+      uploaded by a background thread pool.
+    - offline: everything is written to a local store that can be synced
+      to a tracking server later with `python3 src/tracking.py sync <dir>`.
+"""
+
+import os
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+import mlflow
+from mlflow.entities import Metric, Param
+from mlflow.tracking import MlflowClient
+from dotenv import load_dotenv
+
+OFFLINE_FOLDER = os.path.relpath("mlruns_offline", os.getcwd())
+LOGS_FOLDER = os.path.relpath("logs", os.getcwd())
+
+# log_batch accepts at most 1000 metrics and 100 params per call
+MAX_BATCH_METRICS = 1000
+MAX_BATCH_PARAMS = 100
+
+MODES = ("sync", "async", "offline")
+
+def _batches(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+class Tracker:
+    """
+    Buffered replacement for the mlflow.log_* calls used during training
+    """
+
+    def __init__(self, mode: str = "async", max_workers: int = 4, offline_folder: str = None, run_id: str = None):
+        if mode not in MODES:
+            raise ValueError(f"Invalid tracking mode. Options: {MODES}")
+        self.mode = mode
+        self.max_workers = max_workers
+        self.offline_folder = offline_folder or OFFLINE_FOLDER
+        # Set run_id to attach to a run that is already open
+        self.run_id = run_id
+        self.store = None
+        self._metrics = []
+        self._params = {}
+        self._futures = []
+        self._executor = None
+
+    @contextlib.contextmanager
+    def start_run(self, run_name: str, experiment_name: str):
+        """
+        Open a run, and flush everything buffered when it ends
+        """
+        if self.mode == "offline":
+            self.store = os.path.join(self.offline_folder, f"{run_name}-{time.strftime('%Y%m%d-%H%M%S')}")
+            os.makedirs(os.path.join(self.store, "artifacts"), exist_ok=True)
+            os.makedirs(os.path.join(self.store, "models"), exist_ok=True)
+            with open(os.path.join(self.store, "run.json"), "w", encoding="utf-8") as file:
+                json.dump({"run_name": run_name, "experiment_name": experiment_name, "models": []}, file)
+            try:
+                yield self
+            finally:
+                self.flush()
+            logging.info("Offline run stored in '%s'.", self.store)
+            return
+
+        mlflow.set_experiment(experiment_name)
+        with mlflow.start_run() as run:
+            mlflow.set_tag("mlflow.runName", run_name)
+            self.run_id = run.info.run_id
+            try:
+                yield self
+            finally:
+                self.close()
+
+    def log_metric(self, key: str, value: float, step: int = 0):
+        if self.mode == "sync":
+            mlflow.log_metric(key, value, step=step)
+            return
+        self._metrics.append(Metric(key, float(value), int(time.time() * 1000), step))
+
+    def log_metrics(self, metrics: dict, step: int = 0):
+        for key, value in metrics.items():
+            self.log_metric(key, value, step)
+
+    def log_params(self, params: dict):
+        if self.mode == "sync":
+            mlflow.log_params(params)
+            return
+        self._params.update({key: str(value) for key, value in params.items()})
+
+    def log_artifact(self, local_path: str):
+        if self.mode == "sync":
+            mlflow.log_artifact(local_path)
+        elif self.mode == "offline":
+            shutil.copy(local_path, os.path.join(self.store, "artifacts"))
+        else:
+            self._submit(MlflowClient().log_artifact, self.run_id, local_path)
+
+    def log_model(self, model, artifact_path: str, registered_model_name: str = None, **kwargs):
+        """
+        Log a scikit-learn model. Outside sync mode the model is saved
+        locally right away and uploaded and registered in the background
+        """
+        if self.mode == "sync":
+            mlflow.sklearn.log_model(model, artifact_path, registered_model_name=registered_model_name, **kwargs)
+            return
+
+        if self.mode == "offline":
+            mlflow.sklearn.save_model(model, os.path.join(self.store, "models", artifact_path), **kwargs)
+            run_file = os.path.join(self.store, "run.json")
+            with open(run_file, "r", encoding="utf-8") as file:
+                run_info = json.load(file)
+            run_info["models"].append({"artifact_path": artifact_path, "registered_model_name": registered_model_name})
+            with open(run_file, "w", encoding="utf-8") as file:
+                json.dump(run_info, file)
+            return
+
+        local_dir = os.path.join(tempfile.mkdtemp(prefix="mlflow-model-"), artifact_path)
+        mlflow.sklearn.save_model(model, local_dir, **kwargs)
+        self._submit(_upload_model, self.run_id, local_dir, artifact_path, registered_model_name, True)
+
+    def _submit(self, func, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        self._futures.append(self._executor.submit(func, *args))
+
+    def close(self):
+        """
+        Flush and stop the upload threads
+        """
+        self.flush()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def flush(self):
+        """
+        Send buffered metrics and params and wait for pending uploads
+        """
+        metrics, params = self._metrics, self._params
+        self._metrics, self._params = [], {}
+        if self.mode == "offline":
+            with open(os.path.join(self.store, "metrics.jsonl"), "a", encoding="utf-8") as file:
+                for metric in metrics:
+                    file.write(json.dumps([metric.key, metric.value, metric.timestamp, metric.step]) + "\n")
+            params_file = os.path.join(self.store, "params.json")
+            if params:
+                stored = {}
+                if os.path.exists(params_file):
+                    with open(params_file, "r", encoding="utf-8") as file:
+                        stored = json.load(file)
+                stored.update(params)
+                with open(params_file, "w", encoding="utf-8") as file:
+                    json.dump(stored, file)
+            return
+
+        if self.mode == "async":
+            start = time.perf_counter()
+            _log_batch(self.run_id, metrics, params)
+            futures, self._futures = self._futures, []
+            for future in futures:
+                future.result()
+            logging.info(
+                "Flushed %d metrics, %d params and %d uploads in %.2fs.",
+                len(metrics), len(params), len(futures), time.perf_counter() - start,
+            )
+
+def _log_batch(run_id: str, metrics: list, params: dict):
+    client = MlflowClient()
+    param_list = [Param(key, value) for key, value in params.items()]
+    for batch in _batches(param_list, MAX_BATCH_PARAMS):
+        client.log_batch(run_id, params=batch)
+    for batch in _batches(metrics, MAX_BATCH_METRICS):
+        client.log_batch(run_id, metrics=batch)
+
+def _upload_model(run_id: str, local_dir: str, artifact_path: str, registered_model_name: str = None, cleanup: bool = False):
+    try:
+        MlflowClient().log_artifacts(run_id, local_dir, artifact_path)
+        if registered_model_name is not None:
+            mlflow.register_model(f"runs:/{run_id}/{artifact_path}", registered_model_name)
+    finally:
+        if cleanup:
+            shutil.rmtree(os.path.dirname(local_dir), ignore_errors=True)
+
+def sync(store: str) -> str:
+    """
+    Replay an offline run into the configured tracking server.
+
+    Returns the id of the created run.
+    """
+    with open(os.path.join(store, "run.json"), "r", encoding="utf-8") as file:
+        run_info = json.load(file)
+    metrics = []
+    metrics_file = os.path.join(store, "metrics.jsonl")
+    if os.path.exists(metrics_file):
+        with open(metrics_file, "r", encoding="utf-8") as file:
+            metrics = [Metric(*json.loads(line)) for line in file]
+    params = {}
+    params_file = os.path.join(store, "params.json")
+    if os.path.exists(params_file):
+        with open(params_file, "r", encoding="utf-8") as file:
+            params = json.load(file)
+
+    mlflow.set_experiment(run_info["experiment_name"])
+    with mlflow.start_run() as run:
+        mlflow.set_tag("mlflow.runName", run_info["run_name"])
+        run_id = run.info.run_id
+        _log_batch(run_id, metrics, params)
+        client = MlflowClient()
+        for artifact in sorted(os.listdir(os.path.join(store, "artifacts"))):
+            client.log_artifact(run_id, os.path.join(store, "artifacts", artifact))
+        for model in run_info["models"]:
+            _upload_model(run_id, os.path.join(store, "models", model["artifact_path"]), model["artifact_path"], model["registered_model_name"])
+    logging.info("Offline run '%s' synced as run %s.", store, run_id)
+    return run_id
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage offline MLflow runs.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    sync_parser = subparsers.add_parser("sync", help="Upload offline runs to the tracking server")
+    sync_parser.add_argument("stores", nargs="+", help="Offline run folders, inside mlruns_offline")
+    args = parser.parse_args()
+
+    script_name = os.path.splitext(os.path.basename(__file__))[0]
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)-18s %(name)-8s %(levelname)-8s %(message)s",
+        datefmt="%y-%m-%d %H:%M",
+        filename=os.path.join(LOGS_FOLDER, f"{script_name}.log"),
+        filemode="w",
+    )
+    load_dotenv()
+    mlflow.set_tracking_uri(os.getenv("MLFLOW_TRACKING_URI"))
+    for store in args.stores:
+        sync(store)
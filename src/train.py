@@ -1,32 +1,156 @@
 import os
+import json
+import time
+import shutil
+import argparse
 import mlflow
-import matplotlib.pyplot as plt
 from sklearn.svm import SVC
 from sklearn.linear_model import SGDClassifier
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import (
-    accuracy_score,
-    precision_score,
-    recall_score,
-    f1_score,
-    confusion_matrix,
-    ConfusionMatrixDisplay,
-)
-from sklearn.model_selection import train_test_split, GridSearchCV, cross_val_score
+from sklearn.model_selection import train_test_split
 import joblib  # Add this for saving/loading models
 import logging
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
-from process import load_data
+from process import load_data, file_hash
+from metrics import ConfusionMatrix
+from reporting import Reporter
+import numpy_model
+import schema
+import tune
+from tracking import Tracker, MODES
 
 DATA_FOLDER = os.path.relpath("data", os.getcwd())
 MODEL_FOLDER = os.path.relpath("models", os.getcwd())
 IMAGES_FOLDER = os.path.relpath("img", os.getcwd())
+SGD_FOLDER = os.path.join(MODEL_FOLDER, "sgd")
+KEEP_SGD_VERSIONS = 5
 LOGS_FOLDER = os.path.relpath("logs", os.getcwd())
 
-def train_model():
-    data_path = os.path.join(DATA_FOLDER, "winequality-train.csv")
+def _fit_and_predict(model_name, model, X_train, y_train, X_test):
+    """
+    Fit a candidate model and predict both splits. Runs inside a worker
+    process when training in parallel.
+    """
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+    return model_name, model, model.predict(X_train), model.predict(X_test), fit_seconds
+
+def fit_candidates(models: dict, X_train, y_train, X_test, parallel: bool = False, max_workers: int = None) -> list:
+    """
+    Fit every candidate model, one after another or at the same time in a
+    process pool. Results are returned in the order of models.
+    """
+    if not parallel:
+        return [_fit_and_predict(name, model, X_train, y_train, X_test) for name, model in models.items()]
+
+    with ProcessPoolExecutor(max_workers=max_workers or len(models)) as executor:
+        futures = [
+            executor.submit(_fit_and_predict, name, model, X_train, y_train, X_test)
+            for name, model in models.items()
+        ]
+        return [future.result() for future in futures]
+
+def sgd_versions() -> list:
+    """
+    Return the saved SGDClassifier versions, oldest first
+    """
+    if not os.path.isdir(SGD_FOLDER):
+        return []
+    return sorted(int(name[1:]) for name in os.listdir(SGD_FOLDER) if name.startswith("v") and name[1:].isdigit())
+
+def save_sgd_version(model: SGDClassifier, scaler: StandardScaler, keep: int = KEEP_SGD_VERSIONS, **meta) -> int:
+    """
+    Save the SGDClassifier and its scaler as the next version in models/sgd,
+    removing the oldest versions beyond the last keep
+    """
+    versions = sgd_versions()
+    version = versions[-1] + 1 if versions else 1
+    folder = os.path.join(SGD_FOLDER, f"v{version}")
+    os.makedirs(folder)
+    joblib.dump(model, os.path.join(folder, "model.pkl"))
+    joblib.dump(scaler, os.path.join(folder, "scaler.pkl"))
+    with open(os.path.join(folder, "meta.json"), "w", encoding="utf-8") as file:
+        json.dump({"version": version, "created": time.strftime("%Y-%m-%dT%H:%M:%S"), **meta}, file, indent=2)
+    logging.info("SGDClassifier version %d saved in '%s'.", version, folder)
+    for old_version in (versions + [version])[:-keep]:
+        shutil.rmtree(os.path.join(SGD_FOLDER, f"v{old_version}"))
+        logging.info("SGDClassifier version %d removed.", old_version)
+    return version
+
+def load_sgd_version(version: int = None) -> tuple:
+    """
+    Return the model, scaler and metadata of a saved SGDClassifier version, the latest by default
+    """
+    versions = sgd_versions()
+    if not versions:
+        raise FileNotFoundError(f"No SGDClassifier version in '{SGD_FOLDER}'. Run train.py once first.")
+    folder = os.path.join(SGD_FOLDER, f"v{versions[-1] if version is None else version}")
+    with open(os.path.join(folder, "meta.json"), "r", encoding="utf-8") as file:
+        meta = json.load(file)
+    return joblib.load(os.path.join(folder, "model.pkl")), joblib.load(os.path.join(folder, "scaler.pkl")), meta
+
+def train_incremental(data_path: str, tracker: Tracker = None, promote: bool = False) -> int:
+    """
+    Update the latest SGDClassifier with new labelled rows only.
+
+    The scaler statistics are updated with partial_fit on the new rows,
+    and the model continues its training with partial_fit on them, so the
+    cost is proportional to the new data. Before the update, the previous
+    version is scored on the new rows, which it has never seen. With
+    promote, the new version also replaces the served model.
+
+    Returns the new version number.
+    """
+    tracker = tracker or Tracker("sync")
+    model, scaler, meta = load_sgd_version()
     data = load_data(data_path)
+    X = data.drop("quality", axis=1)
+    y = data["quality"].to_numpy()
+
+    unknown = sorted(set(y.tolist()) - set(model.classes_.tolist()))
+    if unknown:
+        raise ValueError(f"Labels {unknown} were not seen in the full training. Retrain with train.py instead.")
+
+    confusion = ConfusionMatrix.from_predictions(y, model.predict(scaler.transform(X)))
+    metrics = {f"previous_{name}": value for name, value in confusion.metrics().items()}
+    logging.info("Version %d accuracy on the %d new rows: %f", meta["version"], len(X), metrics["previous_accuracy"])
+
+    start = time.perf_counter()
+    scaler.partial_fit(X)
+    model.partial_fit(scaler.transform(X), y)
+    logging.info("Updated SGDClassifier on %d new rows in %.2fs.", len(X), time.perf_counter() - start)
+
+    version = save_sgd_version(
+        model, scaler,
+        mode="incremental", base_version=meta["version"],
+        n_samples=meta["n_samples"] + len(X), new_samples=len(X), data_md5=file_hash(data_path),
+    )
+    tracker.log_params({"sgd_version": version, "base_version": meta["version"], "new_samples": len(X)})
+    tracker.log_metrics(metrics)
+
+    if promote:
+        joblib.dump(model, os.path.join(MODEL_FOLDER, "model.pkl"))
+        joblib.dump(scaler, os.path.join(MODEL_FOLDER, "scaler.pkl"))
+        arrays = numpy_model.export_arrays(model, scaler)
+        numpy_model.save(arrays, os.path.join(MODEL_FOLDER, "model.npz"))
+        numpy_model.save_bundle(arrays, os.path.join(MODEL_FOLDER, "model.bundle"), training_md5=file_hash(data_path))
+        # The served model has now seen the new rows, so their values are accepted as well
+        schema_path = os.path.join(MODEL_FOLDER, "schema.json")
+        base = schema.load(schema_path).schema if os.path.exists(schema_path) else None
+        schema.save(schema.build_schema(X, base=base), schema_path)
+        logging.info("SGDClassifier version %d promoted to '%s'.", version, MODEL_FOLDER)
+    return version
+
+def train_model(parallel: bool = False, max_workers: int = None, search: str = None, n_jobs: int = -1, tracker: Tracker = None, plots: bool = True):
+    tracker = tracker or Tracker("sync")
+    # Confusion matrix plots are rendered in the background while the loop goes on
+    reporter = Reporter(IMAGES_FOLDER, plots=plots)
+    report_files = []
+    data_path = os.path.join(DATA_FOLDER, "winequality-train.csv")
+    data = load_data(data_path, source="cache")
 
     X = data.drop("quality", axis=1)
     y = data["quality"]
@@ -45,17 +169,21 @@ def train_model():
     best_model = None
     best_score = 0
 
-    for i, (model_name, model) in enumerate(models.items()):
-        logging.info("Training %s...", model_name)
-        model.fit(X_train, y_train)
+    start = time.perf_counter()
+    results = fit_candidates(models, X_train, y_train, X_test, parallel=parallel, max_workers=max_workers)
+    logging.info("Fitted %d models in %.2fs (parallel=%s).", len(results), time.perf_counter() - start, parallel)
+
+    # Logging and plotting only start once every model is fitted
+    for i, (model_name, model, y_train_pred, y_pred, fit_seconds) in enumerate(results):
+        logging.info("Trained %s in %.2fs.", model_name, fit_seconds)
 
         # Infer signature (input and output schema)
         signature = mlflow.models.signature.infer_signature(
-            X_train, model.predict(X_train)
+            X_train, y_train_pred
         )
 
         # Log model
-        mlflow.sklearn.log_model(
+        tracker.log_model(
             model,
             f"model_{model_name}",
             signature=signature,
@@ -63,34 +191,23 @@ def train_model():
             input_example=X_train[:3],
         )
 
-        y_pred = model.predict(X_test)
-
         # Calculate metrics
-        accuracy = accuracy_score(y_test, y_pred)
-        precision = precision_score(y_test, y_pred, average="weighted", zero_division=0)
-        recall = recall_score(y_test, y_pred, average="weighted", zero_division=0)
-        f1 = f1_score(y_test, y_pred, average="weighted", zero_division=0)
+        confusion = ConfusionMatrix.from_predictions(y_test, y_pred)
+        metrics = confusion.metrics()
+        accuracy = metrics["accuracy"]
 
         logging.info("%s Accuracy: %f:.2f", model_name, accuracy)
+        # Base for the incremental updates of train_incremental
+        if isinstance(model, SGDClassifier):
+            save_sgd_version(model, scaler, mode="full", n_samples=len(X_train), data_md5=file_hash(data_path), accuracy=accuracy)
         if accuracy > best_score:
             best_model = model
             best_score = accuracy
 
         # Log metrics
-        mlflow.log_metric("accuracy", accuracy, step=i)
-        mlflow.log_metric("precision", precision, step=i)
-        mlflow.log_metric("recall", recall, step=i)
-        mlflow.log_metric("f1", f1, step=i)
-        conf_mat = confusion_matrix(y_test, y_pred, labels=model.classes_)
-        conf_mat_disp = ConfusionMatrixDisplay(
-            confusion_matrix=conf_mat, display_labels=model.classes_
-        )
-        fig, ax = plt.subplots()
-        conf_mat_disp.plot(ax=ax)
-        fig_name = f"confusion_matrix_{model_name}.png"
-        fig_path = os.path.join(IMAGES_FOLDER, fig_name)
-        fig.savefig(fig_path)
-        mlflow.log_artifact(fig_path)
+        tracker.log_metrics(metrics, step=i)
+        conf_mat = confusion.matrix(model.classes_)
+        report_files.extend(reporter.confusion_matrix(conf_mat, model.classes_, f"confusion_matrix_{model_name}"))
     
     # Save the best-performing model
     model_file_path = os.path.join(MODEL_FOLDER, "model.pkl")
@@ -100,35 +217,61 @@ def train_model():
         joblib.dump(scaler, scaler_file_path)
         logging.info("Best model (%s) saved as '%s'.", type(best_model).__name__, model_file_path)
         logging.info("Scaler saved as '%s'.", scaler_file_path)
+
+        # Feature order and value ranges, checked by the handler before scoring
+        schema_file_path = os.path.join(MODEL_FOLDER, "schema.json")
+        schema.save(schema.build_schema(X), schema_file_path)
+        logging.info("Feature schema saved as '%s'.", schema_file_path)
+
+        # Export a NumPy-only copy for serving without scikit-learn
+        numpy_model_path = os.path.join(MODEL_FOLDER, "model.npz")
+        arrays = numpy_model.export_arrays(best_model, scaler)
+        numpy_model.save(arrays, numpy_model_path)
+        mismatches = numpy_model.check_parity(best_model, numpy_model.load(numpy_model_path), scaler, X)
+        if mismatches:
+            logging.warning("NumPy model disagrees with %s on %d/%d samples.", type(best_model).__name__, mismatches, len(X))
+        logging.info("NumPy model saved as '%s'.", numpy_model_path)
+
+        # Same arrays in one memory-mappable file, read by predict.py, batch_predict.py and the handler
+        bundle_path = os.path.join(MODEL_FOLDER, "model.bundle")
+        numpy_model.save_bundle(arrays, bundle_path, training_md5=file_hash(data_path))
+        logging.info("Model bundle saved as '%s'.", bundle_path)
+
+    reporter.close()
+    for file_path in report_files:
+        tracker.log_artifact(file_path)
     
-    # GridSearchCV for hyperparameter tuning
-    # print(f"Hyperparameters of {type(best_model).__name__}: ", best_model.get_params())
-    # param_grid = {
-    #     "C": np.arange(0.1, 2, 0.1),
-    #     "kernel":["linear", "rbf"],
-    #     "gamma": np.arange(0.1, 2, 0.1)
-    # }
-    # grid = GridSearchCV(best_model, param_grid, cv=5)
-    # grid.fit(X_train, y_train)
-    # print(f"Best parameters for {type(best_model).__name__}:", grid.best_params_)
-    # print(f"Best cross-validation score for {type(best_model).__name__}:", grid.best_score_)
-
-    # # Save the GridSearchCV best estimator if desired
-    # estimator_filename = "best_model_gridsearch.pkl"
-    # estimator_file_path = os.path.join(MODEL_FOLDER, estimator_filename)
-    # joblib.dump(grid.best_estimator_, estimator_file_path)
-    # print(f"Best GridSearchCV model saved as '{estimator_file_path}'.")
-
-def main(run_name: str = "wine-quality-model", experiment_name: str = "wine-quality-exp"):
+    # Hyperparameter tuning, see tune.py
+    if search is not None:
+        tune.tune(X_train, y_train.to_numpy(), search=search, n_jobs=n_jobs, tracker=tracker)
+
+def main_incremental(data_path: str, promote: bool = False, run_name: str = "wine-quality-incremental", experiment_name: str = "wine-quality-exp", tracking: str = "async"):
     load_dotenv()
     mlflow.set_tracking_uri(os.getenv("MLFLOW_TRACKING_URI"))
-    mlflow.set_experiment(experiment_name)
-    with mlflow.start_run():
-        mlflow.set_tag("mlflow.runName", run_name)
-        train_model()
+    tracker = Tracker(tracking)
+    with tracker.start_run(run_name, experiment_name):
+        train_incremental(data_path, tracker=tracker, promote=promote)
+
+def main(run_name: str = "wine-quality-model", experiment_name: str = "wine-quality-exp", parallel: bool = False, max_workers: int = None, search: str = None, n_jobs: int = -1, tracking: str = "async", plots: bool = True):
+    load_dotenv()
+    mlflow.set_tracking_uri(os.getenv("MLFLOW_TRACKING_URI"))
+    tracker = Tracker(tracking)
+    with tracker.start_run(run_name, experiment_name):
+        train_model(parallel=parallel, max_workers=max_workers, search=search, n_jobs=n_jobs, tracker=tracker, plots=plots)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the candidate models and save the best one.")
+    parser.add_argument("--parallel", action="store_true", help="Fit the candidate models at the same time in a process pool")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: one per model)")
+    parser.add_argument("--tune", choices=list(tune.SEARCHES), default=None, help="Tune the SVC hyperparameters after training")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Number of parallel tuning trials, -1 for all cores")
+    parser.add_argument("--tracking", choices=MODES, default="async", help="How MLflow calls are sent, see tracking.py")
+    parser.add_argument("--no-plots", action="store_true", help="Only save the confusion matrices as JSON, see reporting.py")
+    parser.add_argument("--incremental", metavar="CSV", default=None, help="Only update the latest SGDClassifier with the new rows of this file")
+    parser.add_argument("--promote", action="store_true", help="With --incremental, also serve the updated SGDClassifier")
+    args = parser.parse_args()
+
     script_name = os.path.splitext(os.path.basename(__file__))[0]
     logging.basicConfig(
         level=logging.INFO,
@@ -137,5 +280,8 @@ if __name__ == "__main__":
         filename=os.path.join(LOGS_FOLDER, f"{script_name}.log"),
         filemode="w",
     )
-    main()
+    if args.incremental is not None:
+        main_incremental(args.incremental, promote=args.promote, tracking=args.tracking)
+    else:
+        main(parallel=args.parallel, max_workers=args.workers, search=args.tune, n_jobs=args.n_jobs, tracking=args.tracking, plots=not args.no_plots)
 
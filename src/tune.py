@@ -0,0 +1,271 @@
+"""
+Module to tune the hyperparameters of the SVC model.
+
+Trials run in parallel with joblib and every completed trial is appended to
+a cache file, so an interrupted search resumes without refitting the trials
+it already finished. Supported searches are an exhaustive grid, a randomized
+search over the same grid and successive halving, which scores every
+candidate on a small sample and only keeps the best third for the next,
+three times larger, round.
+"""
+
+import os
+import json
+import math
+import time
+import hashlib
+import logging
+import argparse
+import mlflow
+import numpy as np
+import joblib
+from joblib import Parallel, delayed
+from dotenv import load_dotenv
+from sklearn.base import clone
+from sklearn.svm import SVC
+from sklearn.model_selection import ParameterGrid, ParameterSampler, cross_validate, train_test_split
+from sklearn.preprocessing import StandardScaler
+from process import load_data
+from tracking import Tracker
+
+DATA_FOLDER = os.path.relpath("data", os.getcwd())
+MODEL_FOLDER = os.path.relpath("models", os.getcwd())
+LOGS_FOLDER = os.path.relpath("logs", os.getcwd())
+
+PARAM_GRID = {
+    "C": np.arange(0.1, 2, 0.1),
+    "kernel": ["linear", "rbf"],
+    "gamma": np.arange(0.1, 2, 0.1),
+}
+
+def _python_params(params: dict) -> dict:
+    """
+    Convert NumPy scalars so parameters can be stored as JSON
+    """
+    return {name: value.item() if isinstance(value, np.generic) else value for name, value in params.items()}
+
+def data_fingerprint(X, y) -> str:
+    """
+    Return a hash of the training data, used to key the cached trials
+    """
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(X, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(y).astype(np.int64).tobytes())
+    return digest.hexdigest()
+
+class TrialCache:
+    """
+    Append-only JSON lines file with one completed trial per line
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.trials = {}
+        if os.path.exists(file_path):
+            with open(file_path, "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        trial = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Last line of an interrupted write
+                        continue
+                    self.trials[trial["key"]] = trial
+
+    @staticmethod
+    def key(estimator, params: dict, n_samples: int, cv: int, fingerprint: str) -> str:
+        payload = json.dumps(
+            [type(estimator).__name__, _python_params(params), n_samples, cv, fingerprint],
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> dict:
+        return self.trials.get(key)
+
+    def add(self, trial: dict):
+        self.trials[trial["key"]] = trial
+        with open(self.file_path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(trial) + "\n")
+
+def _run_trial(index: int, estimator, params: dict, X, y, cv: int) -> tuple:
+    """
+    Cross-validate one set of parameters. Runs inside a joblib worker.
+    """
+    start = time.perf_counter()
+    scores = cross_validate(clone(estimator).set_params(**params), X, y, cv=cv, n_jobs=1)
+    return index, {
+        "mean_score": float(scores["test_score"].mean()),
+        "std_score": float(scores["test_score"].std()),
+        "fit_seconds": float(scores["fit_time"].sum()),
+        "seconds": time.perf_counter() - start,
+    }
+
+def run_trials(estimator, candidates: list, X, y, cache: TrialCache, cv: int = 5, n_jobs: int = -1) -> list:
+    """
+    Score every candidate on (X, y), reusing cached trials.
+
+    Returns one trial dictionary per candidate, in candidate order.
+    """
+    fingerprint = data_fingerprint(X, y)
+    keys = [cache.key(estimator, params, len(X), cv, fingerprint) for params in candidates]
+    pending = [i for i, key in enumerate(keys) if cache.get(key) is None]
+    logging.info("%d/%d trials cached, fitting %d on %d samples.", len(candidates) - len(pending), len(candidates), len(pending), len(X))
+
+    if pending:
+        tasks = Parallel(n_jobs=n_jobs, return_as="generator_unordered")(
+            delayed(_run_trial)(i, estimator, candidates[i], X, y, cv) for i in pending
+        )
+        # Cache each trial as soon as it completes
+        for i, result in tasks:
+            cache.add({"key": keys[i], "params": _python_params(candidates[i]), "n_samples": len(X), **result})
+    return [cache.get(key) for key in keys]
+
+def _best(trials: list) -> int:
+    """
+    Return the index of the best trial. Ties go to the first candidate, like GridSearchCV.
+    """
+    return max(range(len(trials)), key=lambda i: (trials[i]["mean_score"], -i))
+
+def grid_search(estimator, X, y, cache: TrialCache, param_grid: dict = PARAM_GRID, cv: int = 5, n_jobs: int = -1) -> tuple:
+    candidates = list(ParameterGrid(param_grid))
+    trials = run_trials(estimator, candidates, X, y, cache, cv, n_jobs)
+    best = _best(trials)
+    return candidates[best], trials[best]["mean_score"], trials
+
+def random_search(estimator, X, y, cache: TrialCache, param_grid: dict = PARAM_GRID, cv: int = 5, n_jobs: int = -1, n_iter: int = 60, random_state: int = 42) -> tuple:
+    candidates = list(ParameterSampler(param_grid, n_iter=n_iter, random_state=random_state))
+    trials = run_trials(estimator, candidates, X, y, cache, cv, n_jobs)
+    best = _best(trials)
+    return candidates[best], trials[best]["mean_score"], trials
+
+def halving_search(estimator, X, y, cache: TrialCache, param_grid: dict = PARAM_GRID, cv: int = 5, n_jobs: int = -1, factor: int = 3, min_resources: int = None, random_state: int = 42) -> tuple:
+    """
+    Successive halving over the grid, using the number of samples as resource.
+
+    Every round keeps the best ceil(n / factor) candidates and multiplies the
+    samples by factor. There are as many rounds as it takes to get down to
+    one candidate, but no more than fit before the samples run out.
+    """
+    candidates = list(ParameterGrid(param_grid))
+    n_rounds = max(1, math.ceil(math.log(len(candidates), factor)))
+    # Like HalvingGridSearchCV, no more rounds than fit between the smallest
+    # resource and the whole data, so the last rounds do not all refit on every sample
+    smallest = min_resources or 20 * cv
+    n_rounds = max(1, min(n_rounds, math.floor(math.log(max(len(X) / smallest, 1), factor)) + 1))
+    if min_resources is None:
+        # The last round uses (nearly) every sample
+        min_resources = max(len(X) // factor ** (n_rounds - 1), smallest)
+    order = np.random.default_rng(random_state).permutation(len(X))
+    X, y = np.asarray(X)[order], np.asarray(y)[order]
+
+    all_trials = []
+    for round_index in range(n_rounds):
+        n_samples = min(len(X), min_resources * factor ** round_index)
+        trials = run_trials(estimator, candidates, X[:n_samples], y[:n_samples], cache, cv, n_jobs)
+        all_trials.extend(trials)
+        if len(candidates) == 1 or round_index == n_rounds - 1:
+            break
+        keep = max(1, math.ceil(len(candidates) / factor))
+        ranking = sorted(range(len(candidates)), key=lambda i: (-trials[i]["mean_score"], i))[:keep]
+        candidates = [candidates[i] for i in sorted(ranking)]
+    best = _best(trials)
+    return candidates[best], trials[best]["mean_score"], all_trials
+
+SEARCHES = {
+    "grid": grid_search,
+    "random": random_search,
+    "halving": halving_search,
+}
+
+def log_trials(trials: list, best_params: dict, best_score: float, tracker: Tracker = None):
+    """
+    Log every trial score and timing in bulk, through the tracker or else
+    to the active MLflow run
+    """
+    attached = None
+    if tracker is None or tracker.mode == "sync":
+        run = mlflow.active_run()
+        if run is None:
+            return
+        tracker = attached = Tracker("async", run_id=run.info.run_id)
+    for step, trial in enumerate(trials):
+        tracker.log_metrics({
+            "tuning_mean_score": trial["mean_score"],
+            "tuning_std_score": trial["std_score"],
+            "tuning_fit_seconds": trial["fit_seconds"],
+        }, step=step)
+    tracker.log_params({f"best_{name}": value for name, value in _python_params(best_params).items()})
+    tracker.log_metric("tuning_best_score", best_score)
+    if attached is not None:
+        attached.close()
+
+def tune(X_train, y_train, estimator=None, search: str = "grid", n_jobs: int = -1, cv: int = 5, tracker: Tracker = None, **search_kwargs):
+    """
+    Search the hyperparameters of the estimator and save the refitted best one.
+
+    Parameters
+    ----------
+    X_train, y_train : array-like
+        Scaled training data.
+    estimator : estimator, optional
+        Estimator to tune, SVC() by default.
+    search : str
+        One of "grid", "random" or "halving".
+    n_jobs : int
+        Number of parallel trials, -1 for all cores.
+    cv : int
+        Number of cross-validation folds.
+    tracker : Tracker, optional
+        Tracker to log the trials with, the active MLflow run otherwise.
+
+    Returns
+    -------
+    estimator
+        The best estimator, refitted on the whole training data.
+    """
+    if search not in SEARCHES:
+        raise ValueError(f"Invalid search. Options: {list(SEARCHES)}")
+    estimator = SVC() if estimator is None else estimator
+    cache = TrialCache(os.path.join(MODEL_FOLDER, "tuning_trials.jsonl"))
+
+    start = time.perf_counter()
+    best_params, best_score, trials = SEARCHES[search](estimator, X_train, y_train, cache, cv=cv, n_jobs=n_jobs, **search_kwargs)
+    logging.info("%s search over %d trials took %.2fs.", search, len(trials), time.perf_counter() - start)
+    logging.info("Best parameters for %s: %s", type(estimator).__name__, best_params)
+    logging.info("Best cross-validation score for %s: %f", type(estimator).__name__, best_score)
+    log_trials(trials, best_params, best_score, tracker)
+
+    best_estimator = clone(estimator).set_params(**best_params).fit(X_train, y_train)
+    estimator_file_path = os.path.join(MODEL_FOLDER, "best_model_gridsearch.pkl")
+    joblib.dump(best_estimator, estimator_file_path)
+    logging.info("Best tuned model saved as '%s'.", estimator_file_path)
+    return best_estimator
+
+def main(search: str = "grid", n_jobs: int = -1, experiment_name: str = "wine-quality-exp"):
+    data = load_data(os.path.join(DATA_FOLDER, "winequality-train.csv"))
+    X = data.drop("quality", axis=1)
+    y = data["quality"]
+    X_scaled = StandardScaler().fit_transform(X)
+    X_train, _, y_train, _ = train_test_split(X_scaled, y, test_size=0.2, random_state=42)
+
+    load_dotenv()
+    mlflow.set_tracking_uri(os.getenv("MLFLOW_TRACKING_URI"))
+    tracker = Tracker("async")
+    with tracker.start_run(f"wine-quality-tuning-{search}", experiment_name):
+        tune(X_train, y_train.to_numpy(), search=search, n_jobs=n_jobs, tracker=tracker)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tune the SVC hyperparameters.")
+    parser.add_argument("--search", choices=list(SEARCHES), default="grid", help="Search strategy")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Number of parallel trials, -1 for all cores")
+    args = parser.parse_args()
+
+    script_name = os.path.splitext(os.path.basename(__file__))[0]
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)-18s %(name)-8s %(levelname)-8s %(message)s",
+        datefmt="%y-%m-%d %H:%M",
+        filename=os.path.join(LOGS_FOLDER, f"{script_name}.log"),
+        filemode="w",
+    )
+    main(search=args.search, n_jobs=args.n_jobs)
@@ -32,3 +32,59 @@ def pytest_collection_modifyitems(config, items):
     for item in items:
         if "local" in item.keywords:
             item.add_marker(skip_local)
+
+FEATURES = [
+    "fixed acidity",
+    "volatile acidity",
+    "citric acid",
+    "residual sugar",
+    "chlorides",
+    "free sulfur dioxide",
+    "total sulfur dioxide",
+    "density",
+    "pH",
+    "sulphates",
+    "alcohol",
+]
+
+def make_wine_data(n_samples=300, seed=0):
+    """
+    Return a synthetic wine quality dataframe with the same columns as the real dataset.
+    """
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    means = np.array([8.3, 0.53, 0.27, 2.5, 0.088, 15.9, 46.5, 0.9967, 3.31, 0.66, 10.4])
+    stds = np.array([1.7, 0.18, 0.19, 1.4, 0.047, 10.5, 32.9, 0.0019, 0.15, 0.17, 1.07])
+    X = means + rng.standard_normal((n_samples, len(FEATURES))) * stds
+    score = (X[:, 10] - means[10]) / stds[10] - (X[:, 1] - means[1]) / stds[1]
+    quality = np.clip(np.round(5.6 + score + rng.normal(0, 0.5, n_samples)), 3, 8).astype(int)
+    data = pd.DataFrame(X, columns=FEATURES)
+    data["quality"] = quality
+    return data
+
+@pytest.fixture
+def model_dir(tmp_path, monkeypatch):
+    """
+    Train a small model and scaler on synthetic data inside a temporary
+    working directory laid out like the project root.
+    """
+    import joblib
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import StandardScaler
+
+    for folder in ("data", "models", "img", "logs"):
+        (tmp_path / folder).mkdir()
+    data = make_wine_data()
+    data.to_csv(tmp_path / "data" / "winequality-train.csv", index=False)
+    make_wine_data(seed=1).to_csv(tmp_path / "data" / "winequality-predict.csv", index=False)
+
+    X = data.drop(columns=["quality"])
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(n_estimators=10, random_state=0).fit(scaler.transform(X), data["quality"])
+    joblib.dump(model, tmp_path / "models" / "model.pkl")
+    joblib.dump(scaler, tmp_path / "models" / "scaler.pkl")
+
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
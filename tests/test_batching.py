@@ -0,0 +1,58 @@
+import asyncio
+import threading
+import time
+import pytest
+from batching import MicroBatcher
+
+def test_threads_share_batches():
+    """
+    Tests that concurrent threads get their own results back from shared batches
+    """
+    batches = []
+
+    def square(items):
+        batches.append(len(items))
+        return [item * item for item in items]
+
+    results = {}
+    with MicroBatcher(square, max_batch=8, max_wait_ms=20) as batcher:
+        threads = [threading.Thread(target=lambda i=i: results.update({i: batcher.predict(i)})) for i in range(32)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = batcher.stats()
+
+    assert results == {i: i * i for i in range(32)}
+    assert max(batches) <= 8 and len(batches) < 32
+    assert stats["items"] == 32 and stats["batches"] == len(batches) and stats["queue_depth"] == 0
+
+def test_asyncio_front_end_and_wait_limit():
+    """
+    Tests the asyncio front-end, and that a lone item is flushed after max_wait_ms
+    """
+    with MicroBatcher(lambda items: [str(item) for item in items], max_batch=100, max_wait_ms=10) as batcher:
+        async def scenario():
+            return await asyncio.gather(*(batcher.predict_async(i) for i in range(10)))
+        assert asyncio.run(scenario()) == [str(i) for i in range(10)]
+
+        start = time.perf_counter()
+        assert batcher.predict(42) == "42"
+        assert time.perf_counter() - start < 1
+        assert batcher.stats()["timeout_flushes"] >= 1
+
+def test_errors_reach_every_caller():
+    """
+    Tests that an error of the batch function is raised to all callers of the batch
+    """
+    def fail(items):
+        raise ValueError("bad batch")
+
+    with MicroBatcher(fail, max_wait_ms=1) as batcher:
+        futures = [batcher.submit(i) for i in range(3)]
+        for future in futures:
+            with pytest.raises(ValueError):
+                future.result(timeout=5)
+        assert batcher.stats()["errors"] >= 1
+    with pytest.raises(RuntimeError):
+        batcher.submit(1)
@@ -0,0 +1,128 @@
+import json
+import time
+import threading
+import pytest
+import deploy
+
+def test_steps_run_concurrently_after_their_dependencies():
+    """
+    Test that independent steps overlap, dependent steps wait and outputs reach later steps
+    """
+    started = {}
+    barrier = threading.Barrier(2, timeout=5)
+
+    def independent(name):
+        def run(context, dry_run=False):
+            started[name] = time.perf_counter()
+            # Deadlocks unless both independent steps run at the same time
+            barrier.wait()
+            return {"action": "create", "outputs": {name: True}}
+        return run
+
+    def dependent(context, dry_run=False):
+        assert context["first"] and context["second"]
+        return {"action": "update", "outputs": {"third": True}}
+
+    steps = {
+        "first": {"run": independent("first"), "after": []},
+        "second": {"run": independent("second"), "after": []},
+        "third": {"run": dependent, "after": ["first", "second"]},
+    }
+    context = {}
+    report = deploy.run_steps(steps, context, max_workers=2)
+
+    assert context == {"first": True, "second": True, "third": True}
+    assert [report[name]["action"] for name in steps] == ["create", "create", "update"]
+    assert report["third"]["start_s"] >= max(report[name]["start_s"] + report[name]["seconds"] for name in ("first", "second"))
+    assert report["total"]["seconds"] > 0
+
+    with pytest.raises(ValueError):
+        deploy.run_steps({"a": {"run": dependent, "after": ["b"]}, "b": {"run": dependent, "after": ["a"]}}, {})
+
+def test_deploy_is_incremental(tmp_path, monkeypatch):
+    """
+    Test against moto that the first deploy creates everything pinned to the
+    image digest, a second deploy changes nothing, a new image only
+    updates the function code, and a recreated or drifted API is fixed
+    together with the invoke permission
+    """
+    moto = pytest.importorskip("moto")
+    import boto3
+
+    for key, value in {
+        "AWS_ACCESS_KEY_ID": "testing",
+        "AWS_SECRET_ACCESS_KEY": "testing",
+        "AWS_REGION": "us-east-1",
+        "REPOSITORY_NAME": "wine-quality",
+        "FUNCTION_NAME": "wine-quality",
+        "API_GATEWAY_NAME": "wine-quality",
+    }.items():
+        monkeypatch.setenv(key, value)
+    env_file = tmp_path / ".env"
+    env_file.write_text("")
+
+    with moto.mock_aws():
+        role = boto3.client("iam", region_name="us-east-1").create_role(
+            RoleName="lambda-role",
+            AssumeRolePolicyDocument=json.dumps({
+                "Version": "2012-10-17",
+                "Statement": [{"Effect": "Allow", "Principal": {"Service": "lambda.amazonaws.com"}, "Action": "sts:AssumeRole"}],
+            }),
+        )["Role"]
+        monkeypatch.setenv("AWS_LAMBDA_ROLE_ARN", role["Arn"])
+
+        ecr = boto3.client("ecr", region_name="us-east-1")
+        ecr.create_repository(repositoryName="wine-quality")
+
+        def push(layer: str) -> str:
+            manifest = json.dumps({
+                "schemaVersion": 2,
+                "mediaType": "application/vnd.docker.distribution.manifest.v2+json",
+                "config": {"mediaType": "application/vnd.docker.container.image.v1+json", "size": 7023, "digest": "sha256:" + "0" * 64},
+                "layers": [{"mediaType": "application/vnd.docker.image.rootfs.diff.tar.gzip", "size": 32654, "digest": layer}],
+            })
+            return ecr.put_image(repositoryName="wine-quality", imageManifest=manifest, imageTag="latest")["image"]["imageId"]["imageDigest"]
+
+        digest = push("sha256:" + "1" * 64)
+        first = deploy.deploy(env_file=str(env_file), waiter_delay=1)
+        assert first["repository"]["action"] == "unchanged"
+        assert first["configuration"]["action"] == "skip"
+        assert {first[name]["action"] for name in ("code", "api", "permission")} == {"create"}
+
+        lambda_client = boto3.client("lambda", region_name="us-east-1")
+        function = lambda_client.get_function(FunctionName="wine-quality")
+        assert function["Code"]["ImageUri"].endswith(f"@{digest}")
+        assert f"@{digest}" in env_file.read_text()
+
+        second = deploy.deploy(env_file=str(env_file), waiter_delay=1)
+        assert {step["action"] for name, step in second.items() if name != "total"} == {"unchanged"}
+
+        digest = push("sha256:" + "2" * 64)
+        third = deploy.deploy(env_file=str(env_file), waiter_delay=1)
+        assert third["code"]["action"] == "update"
+        assert {third[name]["action"] for name in ("repository", "configuration", "api", "permission")} == {"unchanged"}
+        updated = lambda_client.get_function(FunctionName="wine-quality")
+        assert updated["Code"]["ImageUri"].endswith(f"@{digest}")
+        assert updated["Configuration"]["FunctionArn"] == function["Configuration"]["FunctionArn"]
+
+        # A recreated API gets a new id, the permission must follow it
+        api_client = boto3.client("apigatewayv2", region_name="us-east-1")
+        api_client.delete_api(ApiId=next(api["ApiId"] for api in api_client.get_apis()["Items"] if api["Name"] == "wine-quality"))
+        fourth = deploy.deploy(env_file=str(env_file), waiter_delay=1)
+        assert fourth["api"]["action"] == "create" and fourth["permission"]["action"] == "update"
+        api_id = next(api["ApiId"] for api in api_client.get_apis()["Items"] if api["Name"] == "wine-quality")
+        policy = json.loads(lambda_client.get_policy(FunctionName="wine-quality")["Policy"])
+        statements = [item for item in policy["Statement"] if item["Sid"] == deploy.PERMISSION_STATEMENT_ID]
+        assert len(statements) == 1
+        assert statements[0]["Condition"]["ArnLike"]["AWS:SourceArn"].split(":")[-1] == f"{api_id}/*"
+
+        # Drifted payload format and a deleted stage are brought back
+        integration = api_client.get_integrations(ApiId=api_id)["Items"][0]
+        api_client.update_integration(ApiId=api_id, IntegrationId=integration["IntegrationId"], PayloadFormatVersion="1.0")
+        api_client.delete_stage(ApiId=api_id, StageName="$default")
+        fifth = deploy.deploy(env_file=str(env_file), waiter_delay=1)
+        assert fifth["api"]["action"] == "update"
+        assert fifth["api"]["changes"] == {"PayloadFormatVersion": "2.0", "stage": "$default"}
+        assert api_client.get_integrations(ApiId=api_id)["Items"][0]["PayloadFormatVersion"] == "2.0"
+        assert [stage["StageName"] for stage in api_client.get_stages(ApiId=api_id)["Items"]] == ["$default"]
+        assert deploy.deploy(env_file=str(env_file), waiter_delay=1)["api"]["action"] == "unchanged"
@@ -96,3 +96,238 @@ def test_loader_valid_input():
 
     assert model is not None, "Model is None. Should be a model."
     assert scaler is not None, "Scaler is None. Should be an scaler."
+
+def test_registry_reuses_loaded_objects(model_dir):
+    """
+    Tests that warm invocations reuse the cached model and scaler
+    """
+    lambda_function.registry.clear()
+    event = {"body": load_valid_payload()}
+
+    lambda_function.predict(event, None)
+    lambda_function.predict(event, None)
+
+    stats = lambda_function.registry.stats()
+    assert stats == {"hits": 2, "misses": 2, "reloads": 0}, f"Unexpected registry stats: {stats}"
+
+def test_registry_reloads_changed_objects(model_dir):
+    """
+    Tests that the registry reloads a model when its file changes on disk
+    """
+    import os
+    import joblib
+    from sklearn.dummy import DummyClassifier
+
+    lambda_function.registry.clear()
+    first = lambda_function.registry.get("model")
+
+    model_path = model_dir / "models" / "model.pkl"
+    os.utime(model_path)
+    assert lambda_function.registry.get("model") is first, "Touching the file should not reload the model"
+
+    dummy = DummyClassifier(strategy="constant", constant=5).fit([[0]], [5])
+    joblib.dump(dummy, model_path)
+    stat = os.stat(model_path)
+    os.utime(model_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+    assert isinstance(lambda_function.registry.get("model"), DummyClassifier), "Model was not reloaded"
+    assert lambda_function.registry.stats()["reloads"] == 1
+
+def test_batch_list_payload(model_dir):
+    """
+    Tests that a list of records is scored with one prediction and error per record
+    """
+    valid = json.loads(load_valid_payload())
+    invalid = json.loads(load_invalid_payload())
+    event = {"body": json.dumps([valid, invalid, valid])}
+
+    response = lambda_function.predict(event, None)
+    predictions = response["predictions"]
+    assert len(predictions) == 3, f"Expected one result per record. Response: {response}"
+    assert predictions[0]["prediction"] != "None" and predictions[0]["error"] == "None"
+    assert predictions[1]["prediction"] == "None" and predictions[1]["error"] != "None"
+    assert predictions[2] == predictions[0]
+
+    # An integer too large for a float only fails its own record
+    response = lambda_function.predict({"body": json.dumps([valid, dict(valid, alcohol=10**400)])}, None)
+    assert response["predictions"][0] == predictions[0]
+    assert response["predictions"][1]["error"].startswith("alcohol: must be finite")
+
+    response = lambda_function.predict({"body": json.dumps([valid, "x"])}, None)
+    assert response["predictions"][1]["error"] == "record: must be an object, got str"
+    response = lambda_function.predict({"body": json.dumps("x")}, None)
+    assert response["fields"] == {"record": "must be an object, got str"}
+
+def test_batch_columnar_payload(model_dir):
+    """
+    Tests that a columnar payload gives the same predictions as single records
+    """
+    valid = json.loads(load_valid_payload())
+    columns = list(valid)
+    event = {"body": json.dumps({"columns": columns, "data": [list(valid.values()), [1.0]]})}
+
+    response = lambda_function.predict(event, None)
+    single = lambda_function.predict({"body": load_valid_payload()}, None)
+    assert response["predictions"][0]["prediction"] == single["prediction"]
+    assert response["predictions"][1]["error"] != "None", "Short row should be reported as an error"
+
+def test_malformed_batch_is_a_client_error(monkeypatch):
+    """
+    Tests that malformed batches are reported as invalid bodies, not as model errors
+    """
+    monkeypatch.setattr(lambda_function, "MAX_BATCH_SIZE", 2)
+    bodies = [{"columns": "alcohol", "data": [[9.6]]}, [{}, {}, {}]]
+    for body in bodies:
+        response = lambda_function.predict({"body": json.dumps(body)}, None)
+        assert response["message"] == "Invalid body in the request"
+        assert response["error"].startswith("PayloadError")
+
+def test_fast_inference_matches_pandas_path(model_dir, monkeypatch):
+    """
+    Tests that the pandas-free fast path gives the same scaled row and prediction
+    """
+    import numpy as np
+    import pandas as pd
+
+    record = json.loads(load_valid_payload())
+    scaler = lambda_function.loader("scaler")
+    expected = scaler.transform(pd.DataFrame([record]))
+    row = [record[name] for name in lambda_function.feature_names(scaler)]
+    np.testing.assert_array_equal(lambda_function.FastScaler(scaler).transform_rows(row), expected)
+
+    event = {"body": load_valid_payload()}
+    slow = lambda_function.predict(event, None)
+    monkeypatch.setattr(lambda_function, "FAST_INFERENCE", True)
+    assert lambda_function.predict(event, None) == slow
+    assert lambda_function.predict({"body": load_invalid_payload()}, None)["error"] != "None"
+
+def test_numpy_model_serving_without_sklearn(model_dir):
+    """
+    Tests that NUMPY_MODEL=1 serves the exported model without importing scikit-learn
+    """
+    import os
+    import sys
+    import subprocess
+    import joblib
+    import numpy_model
+
+    model = joblib.load(model_dir / "models" / "model.pkl")
+    scaler = joblib.load(model_dir / "models" / "scaler.pkl")
+    numpy_model.save(numpy_model.export_arrays(model, scaler), model_dir / "models" / "model.npz")
+    expected = lambda_function.predict({"body": load_valid_payload()}, None)
+
+    script = (
+        "import sys, json, lambda_function;"
+        f"r = lambda_function.predict({{'body': {load_valid_payload()!r}}}, None);"
+        "print(json.dumps([r['prediction'], 'sklearn' in sys.modules]))"
+    )
+    env = dict(os.environ, NUMPY_MODEL="1", FAST_INFERENCE="1", PYTHONPATH=os.pathsep.join(sys.path))
+    output = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, check=True)
+    prediction, sklearn_imported = json.loads(output.stdout.strip().splitlines()[-1])
+    assert prediction == expected["prediction"]
+    assert not sklearn_imported, "scikit-learn should not be imported when serving the NumPy model"
+
+def test_debug_stage_timings(model_dir, monkeypatch, capsys):
+    """
+    Tests that ?debug=1 returns the stage timings and STAGE_TIMINGS=1 logs them as one EMF record
+    """
+    event = {"body": load_valid_payload()}
+    response = lambda_function.predict(event, None)
+    assert "debug" not in response, "Timings should only be returned when asked for"
+
+    monkeypatch.setattr(lambda_function, "STAGE_TIMINGS", True)
+    debug = lambda_function.predict(dict(event, queryStringParameters={"debug": "1"}), None)
+    timings = debug.pop("debug")["timings_ms"]
+    assert debug == response
+    assert list(timings) == ["parse", "load", "validate", "frame", "transform", "predict", "total"]
+    assert timings["total"] >= sum(value for name, value in timings.items() if name != "total")
+
+    record = json.loads(capsys.readouterr().out.strip().splitlines()[-1])
+    metrics = record["_aws"]["CloudWatchMetrics"][0]
+    assert metrics["Dimensions"] == [["Handler", "Payload"]] and record["Payload"] == "single"
+    assert {metric["Name"] for metric in metrics["Metrics"]} == {f"{name}_ms" for name in timings}
+
+def test_schema_rejects_before_scoring(model_dir):
+    """
+    Tests that records outside the shipped schema are rejected with per-field errors
+    """
+    import schema
+    from conftest import make_wine_data
+
+    X = make_wine_data().drop(columns=["quality"])
+    schema.save(schema.build_schema(X), model_dir / "models" / "schema.json")
+    record = dict(json.loads(load_valid_payload()), alcohol=96.0)
+
+    response = lambda_function.predict({"body": json.dumps(record)}, None)
+    assert response["prediction"] == "None" and list(response["fields"]) == ["alcohol"]
+    assert response["error"].startswith("ValidationError: alcohol: 96 is outside")
+
+    batch = lambda_function.predict({"body": json.dumps([record, json.loads(load_valid_payload())])}, None)
+    assert batch["predictions"][0]["error"] == response["error"].removeprefix("ValidationError: ")
+    assert batch["predictions"][1]["error"] == "None"
+
+def test_prediction_cache_scores_only_misses(model_dir, monkeypatch):
+    """
+    Tests that repeated vectors are served from the cache and only distinct misses reach the model
+    """
+    cache = lambda_function.PredictionCache(max_size=100, ttl=60)
+    monkeypatch.setattr(lambda_function, "prediction_cache", cache)
+    lambda_function.registry.clear()
+    model, scaler = lambda_function.load_artifacts()
+    scored = []
+    original_predict = model.predict
+    monkeypatch.setattr(model, "predict", lambda X: scored.append(len(X)) or original_predict(X))
+
+    valid = json.loads(load_valid_payload())
+    other = dict(valid, alcohol=11.0)
+    expected = lambda_function.predict({"body": load_valid_payload()}, None)["prediction"]
+    # Same reading with another key order and an int spelling of 11.0
+    reordered = dict(reversed(list(dict(valid, alcohol=11).items())))
+    response = lambda_function.predict({"body": json.dumps([valid, other, reordered, other])}, None)
+
+    assert [p["prediction"] for p in response["predictions"]][0] == expected
+    assert response["predictions"][1] == response["predictions"][2] == response["predictions"][3]
+    assert scored == [1, 1], "Only the one distinct miss of the batch should be scored"
+    assert cache.stats()["hits"] == 1 and cache.stats()["size"] == 2
+
+def test_prediction_cache_eviction_expiry_and_invalidation():
+    """
+    Tests the LRU bound, the TTL and the drop of every entry when the model version changes
+    """
+    import numpy as np
+
+    now = [0.0]
+    cache = lambda_function.PredictionCache(max_size=2, ttl=10, clock=lambda: now[0])
+    a, b, c = lambda_function.PredictionCache.keys(np.array([[1.0, 0.0], [2.0, 0.0], [3.0, -0.0]]))
+    assert c == lambda_function.PredictionCache.keys(np.array([[3.0, 0.0]]))[0]
+
+    cache.put_many("v1", [a, b], ["5", "6"])
+    assert cache.get_many("v1", [a]) == ["5"]
+    cache.put_many("v1", [c], ["7"])
+    assert cache.get_many("v1", [a, b, c]) == ["5", None, "7"], "b was the least recently used"
+
+    now[0] = 11.0
+    assert cache.get_many("v1", [a]) == [None]
+    cache.put_many("v1", [a], ["5"])
+    assert cache.get_many("v2", [a]) == [None], "A new model version should drop the cache"
+    assert cache.stats() | {"hit_rate": 0} == {
+        "size": 0, "max_size": 2, "hit_rate": 0, "hits": 3, "misses": 3,
+        "evictions": 1, "expirations": 1, "invalidations": 1,
+    }
+
+def test_numpy_model_serving_from_bundle(model_dir, monkeypatch):
+    """
+    Tests that NUMPY_MODEL=1 serves the memory-mapped bundle when there is one
+    """
+    import joblib
+    import numpy_model
+
+    expected = lambda_function.predict({"body": load_valid_payload()}, None)
+    model = joblib.load(model_dir / "models" / "model.pkl")
+    scaler = joblib.load(model_dir / "models" / "scaler.pkl")
+    numpy_model.save_bundle(numpy_model.export_arrays(model, scaler), model_dir / "models" / "model.bundle")
+
+    monkeypatch.setattr(lambda_function, "NUMPY_MODEL", True)
+    served, _ = lambda_function.load_artifacts()
+    assert served.manifest is not None, "The bundle should be served instead of model.npz"
+    assert lambda_function.predict({"body": load_valid_payload()}, None) == expected
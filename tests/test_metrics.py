@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, confusion_matrix
+from metrics import ConfusionMatrix, evaluate
+from conftest import make_wine_data
+
+def _labels(dtype=int):
+    actual = make_wine_data(500)["quality"].to_numpy()
+    rng = np.random.default_rng(0)
+    predicted = np.where(rng.random(500) < 0.6, actual, rng.integers(3, 10, 500))
+    return actual.astype(dtype), predicted.astype(dtype)
+
+@pytest.mark.parametrize("dtype", [int, float, str])
+def test_metrics_match_sklearn(dtype):
+    """
+    Tests that the metrics derived from the confusion matrix match sklearn's weighted metrics
+    """
+    actual, predicted = _labels(dtype)
+    metrics, confusion = evaluate(actual, predicted)
+
+    assert np.isclose(metrics["accuracy"], accuracy_score(actual, predicted))
+    assert np.isclose(metrics["precision"], precision_score(actual, predicted, average="weighted", zero_division=0))
+    assert np.isclose(metrics["recall"], recall_score(actual, predicted, average="weighted", zero_division=0))
+    assert np.isclose(metrics["f1"], f1_score(actual, predicted, average="weighted", zero_division=0))
+    np.testing.assert_array_equal(confusion.matrix(), confusion_matrix(actual, predicted))
+
+def test_merged_chunks_match_whole():
+    """
+    Tests that merging the matrices of chunks gives the matrix of the whole data
+    """
+    actual, predicted = _labels()
+    merged = ConfusionMatrix()
+    for start in range(0, 500, 64):
+        merged = merged.merge(ConfusionMatrix.from_predictions(actual[start:start + 64], predicted[start:start + 64]))
+    whole = ConfusionMatrix.from_predictions(actual, predicted)
+
+    np.testing.assert_array_equal(merged.labels, whole.labels)
+    np.testing.assert_array_equal(merged.counts, whole.counts)
+    assert merged.metrics() == whole.metrics()
+
+def test_matrix_over_given_labels():
+    """
+    Tests that the matrix over a label list behaves like sklearn's confusion_matrix(labels=...)
+    """
+    actual, predicted = _labels()
+    labels = [3, 4, 5, 6, 7, 8, 11]
+    confusion = ConfusionMatrix.from_predictions(actual, predicted)
+    np.testing.assert_array_equal(confusion.matrix(labels), confusion_matrix(actual, predicted, labels=labels))
@@ -0,0 +1,95 @@
+import pytest
+import numpy as np
+import numpy_model
+from sklearn.svm import SVC
+from sklearn.linear_model import SGDClassifier
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+from conftest import make_wine_data
+
+def fit(model, binary=False):
+    """
+    Fit a model and scaler on synthetic data and return them with a held-out feature set.
+    """
+    data = make_wine_data(500)
+    X = data.drop(columns=["quality"])
+    y = (data["quality"] > 5).astype(int) if binary else data["quality"]
+    scaler = StandardScaler().fit(X)
+    model.fit(scaler.transform(X), y)
+    return model, scaler, make_wine_data(1000, seed=3).drop(columns=["quality"])
+
+@pytest.mark.parametrize("model", [
+    SVC(),
+    SVC(kernel="linear"),
+    SVC(kernel="poly", degree=2),
+    SVC(kernel="sigmoid"),
+    SGDClassifier(random_state=0),
+    RandomForestClassifier(n_estimators=20, random_state=0),
+])
+@pytest.mark.parametrize("binary", [False, True])
+def test_export_matches_sklearn(model, binary, tmp_path):
+    """
+    Tests that the exported model predicts exactly like the scikit-learn model
+    """
+    model, scaler, X = fit(model, binary)
+    file_path = tmp_path / "model.npz"
+    numpy_model.save(numpy_model.export_arrays(model, scaler), file_path)
+
+    exported = numpy_model.load(file_path)
+    assert numpy_model.check_parity(model, exported, scaler, X) == 0
+    np.testing.assert_array_equal(exported.scaler.transform(X), scaler.transform(X))
+
+def test_export_unsupported_model():
+    """
+    Tests that models other than the training candidates are rejected
+    """
+    from sklearn.dummy import DummyClassifier
+
+    model, scaler, _ = fit(DummyClassifier())
+    with pytest.raises(ValueError):
+        numpy_model.export_arrays(model, scaler)
+
+@pytest.mark.parametrize("batch_size", [1, 7, 600])
+def test_flat_forest_matches_sklearn_votes(batch_size):
+    """
+    Tests that the flattened forest gives the same probabilities and votes as scikit-learn
+    """
+    model, scaler, X = fit(RandomForestClassifier(n_estimators=30, random_state=0))
+    X_scaled = scaler.transform(X)[:batch_size]
+    forest = numpy_model.FlatForest.from_estimator(model)
+    forest.block_size = 64
+
+    np.testing.assert_array_equal(forest.predict_proba(X_scaled), model.predict_proba(X_scaled))
+    np.testing.assert_array_equal(numpy_model.FlatForestClassifier(model).predict(X_scaled), model.predict(X_scaled))
+
+@pytest.mark.parametrize("model", [
+    SVC(),
+    SGDClassifier(random_state=0),
+    RandomForestClassifier(n_estimators=20, random_state=0),
+])
+def test_bundle_maps_the_exported_arrays(model, tmp_path):
+    """
+    Tests that the bundle maps the same arrays as the .npz export, read-only, with its manifest
+    """
+    model, scaler, X = fit(model)
+    arrays = numpy_model.export_arrays(model, scaler)
+    file_path = tmp_path / "model.bundle"
+    numpy_model.save_bundle(arrays, file_path, training_md5="abc")
+
+    bundle = numpy_model.load_bundle(file_path)
+    assert numpy_model.check_parity(model, bundle, scaler, X) == 0
+    assert bundle.manifest["model_type"] == type(model).__name__ and bundle.manifest["training_md5"] == "abc"
+    assert bundle.manifest["feature_names"] == list(X.columns)
+    assert bundle.manifest["classes"] == model.classes_.tolist()
+    for name, array in arrays.items():
+        mapped = bundle.arrays[name]
+        np.testing.assert_array_equal(mapped, array)
+        assert mapped.dtype == array.dtype and not mapped.flags.writeable
+        assert mapped.ctypes.data % numpy_model.BUNDLE_ALIGNMENT == 0 or mapped.size == 0
+
+    copied = numpy_model.load_bundle(file_path, mmap=False)
+    np.testing.assert_array_equal(copied.predict(X.to_numpy()), bundle.predict(X.to_numpy()))
+
+    (tmp_path / "model.npz").write_bytes(b"not a bundle" * 4)
+    with pytest.raises(ValueError):
+        numpy_model.load_bundle(tmp_path / "model.npz")
@@ -0,0 +1,36 @@
+import pipeline
+
+def test_step_skipped_until_something_changes(tmp_path):
+    """
+    Tests that a step only runs again when its inputs, parameters or outputs change, or when forced
+    """
+    input_path = tmp_path / "input.csv"
+    output_path = tmp_path / "output.csv"
+    input_path.write_text("a,b\n1,2\n")
+    calls = []
+
+    def run():
+        calls.append(1)
+        output_path.write_text(input_path.read_text().upper())
+
+    def run_step(params={"random_state": 42}, force=False):
+        return pipeline.run_step(
+            "step", run, [str(input_path)], [str(output_path)], ["process.py"], params,
+            force=force, cache_dir=str(tmp_path / "cache"),
+        )
+
+    assert run_step() is True
+    assert run_step() is False
+    assert run_step(params={"random_state": 0}) is True
+    assert run_step(params={"random_state": 0}, force=True) is True
+
+    input_path.write_text("a,b\n3,4\n")
+    assert run_step(params={"random_state": 0}) is True
+
+    # Outputs edited or deleted by hand are rebuilt
+    output_path.write_text("edited")
+    assert run_step(params={"random_state": 0}) is True
+    output_path.unlink()
+    assert run_step(params={"random_state": 0}) is True
+    assert run_step(params={"random_state": 0}) is False
+    assert len(calls) == 6
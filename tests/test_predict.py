@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import predict
+from conftest import make_wine_data
+
+def test_streaming_matches_in_memory(model_dir):
+    """
+    Tests that chunked scoring writes the same predictions as scoring the whole file
+    """
+    predict.predict(plots=False)
+    expected = pd.read_csv(model_dir / "data" / "predictions.csv")
+    predict.predict(chunksize=37, plots=False)
+    streamed = pd.read_csv(model_dir / "data" / "predictions.csv")
+
+    pd.testing.assert_frame_equal(streamed, expected)
+    assert not (model_dir / "data" / "predictions.csv.tmp").exists()
+
+def test_sharded_matches_in_memory(model_dir):
+    """
+    Tests that scoring shards in worker processes writes the same ordered predictions
+    """
+    import batch_predict
+    predict.predict(plots=False)
+    expected = pd.read_csv(model_dir / "data" / "predictions.csv")
+    output_path = model_dir / "data" / "predictions-sharded.csv"
+    metrics = batch_predict.batch_predict(
+        str(model_dir / "data" / "winequality-predict.csv"), str(output_path),
+        workers=2, shards=5, chunksize=16, model_folder="models", plots=False,
+    )
+
+    pd.testing.assert_frame_equal(pd.read_csv(output_path), expected)
+    assert np.isclose(metrics["accuracy"], (expected["Actual Quality"] == expected["Predicted Quality"]).mean())
+
+def test_shard_ranges_cover_every_row(tmp_path):
+    """
+    Tests that the shards split the rows without losing or repeating any, even with more shards than rows
+    """
+    import batch_predict
+    file_path = tmp_path / "data.csv"
+    make_wine_data(7).to_csv(file_path, index=False)
+
+    for n_shards in (1, 3, 20):
+        columns, ranges = batch_predict.shard_ranges(str(file_path), n_shards)
+        with open(file_path, "rb") as file:
+            content = file.read()
+        rows = b"".join(content[start:end] for start, end in ranges)
+        assert columns[-1] == "quality"
+        assert rows == content[content.index(b"\n") + 1:]
+        assert all(content[start - 1:start] == b"\n" for start, _ in ranges)
+
+def test_quoted_header_and_empty_input(tmp_path, monkeypatch):
+    """
+    Tests that quoted column names are read like pandas reads them and that a
+    header-only input writes an empty predictions file without a report
+    """
+    import batch_predict
+    file_path = tmp_path / "data.csv"
+    make_wine_data(3).to_csv(file_path, index=False, quoting=1)
+    columns, _ = batch_predict.shard_ranges(str(file_path), 2)
+    assert columns == list(pd.read_csv(file_path).columns)
+
+    empty_path = tmp_path / "empty.csv"
+    make_wine_data(3).head(0).to_csv(empty_path, index=False)
+    output_path = tmp_path / "predictions.csv"
+
+    def no_report(*args, **kwargs):
+        raise AssertionError("No report for an empty input")
+
+    monkeypatch.setattr(batch_predict, "report", no_report)
+    assert batch_predict.batch_predict(str(empty_path), str(output_path), workers=1) == {}
+    assert list(pd.read_csv(output_path).columns) == ["Actual Quality", "Predicted Quality"]
+    assert len(pd.read_csv(output_path)) == 0
+
+def test_predict_stage_timings(model_dir):
+    """
+    Tests that the in-memory and streamed runs report the time of every stage
+    """
+    stages = ["load_model", "load_data", "transform", "predict", "write", "evaluate", "total"]
+    assert list(predict.predict(plots=False)) == stages
+    assert list(predict.predict(chunksize=37, plots=False)) == stages
+
+def test_bundle_matches_pickles(model_dir):
+    """
+    Tests that scoring from the memory-mapped bundle writes the same predictions as the pickles
+    """
+    import joblib
+    import numpy_model
+
+    predict.predict(plots=False, source="pickle")
+    expected = pd.read_csv(model_dir / "data" / "predictions.csv")
+    model = joblib.load(model_dir / "models" / "model.pkl")
+    scaler = joblib.load(model_dir / "models" / "scaler.pkl")
+    numpy_model.save_bundle(numpy_model.export_arrays(model, scaler), model_dir / "models" / "model.bundle")
+
+    assert isinstance(predict.load_model()[0], numpy_model.NumpyModel)
+    predict.predict(plots=False)
+    pd.testing.assert_frame_equal(pd.read_csv(model_dir / "data" / "predictions.csv"), expected)
@@ -0,0 +1,65 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from process import load_data
+from conftest import make_wine_data
+
+def test_cache_matches_csv(tmp_path):
+    """
+    Tests that the columnar cache returns the same data as parsing the csv
+    """
+    file_path = tmp_path / "wine.csv"
+    make_wine_data(50).to_csv(file_path, index=False)
+    cache_dir = str(tmp_path / "cache")
+
+    expected = load_data(file_path)
+    pd.testing.assert_frame_equal(load_data(file_path, source="cache", cache_dir=cache_dir), expected)
+    # Second call is served from the .npy files
+    pd.testing.assert_frame_equal(load_data(file_path, source="cache", cache_dir=cache_dir), expected)
+
+def test_cache_with_text_column(tmp_path):
+    """
+    Tests that text columns, which cannot be memory-mapped, are cached and read back
+    """
+    file_path = tmp_path / "wine.csv"
+    make_wine_data(20).assign(color=["red", "white"] * 10).to_csv(file_path, index=False)
+    cache_dir = str(tmp_path / "cache")
+
+    expected = load_data(file_path)
+    for _ in range(2):
+        pd.testing.assert_frame_equal(load_data(file_path, source="cache", cache_dir=cache_dir), expected)
+    data = load_data(file_path, source="cache", columns=["color", "alcohol"], dtype="float32", cache_dir=cache_dir)
+    assert data["color"].tolist() == expected["color"].tolist()
+    assert data["alcohol"].dtype == np.float32
+
+def test_cache_projection_and_dtype(tmp_path):
+    """
+    Tests column projection and the float32 option of both sources
+    """
+    file_path = tmp_path / "wine.csv"
+    make_wine_data(50).to_csv(file_path, index=False)
+    columns = ["quality", "alcohol"]
+
+    for source in ("csv", "cache"):
+        data = load_data(file_path, source=source, columns=columns, dtype="float32", cache_dir=str(tmp_path / "cache"))
+        assert list(data.columns) == columns
+        assert data["alcohol"].dtype == np.float32
+        assert data["quality"].dtype == np.int64, "Labels should keep their integer dtype"
+
+    with pytest.raises(ValueError):
+        load_data(file_path, source="cache", columns=["unknown"], cache_dir=str(tmp_path / "cache"))
+
+def test_cache_invalidated_when_file_changes(tmp_path):
+    """
+    Tests that a changed csv is parsed again instead of served from a stale entry
+    """
+    file_path = tmp_path / "wine.csv"
+    cache_dir = str(tmp_path / "cache")
+    make_wine_data(50).to_csv(file_path, index=False)
+    load_data(file_path, source="cache", cache_dir=cache_dir)
+
+    make_wine_data(80, seed=4).to_csv(file_path, index=False)
+    stat = os.stat(file_path)
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert len(load_data(file_path, source="cache", cache_dir=cache_dir)) == 80
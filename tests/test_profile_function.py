@@ -0,0 +1,53 @@
+import pytest
+import pandas as pd
+import profile_function
+
+def _profile(memory_size, peak_rss_mb, cpu_ms):
+    return {
+        "memory_size": memory_size,
+        "init": {"wall_ms": 1500.0, "cpu_ms": 1400.0},
+        "invocations": {"1": {"wall_ms": 2.0, "cpu_ms": 2.0}, "1000": {"wall_ms": cpu_ms, "cpu_ms": cpu_ms}},
+        "peak_rss_mb": peak_rss_mb,
+    }
+
+def test_estimate_scales_cpu_time_with_memory_size():
+    """
+    Test that CPU time is stretched below one vCPU and waiting time is not
+    """
+    timing = {"wall_ms": 30.0, "cpu_ms": 20.0}
+    assert profile_function.estimate_ms(timing, 1769) == pytest.approx(30.0)
+    assert profile_function.estimate_ms(timing, 3008) == pytest.approx(30.0)
+    assert profile_function.estimate_ms(timing, 1769 / 4) == pytest.approx(90.0)
+
+def test_recommend_takes_the_smallest_memory_size_that_fits():
+    """
+    Test that out of memory runs and sizes without headroom are skipped, that
+    a duration target moves the choice up and that the timeout covers a cold start
+    """
+    profiles = [
+        {"memory_size": 128, "error": "MemoryError"},
+        _profile(256, 210.0, 20.0),
+        _profile(512, 210.0, 20.0),
+        _profile(1769, 210.0, 20.0),
+    ]
+    recommendation = profile_function.recommend(profiles)
+    assert recommendation["memory_size"] == 512
+    # 1400 ms of init CPU at 512 / 1769 of a vCPU, tripled
+    assert recommendation["timeout"] == 16
+
+    assert profile_function.recommend(profiles, max_duration_ms=30.0)["memory_size"] == 1769
+    # No size meets the target: the largest that fits
+    assert profile_function.recommend(profiles, max_duration_ms=1.0)["memory_size"] == 1769
+
+    with pytest.raises(ValueError):
+        profile_function.recommend(profiles[:2])
+
+def test_build_payloads(tmp_path):
+    """
+    Test that payloads are a single record for one row and lists of records otherwise
+    """
+    data_path = tmp_path / "predict.csv"
+    pd.DataFrame({"alcohol": [9.4, 9.8], "pH": [3.5, 3.2], "quality": [5, 6]}).to_csv(data_path, index=False)
+    payloads = profile_function.build_payloads(str(data_path), [1, 3])
+    assert payloads["1"] == {"alcohol": 9.4, "pH": 3.5}
+    assert [record["alcohol"] for record in payloads["3"]] == [9.4, 9.8, 9.4]
@@ -0,0 +1,29 @@
+import json
+import numpy as np
+import matplotlib
+import reporting
+
+def test_plots_rendered_in_background_and_regenerated(tmp_path):
+    """
+    Tests that a confusion matrix is saved as JSON and plotted, and that the plot can be regenerated from the JSON
+    """
+    conf_mat = np.array([[5, 1], [2, 7]])
+    with reporting.Reporter(str(tmp_path)) as reporter:
+        files = reporter.confusion_matrix(conf_mat, [5, 6], "confusion_matrix_SVC")
+    assert files == [str(tmp_path / "confusion_matrix_SVC.json"), str(tmp_path / "confusion_matrix_SVC.png")]
+    assert matplotlib.get_backend().lower() == "agg"
+    assert json.loads((tmp_path / "confusion_matrix_SVC.json").read_text()) == {"labels": [5, 6], "matrix": [[5, 1], [2, 7]]}
+
+    (tmp_path / "confusion_matrix_SVC.png").unlink()
+    reporting.regenerate([str(tmp_path / "confusion_matrix_SVC.json")])
+    assert (tmp_path / "confusion_matrix_SVC.png").stat().st_size > 0
+
+def test_plots_can_be_skipped(tmp_path):
+    """
+    Tests that without plots only the JSON matrix is written
+    """
+    with reporting.Reporter(str(tmp_path), plots=False) as reporter:
+        files = reporter.confusion_matrix(np.eye(3, dtype=int), ["a", "b", "c"], "confusion_matrix_ground_truth")
+    assert files == [str(tmp_path / "confusion_matrix_ground_truth.json")]
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["confusion_matrix_ground_truth.json"]
+    np.testing.assert_array_equal(reporting.load_matrix(files[0])[0], np.eye(3))
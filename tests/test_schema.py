@@ -0,0 +1,71 @@
+import math
+import numpy as np
+import schema
+from conftest import FEATURES, make_wine_data
+
+def make_schema():
+    """
+    Return the compiled schema of the synthetic training data
+    """
+    return schema.FeatureSchema(schema.build_schema(make_wine_data().drop(columns=["quality"])))
+
+def test_schema_ranges_are_widened_training_ranges():
+    """
+    Tests that the accepted range of every feature is the training range plus the margin
+    """
+    X = make_wine_data().drop(columns=["quality"])
+    content = schema.build_schema(X, margin=0.5)
+    alcohol = content["features"][FEATURES.index("alcohol")]
+    span = X["alcohol"].max() - X["alcohol"].min()
+
+    assert [feature["name"] for feature in content["features"]] == FEATURES
+    assert alcohol["min"] == X["alcohol"].min() and alcohol["max"] == X["alcohol"].max()
+    assert math.isclose(alcohol["upper"], alcohol["max"] + 0.5 * span)
+
+    widened = schema.build_schema(X.iloc[:10], base=content)
+    assert widened["features"][FEATURES.index("alcohol")]["min"] == alcohol["min"]
+
+def test_valid_records_in_feature_order():
+    """
+    Tests that valid records become float64 rows in the schema order, whatever their key order
+    """
+    feature_schema = make_schema()
+    data = make_wine_data(5, seed=1).drop(columns=["quality"])
+    records = [dict(reversed(list(record.items()))) for record in data.to_dict(orient="records")]
+    records[0]["pH"] = int(round(records[0]["pH"]))
+
+    X, valid_index, errors = feature_schema.validate(records)
+    expected = data.to_numpy()
+    expected[0, FEATURES.index("pH")] = records[0]["pH"]
+    np.testing.assert_array_equal(X, expected)
+    assert valid_index == list(range(5)) and errors == [None] * 5
+
+def test_invalid_records_get_per_field_errors():
+    """
+    Tests that keys, types, ranges and non-finite values are reported per field and per record
+    """
+    feature_schema = make_schema()
+    valid = make_wine_data(1, seed=1).drop(columns=["quality"]).to_dict(orient="records")[0]
+    records = [
+        {"fixed_acidity": 7.7},
+        dict(valid, alcohol="9.6", pH=True),
+        dict(valid, alcohol=96.0),
+        dict(valid, density=float("nan"), chlorides=float("inf")),
+        valid,
+        ValueError("Row has 1 values, expected 11"),
+        [1.0],
+        "x",
+        dict(valid, alcohol=10**400),
+    ]
+
+    X, valid_index, errors = feature_schema.validate(records)
+    assert valid_index == [4] and X.shape == (1, len(FEATURES))
+    assert errors[0]["fixed acidity"] == "missing" and errors[0]["fixed_acidity"] == "unknown feature"
+    assert errors[1] == {"pH": "must be a number, got bool", "alcohol": "must be a number, got str"}
+    assert list(errors[2]) == ["alcohol"] and "outside the accepted range" in errors[2]["alcohol"]
+    assert errors[3] == {"chlorides": "must be finite, got inf", "density": "must be finite, got nan"}
+    assert errors[5] == {"record": "Row has 1 values, expected 11"}
+    assert errors[6] == {"record": "must be an object, got list"}
+    assert errors[7] == {"record": "must be an object, got str"}
+    assert errors[8] == {"alcohol": "must be finite, got a number too large for a float"}
+    assert schema.format_errors(errors[2]).startswith("alcohol: 96 is outside")
@@ -0,0 +1,95 @@
+import json
+import asyncio
+import socket
+import lambda_function
+import serve
+from conftest import make_wine_data, FEATURES
+
+async def _post(port: int, bodies: list) -> list:
+    """
+    Send the bodies one after another over a keep-alive connection
+    """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    responses = []
+    for body in bodies:
+        content = body.encode()
+        writer.write(f"POST /predict HTTP/1.1\r\nHost: test\r\nContent-Length: {len(content)}\r\n\r\n".encode() + content)
+        await writer.drain()
+        assert (await reader.readline()).startswith(b"HTTP/1.1 200")
+        headers = {}
+        while (line := await reader.readline()) != b"\r\n":
+            name, _, value = line.decode().partition(":")
+            headers[name.lower()] = value.strip()
+        responses.append(json.loads(await reader.readexactly(int(headers["content-length"]))))
+    writer.close()
+    return responses
+
+async def _get_health(port: int) -> dict:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"GET /health HTTP/1.1\r\nHost: test\r\nConnection: close\r\n\r\n")
+    await writer.drain()
+    content = await reader.read()
+    writer.close()
+    return json.loads(content.split(b"\r\n\r\n", 1)[1])
+
+def test_served_responses_match_handler(model_dir):
+    """
+    Tests that concurrent requests are micro-batched and answered like the Lambda handler answers them
+    """
+    records = make_wine_data(40, seed=3)[FEATURES].to_dict("records")
+    bodies = [json.dumps(record) for record in records] + ['{"fixed_acidity": 7.7}', "invalid", json.dumps(records[:3])]
+    expected = [lambda_function.predict({"body": body}, None) for body in bodies]
+
+    async def scenario():
+        sock = socket.create_server(("127.0.0.1", 0))
+        server = asyncio.ensure_future(serve.serve(sock, max_batch=16, max_wait_ms=5))
+        await asyncio.sleep(0.05)
+        port = sock.getsockname()[1]
+        # Four connections sending at the same time
+        chunks = await asyncio.gather(*(_post(port, bodies[i::4]) for i in range(4)))
+        health = (await asyncio.gather(_get_health(port)))[0]
+        server.cancel()
+        responses = [None] * len(bodies)
+        for i, chunk in enumerate(chunks):
+            responses[i::4] = chunk
+        return responses, health
+
+    responses, health = asyncio.run(scenario())
+    assert responses == expected
+    # The invalid record is rejected by the batch and answered by the handler
+    assert health["batching"]["items"] == len(records) + 1
+    assert health["batching"]["batches"] < len(records)
+
+def test_query_string_and_bad_content_length(model_dir):
+    """
+    Tests that ?debug=1 returns the stage timings like the handler and that a malformed Content-Length gets a 400
+    """
+    body = json.dumps(make_wine_data(1, seed=3)[FEATURES].to_dict("records")[0]).encode()
+
+    async def request(head: bytes) -> tuple:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(head)
+        await writer.drain()
+        content = await reader.read()
+        writer.close()
+        status_line, _, response = content.partition(b"\r\n\r\n")
+        return int(status_line.split()[1]), json.loads(response)
+
+    async def scenario():
+        nonlocal port
+        sock = socket.create_server(("127.0.0.1", 0))
+        server = asyncio.ensure_future(serve.serve(sock))
+        await asyncio.sleep(0.05)
+        port = sock.getsockname()[1]
+        debug = await request(
+            f"POST /predict?debug=1 HTTP/1.1\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        invalid = await request(b"POST /predict HTTP/1.1\r\nContent-Length: ten\r\n\r\n" + body)
+        server.cancel()
+        return debug, invalid
+
+    port = None
+    (debug_status, debug), (invalid_status, invalid) = asyncio.run(scenario())
+    assert debug_status == 200 and debug["error"] == "None"
+    assert "predict" in debug["debug"]["timings_ms"]
+    assert invalid_status == 400
@@ -0,0 +1,44 @@
+import mlflow
+from sklearn.linear_model import SGDClassifier
+from tracking import Tracker, sync
+
+def test_offline_run_syncs_to_tracking_server(tmp_path, monkeypatch):
+    """
+    Tests that an offline run is stored locally and replayed into the tracking server
+    """
+    monkeypatch.chdir(tmp_path)
+    mlflow.set_tracking_uri(f"file:{tmp_path / 'mlruns'}")
+    artifact = tmp_path / "matrix.txt"
+    artifact.write_text("1 0\n0 1\n")
+    model = SGDClassifier(random_state=0).fit([[0.0], [1.0]], [0, 1])
+
+    tracker = Tracker("offline", offline_folder=str(tmp_path / "offline"))
+    with tracker.start_run("test-run", "test-exp"):
+        for step in range(3):
+            tracker.log_metric("accuracy", 0.5 + step / 10, step=step)
+        tracker.log_params({"alpha": 0.1})
+        tracker.log_artifact(str(artifact))
+        tracker.log_model(model, "model_SGDClassifier")
+
+    with open(f"{tracker.store}/metrics.jsonl", encoding="utf-8") as file:
+        assert len(file.readlines()) == 3
+    assert mlflow.search_runs(search_all_experiments=True).empty, "Offline mode should not reach the server"
+
+    run_id = sync(tracker.store)
+    run = mlflow.get_run(run_id)
+    assert run.data.metrics["accuracy"] == 0.7
+    assert run.data.params["alpha"] == "0.1"
+    artifacts = {item.path for item in mlflow.tracking.MlflowClient().list_artifacts(run_id)}
+    assert artifacts == {"matrix.txt", "model_SGDClassifier"}
+
+def test_async_run_batches_metrics(tmp_path, monkeypatch):
+    """
+    Tests that async mode buffers metrics until the run is flushed
+    """
+    monkeypatch.chdir(tmp_path)
+    mlflow.set_tracking_uri(f"file:{tmp_path / 'mlruns'}")
+    tracker = Tracker("async")
+    with tracker.start_run("test-run", "test-exp"):
+        tracker.log_metric("f1", 0.25, step=0)
+        assert mlflow.get_run(tracker.run_id).data.metrics == {}, "Metrics should be buffered"
+    assert mlflow.get_run(tracker.run_id).data.metrics == {"f1": 0.25}
@@ -0,0 +1,81 @@
+import numpy as np
+import train
+from sklearn.linear_model import SGDClassifier
+from sklearn.ensemble import RandomForestClassifier
+from conftest import make_wine_data
+
+def test_parallel_fit_matches_serial_fit():
+    """
+    Tests that fitting the candidates in a process pool gives the same models, in the same order
+    """
+    data = make_wine_data(200)
+    X = data.drop(columns=["quality"]).to_numpy()
+    y = data["quality"].to_numpy()
+
+    def candidates():
+        return {
+            "SGDClassifier": SGDClassifier(random_state=0),
+            "RandomForestClassifier": RandomForestClassifier(n_estimators=5, random_state=0),
+        }
+
+    serial = train.fit_candidates(candidates(), X, y, X)
+    parallel = train.fit_candidates(candidates(), X, y, X, parallel=True, max_workers=2)
+
+    assert [result[0] for result in parallel] == ["SGDClassifier", "RandomForestClassifier"]
+    for serial_result, parallel_result in zip(serial, parallel):
+        np.testing.assert_array_equal(serial_result[3], parallel_result[3])
+
+def test_incremental_sgd_update(model_dir):
+    """
+    Tests that the incremental mode updates the latest SGDClassifier and its scaler with the new rows only
+    """
+    import json
+    import joblib
+    import pandas as pd
+    import pytest
+    from sklearn.preprocessing import StandardScaler
+    from tracking import Tracker
+
+    data = make_wine_data(200)
+    X = data.drop(columns=["quality"])
+    scaler = StandardScaler().fit(X)
+    model = SGDClassifier(random_state=0).fit(scaler.transform(X), data["quality"])
+    assert train.save_sgd_version(model, scaler, mode="full", n_samples=len(X)) == 1
+
+    new_data = make_wine_data(50, seed=2)
+    new_data = new_data[new_data["quality"].isin(model.classes_)]
+    new_data.to_csv(model_dir / "data" / "new.csv", index=False)
+    tracker = Tracker("offline", offline_folder=str(model_dir / "mlruns_offline"))
+    with tracker.start_run("incremental", "test"):
+        version = train.train_incremental(str(model_dir / "data" / "new.csv"), tracker=tracker, promote=True)
+
+    updated, updated_scaler, meta = train.load_sgd_version()
+    assert version == 2 == meta["version"]
+    assert meta["base_version"] == 1 and meta["new_samples"] == len(new_data)
+    assert updated_scaler.n_samples_seen_ == len(X) + len(new_data)
+    assert updated.t_ == model.t_ + len(new_data)
+    assert isinstance(joblib.load(model_dir / "models" / "model.pkl"), SGDClassifier)
+
+    # Labels the model was never trained on need a full retraining
+    make_wine_data(5).assign(quality=42).to_csv(model_dir / "data" / "unknown.csv", index=False)
+    with pytest.raises(ValueError):
+        train.train_incremental(str(model_dir / "data" / "unknown.csv"), tracker=Tracker("offline", offline_folder=str(model_dir / "mlruns_offline")))
+    schema = json.loads((model_dir / "models" / "schema.json").read_text())
+    assert [feature["name"] for feature in schema["features"]] == list(X.columns)
+    new_rows = pd.read_csv(model_dir / "data" / "new.csv")
+    assert all(feature["min"] <= new_rows[feature["name"]].min() for feature in schema["features"])
+
+def test_old_sgd_versions_are_removed(model_dir):
+    """
+    Tests that only the last versions of the SGDClassifier are kept
+    """
+    from sklearn.preprocessing import StandardScaler
+
+    data = make_wine_data(50)
+    X = data.drop(columns=["quality"])
+    scaler = StandardScaler().fit(X)
+    model = SGDClassifier(random_state=0).fit(scaler.transform(X), data["quality"])
+    for _ in range(4):
+        version = train.save_sgd_version(model, scaler, keep=2, mode="full", n_samples=len(X))
+    assert version == 4
+    assert train.sgd_versions() == [3, 4]
@@ -0,0 +1,61 @@
+import os
+import tune
+from sklearn.svm import SVC
+from conftest import make_wine_data
+
+PARAM_GRID = {"C": [0.5, 1.0], "kernel": ["linear", "rbf"], "gamma": [0.1]}
+
+def load_data():
+    data = make_wine_data(120)
+    return data.drop(columns=["quality"]).to_numpy(), data["quality"].to_numpy()
+
+def test_search_resumes_from_cached_trials(tmp_path, monkeypatch):
+    """
+    Tests that a second search reuses every cached trial instead of refitting
+    """
+    X, y = load_data()
+    cache_path = str(tmp_path / "trials.jsonl")
+    fitted = []
+    run_trial = tune._run_trial
+
+    def counting_run_trial(index, *args):
+        fitted.append(index)
+        return run_trial(index, *args)
+
+    monkeypatch.setattr(tune, "_run_trial", counting_run_trial)
+    first = tune.grid_search(SVC(), X, y, tune.TrialCache(cache_path), param_grid=PARAM_GRID, cv=3, n_jobs=1)
+    assert len(fitted) == 4
+
+    second = tune.grid_search(SVC(), X, y, tune.TrialCache(cache_path), param_grid=PARAM_GRID, cv=3, n_jobs=1)
+    assert len(fitted) == 4, "Cached trials should not be refitted"
+    assert first[:2] == second[:2]
+
+def test_tune_saves_best_estimator(tmp_path, monkeypatch):
+    """
+    Tests that tuning writes the refitted best estimator to the models folder
+    """
+    X, y = load_data()
+    monkeypatch.setattr(tune, "MODEL_FOLDER", str(tmp_path))
+    best = tune.tune(X, y, search="halving", n_jobs=1, cv=3, param_grid=PARAM_GRID)
+
+    assert os.path.exists(tmp_path / "best_model_gridsearch.pkl")
+    assert os.path.exists(tmp_path / "tuning_trials.jsonl")
+    assert best.get_params()["C"] in PARAM_GRID["C"]
+
+def test_halving_rounds_are_capped_by_the_samples(tmp_path, monkeypatch):
+    """
+    Tests that halving stops once the samples run out instead of refitting survivors on the whole data
+    """
+    X, y = load_data()
+    sizes = []
+    run_trials = tune.run_trials
+
+    def recording_run_trials(estimator, candidates, X, y, *args):
+        sizes.append((len(candidates), len(X)))
+        return run_trials(estimator, candidates, X, y, *args)
+
+    monkeypatch.setattr(tune, "run_trials", recording_run_trials)
+    param_grid = {"C": [0.25, 0.5, 1.0], "kernel": ["linear", "rbf", "poly"], "gamma": [0.1, 1.0, 10.0]}
+    tune.halving_search(SVC(), X, y, tune.TrialCache(str(tmp_path / "trials.jsonl")), param_grid=param_grid, cv=2, n_jobs=1)
+    # 27 candidates would need 3 rounds, 120 samples only fit 40 and 120
+    assert sizes == [(27, 40), (9, 120)]